@@ -0,0 +1,478 @@
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from chunking import description_terms, estimate_tokens, section_topics, split_sections, term_matches
+from metrics import timed
+from result_cache import memoized
+
+try:
+    from keys import OPENAI_API_KEY
+except ImportError:
+    OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+# Another OpenAI-compatible endpoint, e.g. benchmarks.stubs.StubOpenAIServer, unset for OpenAI itself
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL')
+
+logger = logging.getLogger(__name__)
+
+# Pydantic Models
+class RelevanceResult(BaseModel):
+    """Result of the relevance analysis."""
+    is_relevant: bool = Field(description="Is the law relevant to the company?")
+    reason: str = Field(description="Reason for relevance or irrelevance")
+
+
+class TopicAnalysis(BaseModel):
+    """Analysis of a thematic area."""
+    topic: str = Field(description="The thematic area")
+    relevant: bool = Field(description="Is the law relevant for this thematic area?")
+    reason: str = Field(description="Reason for relevance or irrelevance")
+
+
+class AnalysisResult(BaseModel):
+    """Result of the automatic analysis."""
+    summary: str = Field(description="Summary of the law")
+    analyses: List[TopicAnalysis] = Field(description="List of thematic area analyses")
+
+
+class ProfileRelevance(RelevanceResult):
+    """Relevance of the law for one of several company profiles."""
+    profile: str = Field(description="Name of the company profile, as given")
+
+
+class BatchResult(AnalysisResult):
+    """Result of the batched analysis for several company profiles and the thematic areas."""
+    profiles: List[ProfileRelevance] = Field(description="Relevance of the law for each company profile")
+
+
+class LawSummary(BaseModel):
+    """Summary of a whole law, combined from its sections."""
+    summary: str = Field(description="Summary of the law")
+
+
+# Thematic areas of the predefined analysis, in prompt order
+TOPICS = [
+    'Data Protection',
+    'Data Regulation',
+    'Digital Products and Services',
+    'Artificial Intelligence',
+    'Cybersecurity',
+]
+
+# Sections analysed per law at most, the best matching ones after the first
+MAX_SECTIONS = int(os.environ.get('PARLTRACK_MAX_SECTIONS', 20))
+# Sections analysed at the same time
+SECTION_WORKERS = int(os.environ.get('PARLTRACK_SECTION_WORKERS', 4))
+# Company profiles asked about per batched request, more are split over several requests
+BATCH_PROFILES = int(os.environ.get('PARLTRACK_BATCH_PROFILES', 8))
+
+RELEVANCE_PROMPT = """
+Given the following law text:
+
+{law_text}
+
+And the following description of a company:
+
+{company_description}
+
+Question: Is this law relevant for the described company? Briefly justify your answer.
+"""
+
+PREDEFINED_ANALYSIS_PROMPT = """
+It is intended to develop an AI-based tool whose purpose is to analyze and summarize current and ongoing legislative procedures of the EU and the Federal Republic of Germany. The goal is to inform users (which include legal professionals and private businesses) about upcoming legislative changes and legislative procedures.
+
+However, only laws and legislative procedures relevant to the users should be analyzed and processed.
+
+Therefore, your task is to review the content of the law to determine whether it falls under one or more of the following (legal) subject areas. Briefly justify your answer:
+	•	Data Protection: This includes laws that serve to protect personal data and privacy, and which, among other things, determine how data may be collected, processed, stored, and shared. This includes, but is not limited to, the following laws: General Data Protection Regulation (also GDPR or Regulation (EU) 2016/679); the Law Enforcement Directive or Directive (EU) 2016/680); the Federal Data Protection Act as well as the data protection laws of the federal states; social data protection; health data protection.
+	•	Data Regulation: This encompasses laws that establish the legal frameworks and requirements regarding the handling of data, the usability of data, and the exchange of data across various sectors. This includes, but is not limited to, the following laws: Digital Markets Act (also DMA or Regulation (EU) 2022/1925); Digital Services Act (also DSA or Regulation (EU) 2022/2065); Data Act (also DA or Regulation (EU) 2023/2854); Data Governance Act (also DGA or Regulation (EU) 2022/868); European Health Data Space (also European Health Data Space or EHDS); Health Data Usage Act (also GDNG).
+	•	Digital Products and Services: This includes laws that set conditions regarding intermediary services such as host providers, online marketplaces, social networks, and cloud systems or applications (Digital Services), as well as regarding products that are created and provided in digital form, such as computer programs, apps, music files, e-books, or digital video games (Digital Products). This includes, but is not limited to, the following laws: Digital Services Act (also DSA or Regulation (EU) 2022/2065); AI Regulation (also AI Act or Regulation (EU) 2024/1689); AI Liability Directive (also AI Liability Directive or RL (EU) 2022/0303); Digital Services Law.
+	•	Artificial Intelligence: This encompasses laws that regulate Artificial Intelligence. This includes, but is not limited to, the following laws: AI Regulation (also AI Act or Regulation (EU) 2024/1689); AI Liability Directive (also AI Liability Directive or RL (EU) 2022/0303); Product Liability Directive (also Directive (EU) 2022/0302).
+	•	Cybersecurity: This includes laws that deal with the requirements and standards of cybersecurity, IT security, and/or security in information technology. This includes, but is not limited to, the following laws: Cyber Resilience Regulation (also Cyber Resilience Act, CRA); Cyber Solidarity Regulation (also Cyber Solidarity Act, CSA); Network and Information Security Directive (also NIS-2 or Directive (EU) 2022/2555); Regulation on Digital Operational Resilience (also DORA or Regulation (EU) 2022/2554).
+
+Create a brief summary of the following law text:
+
+{law_text}
+
+Then analyze whether the law falls into the above-mentioned subject areas, and if it is relevant for each subject area. Briefly justify your answers.
+"""
+
+
+RELEVANCE_SECTION_PROMPT = """
+Given the following section {section} of {sections} of a law text:
+
+{law_text}
+
+And the following description of a company:
+
+{company_description}
+
+Question: Does this section make the law relevant for the described company? Briefly justify your answer.
+"""
+
+SECTION_ANALYSIS_PROMPT = """
+Your task is to review a section of a law to determine whether it falls under one or more of the following (legal) subject areas:
+{topics}
+
+Create a brief summary of the following section {section} of {sections} of the law text:
+
+{law_text}
+
+Then analyze whether this section falls into the above-mentioned subject areas, and if it makes the law relevant for each subject area. Briefly justify your answers.
+"""
+
+# Everything before the law text only depends on the profiles and areas, so it is the same for
+# every law and section of a run and providers that cache prompt prefixes can reuse it
+BATCH_PROMPT = """
+Your task is to review a law for several companies and (legal) subject areas at once.
+
+The subject areas are:
+{topics}
+
+The companies are described by the following profiles:
+{profiles}
+
+Analyze the following {part}:
+
+{law_text}
+
+Create a brief summary of it. Then decide for each company profile whether the law is relevant for the company, and for each subject area whether the law falls into it and is relevant for it. Briefly justify every answer and name the profiles and subject areas exactly as given above.
+"""
+
+SUMMARY_PROMPT = """
+The following are summaries of consecutive sections of one law:
+
+{summaries}
+
+Combine them into a brief summary of the whole law.
+"""
+
+# Definitions of the thematic areas as worded in the predefined analysis prompt
+TOPIC_DEFINITIONS = dict(re.findall(r'^\t•\t(.+?): (.*)$', PREDEFINED_ANALYSIS_PROMPT, re.MULTILINE))
+
+_section_executor = None
+_section_executor_lock = threading.Lock()
+
+
+def get_llm(base_url=None):
+    # LangChain is imported on first use, so batch workers that never call the model start fast
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(openai_api_key=OPENAI_API_KEY, temperature=0, base_url=base_url or OPENAI_BASE_URL)
+
+
+def invoke(structured_llm, prompt, kind, usage=None, limiter=None, **attrs):
+    """One model request, recorded as an 'llm' span.
+
+    Structured output does not expose the provider's usage, so the token
+    counts are estimates from the prompt and answer length. The span is
+    also appended to ``usage``, if given, to sum up the requests of one task.
+    A ``limiter`` is waited for before the request starts.
+    """
+    if limiter is not None:
+        limiter.acquire()
+    with timed('llm', kind=kind, prompt_tokens=estimate_tokens(prompt), **attrs) as span:
+        if usage is not None:
+            usage.append(span)
+        result = structured_llm.invoke(prompt)
+        if result is not None:
+            span['completion_tokens'] = estimate_tokens(result.json())
+    return result
+
+
+def format_prompt(template, **values):
+    # Same result as LangChain's PromptTemplate with the default f-string format
+    return template.format(**values)
+
+
+def _same_name(a, b):
+    return a.strip().casefold() == b.strip().casefold()
+
+
+def relevance_prompt(law_text, company_description):
+    return format_prompt(RELEVANCE_PROMPT, law_text=law_text, company_description=company_description)
+
+
+def predefined_analysis_prompt(law_text):
+    return format_prompt(PREDEFINED_ANALYSIS_PROMPT, law_text=law_text)
+
+
+def select_sections(scores, max_sections=None):
+    """Sections worth analysing: the first for context, then those with the highest prefilter scores."""
+    max_sections = max_sections or MAX_SECTIONS
+    candidates = sorted((i for i, score in enumerate(scores) if score and i), key=lambda i: -scores[i])
+    return [0] + sorted(candidates[:max_sections - 1])
+
+
+def get_section_executor():
+    """Process-wide pool for the per-section LLM calls, started on first use with SECTION_WORKERS threads."""
+    global _section_executor
+    with _section_executor_lock:
+        if _section_executor is None:
+            _section_executor = ThreadPoolExecutor(max_workers=SECTION_WORKERS, thread_name_prefix='sections')
+        return _section_executor
+
+
+def _map_sections(compute, indexes):
+    # Results in section order, None for sections the model gave no answer for
+    return list(get_section_executor().map(compute, indexes))
+
+
+def relevance_of_sections(sections, company_description, llm, cache=None, limiter=None):
+    """Map the relevance question over the sections that share words with the company description."""
+    terms = description_terms(company_description)
+    indexes = select_sections([term_matches(section, terms) for section in sections])
+    structured_llm = llm.with_structured_output(RelevanceResult)
+
+    def analyze(i):
+        prompt = format_prompt(RELEVANCE_SECTION_PROMPT, section=i + 1, sections=len(sections),
+                               law_text=sections[i], company_description=company_description)
+        return memoized('relevance-section', RELEVANCE_SECTION_PROMPT, RelevanceResult,
+                        f"{i + 1}/{len(sections)}\n{sections[i]}", llm,
+                        lambda: invoke(structured_llm, prompt, 'relevance-section', limiter=limiter),
+                        company_description, cache)
+
+    results = [(i, r) for i, r in zip(indexes, _map_sections(analyze, indexes)) if r is not None]
+    logger.info(f"Checked {len(indexes)} of {len(sections)} sections for relevance.")
+    if not results:
+        return None
+    relevant = [(i, r) for i, r in results if r.is_relevant]
+    if relevant:
+        reason = ' '.join(f"Section {i + 1}: {r.reason}" for i, r in relevant[:3])
+        return RelevanceResult(is_relevant=True, reason=reason)
+    return RelevanceResult(
+        is_relevant=False,
+        reason=f"{results[0][1].reason} None of the {len(results)} sections checked concern the company.",
+    )
+
+
+def analysis_of_sections(sections, llm, cache=None, limiter=None):
+    """Map the predefined analysis over sections with topic keywords and reduce it to one result."""
+    matches = [section_topics(section) for section in sections]
+    indexes = select_sections([sum(m.values()) for m in matches])
+    structured_llm = llm.with_structured_output(AnalysisResult)
+
+    def analyze(i):
+        # The first section is read for every topic, the others for the ones they mention
+        topics = TOPICS if i == 0 else [t for t in TOPICS if t in matches[i]]
+        definitions = '\n'.join(f"\t•\t{t}: {TOPIC_DEFINITIONS.get(t, '')}" for t in topics)
+        prompt = format_prompt(SECTION_ANALYSIS_PROMPT, topics=definitions, section=i + 1, sections=len(sections),
+                               law_text=sections[i])
+        # The definitions come from the predefined prompt, editing either one must miss the cache
+        result = memoized('predefined-section', SECTION_ANALYSIS_PROMPT + PREDEFINED_ANALYSIS_PROMPT, AnalysisResult,
+                          f"{i + 1}/{len(sections)}\n{sections[i]}", llm,
+                          lambda: invoke(structured_llm, prompt, 'predefined-section', limiter=limiter),
+                          definitions, cache)
+        if result is not None:
+            result.analyses = [a for a in result.analyses if any(_same_name(a.topic, t) for t in topics)]
+        return result
+
+    results = [(i, r) for i, r in zip(indexes, _map_sections(analyze, indexes)) if r is not None]
+    logger.info(f"Analysed {len(indexes)} of {len(sections)} sections.")
+    if not results:
+        return None
+    analyses = []
+    for topic in TOPICS:
+        found = [(i, a) for i, r in results for a in r.analyses if _same_name(a.topic, topic)]
+        relevant = [(i, a) for i, a in found if a.relevant]
+        if relevant:
+            reason = ' '.join(f"Section {i + 1}: {a.reason}" for i, a in relevant[:3])
+        elif found:
+            reason = found[0][1].reason
+        else:
+            reason = "No section of the law touches this area."
+        analyses.append(TopicAnalysis(topic=topic, relevant=bool(relevant), reason=reason))
+    summary = combine_summaries([r.summary for _, r in results], llm, cache, limiter=limiter)
+    return AnalysisResult(summary=summary, analyses=analyses)
+
+
+def combine_summaries(summaries, llm, cache=None, usage=None, limiter=None):
+    """One summary of a law from the summaries of its analysed sections."""
+    if len(summaries) == 1:
+        return summaries[0]
+    joined = '\n\n'.join(summaries)
+    prompt = format_prompt(SUMMARY_PROMPT, summaries=joined)
+    result = memoized('summary', SUMMARY_PROMPT, LawSummary, joined, llm,
+                      lambda: invoke(llm.with_structured_output(LawSummary), prompt, 'summary', usage, limiter),
+                      cache=cache)
+    return result.summary if result is not None else summaries[0]
+
+
+def analyze_relevance(law_text, company_description, llm=None, raise_errors=False, cache=None, limiter=None):
+    """Decide whether a law is relevant for a company.
+
+    Texts longer than one section are split, only sections sharing words
+    with the company description are asked about (plus the first), and the
+    law is relevant if any of them is. Every model request first waits for
+    ``limiter``, if given.
+    """
+    logger.info("Starting relevance analysis.")
+    llm = llm or get_llm()
+    structured_llm = llm.with_structured_output(RelevanceResult)
+
+    def compute():
+        return invoke(structured_llm, relevance_prompt(law_text, company_description), 'relevance', limiter=limiter)
+
+    try:
+        # The whole analysis, the model requests in it are recorded as 'llm' spans
+        with timed('relevance', bytes=len(law_text)) as span:
+            sections = split_sections(law_text)
+            span['sections'] = len(sections)
+            if len(sections) > 1:
+                response = relevance_of_sections(sections, company_description, llm, cache, limiter)
+            else:
+                # Identical inputs were answered before, reuse the stored result
+                response = memoized('relevance', RELEVANCE_PROMPT, RelevanceResult, law_text,
+                                    llm, compute, company_description, cache)
+        logger.info("Received response from LLM for relevance analysis.")
+        return response
+    except Exception as e:
+        logger.error(f"Error during LLM relevance analysis: {e}")
+        if raise_errors:
+            raise
+        return None
+
+
+def perform_predefined_analysis(law_text, llm=None, raise_errors=False, cache=None, limiter=None):
+    """Analyse a law against the predefined thematic areas.
+
+    Texts longer than one section are analysed section by section, skipping
+    sections without keywords of any area, and reduced to one result. Every
+    model request first waits for ``limiter``, if given.
+    """
+    logger.info("Starting predefined analysis.")
+    llm = llm or get_llm()
+    structured_llm = llm.with_structured_output(AnalysisResult)
+
+    def compute():
+        return invoke(structured_llm, predefined_analysis_prompt(law_text), 'predefined', limiter=limiter)
+
+    try:
+        with timed('predefined', bytes=len(law_text)) as span:
+            sections = split_sections(law_text)
+            span['sections'] = len(sections)
+            if len(sections) > 1:
+                response = analysis_of_sections(sections, llm, cache, limiter)
+            else:
+                response = memoized('predefined', PREDEFINED_ANALYSIS_PROMPT, AnalysisResult, law_text,
+                                    llm, compute, cache=cache)
+        logger.info("Received response from LLM for predefined analysis.")
+        return response
+    except Exception as e:
+        logger.error(f"Error during LLM predefined analysis: {e}")
+        if raise_errors:
+            raise
+        return None
+
+
+def _bullets(items):
+    return '\n'.join(f"\t•\t{name}: {text}" for name, text in items) or "\t•\tNone"
+
+
+def batch_prompt(law_text, profiles, topics, part='law text'):
+    return format_prompt(
+        BATCH_PROMPT, topics=_bullets((t, TOPIC_DEFINITIONS.get(t, '')) for t in topics),
+        profiles=_bullets(profiles.items()), part=part, law_text=law_text,
+    )
+
+
+def profile_packs(profiles, size=None):
+    """Split ``{name: description}`` into packs of at most BATCH_PROFILES profiles, one request each."""
+    size = size or BATCH_PROFILES
+    items = list(profiles.items())
+    return [dict(items[i:i + size]) for i in range(0, len(items), size)] or [{}]
+
+
+def _reduce_batch(results, profiles, topics, labelled):
+    """Per profile and area: relevant if any section says so, with the reasons of up to three of them."""
+    def reason(found, is_relevant, missing):
+        relevant = [(i, a) for i, a in found if is_relevant(a)]
+        if relevant:
+            return True, ' '.join(f"Section {i + 1}: {a.reason}" if labelled else a.reason for i, a in relevant[:3])
+        return False, found[0][1].reason if found else missing
+
+    relevances = []
+    for name in profiles:
+        found = [(i, p) for i, r in results for p in r.profiles if _same_name(p.profile, name)]
+        relevant, text = reason(found, lambda p: p.is_relevant, "The model gave no answer for this profile.")
+        relevances.append(ProfileRelevance(profile=name, is_relevant=relevant, reason=text))
+    analyses = []
+    for topic in topics:
+        found = [(i, a) for i, r in results for a in r.analyses if _same_name(a.topic, topic)]
+        relevant, text = reason(found, lambda a: a.relevant, "No section of the law touches this area.")
+        analyses.append(TopicAnalysis(topic=topic, relevant=relevant, reason=text))
+    return relevances, analyses
+
+
+def analyze_batch(law_text, profiles, topics=TOPICS, llm=None, raise_errors=False, cache=None, usage=None,
+                  limiter=None):
+    """Analyse a law for several company profiles and the thematic areas in as few requests as possible.
+
+    ``profiles`` maps profile names to company descriptions. One request
+    covers up to BATCH_PROFILES profiles, the first of them also the areas.
+    Texts longer than one section are asked about section by section,
+    skipping sections without words of any profile or keywords of any area,
+    and reduced like the single analyses. The 'batch' span counts the
+    (law, profile) pairs next to the tokens of all its requests, whose
+    spans are also appended to ``usage``. Every model request first waits
+    for ``limiter``, if given. Returns a BatchResult.
+    """
+    logger.info(f"Starting batched analysis for {len(profiles)} profiles.")
+    llm = llm or get_llm()
+    topics = list(topics)
+    packs = profile_packs(profiles)
+    structured_llm = llm.with_structured_output(BatchResult)
+    llm_spans = [] if usage is None else usage
+
+    def ask(job):
+        text, part, pack, pack_topics = job
+        prompt = batch_prompt(text, pack, pack_topics, part)
+        prefix = estimate_tokens(prompt[:prompt.index(f"Analyze the following {part}:")])
+        result = memoized('batch', BATCH_PROMPT, BatchResult, f"{part}\n{text}", llm,
+                          lambda: invoke(structured_llm, prompt, 'batch', llm_spans, limiter, prefix_tokens=prefix),
+                          batch_prompt('', pack, pack_topics), cache)
+        if result is not None:
+            result.analyses = [a for a in result.analyses if any(_same_name(a.topic, t) for t in pack_topics)]
+        return result
+
+    try:
+        with timed('batch', bytes=len(law_text), pairs=len(profiles)) as span:
+            start = len(llm_spans)
+            sections = split_sections(law_text)
+            span['sections'] = len(sections)
+            if len(sections) > 1:
+                terms = [description_terms(description) for description in profiles.values()]
+                scores = [sum(term_matches(section, t) for t in terms) + sum(section_topics(section, topics).values())
+                          for section in sections]
+                parts = [(i, sections[i], f"section {i + 1} of {len(sections)} of the law text")
+                         for i in select_sections(scores)]
+            else:
+                parts = [(0, law_text, 'law text')]
+            jobs = [(i, (text, part, pack, topics if k == 0 else []))
+                    for i, text, part in parts for k, pack in enumerate(packs)]
+            answers = _map_sections(ask, [job for _, job in jobs])
+            results = [(i, r) for (i, _), r in zip(jobs, answers) if r is not None]
+            if results:
+                relevances, analyses = _reduce_batch(results, profiles, topics, len(parts) > 1)
+                # Every part's summary comes with the first pack's answer
+                summaries = [r.summary for (i, job), r in zip(jobs, answers) if r is not None and job[2] is packs[0]]
+                summary = combine_summaries(summaries, llm, cache, llm_spans, limiter) if summaries else ''
+                response = BatchResult(summary=summary, analyses=analyses, profiles=relevances)
+            else:
+                response = None
+            spans = llm_spans[start:]
+            span['requests'] = len(spans)
+            for name in ('prompt_tokens', 'completion_tokens', 'prefix_tokens'):
+                span[name] = sum(s.get(name, 0) for s in spans)
+        logger.info(f"Batched analysis took {len(spans)} requests for {len(parts)} parts and "
+                    f"{len(profiles)} profiles.")
+        return response
+    except Exception as e:
+        logger.error(f"Error during LLM batched analysis: {e}")
+        if raise_errors:
+            raise
+        return None
@@ -0,0 +1,16 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of the process-wide pool for blocking work (downloads, PDF parsing, LLM calls)
+WORKERS = int(os.environ.get('PARLTRACK_WORKERS', 8))
+
+# Created on import, so every Panel session in the process shares the same bounded pool
+executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='parltrack')
+
+
+async def run_in_background(func, *args, **kwargs):
+    """Run a blocking call on the shared pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,75 @@
+"""Separate vs. batched analyses of laws for several company profiles, against the stub model.
+
+Run from the repository root: ``python -m benchmarks.bench_batch --laws 10 --profiles 8 --latency 0.5``.
+Separately, every law costs one relevance analysis per profile plus one
+predefined analysis, batched it costs analyze_batch. Reports requests,
+estimated prompt and completion tokens and latency per (law, profile)
+pair, and how many prompt tokens are the prefix shared by every batched
+request, which providers with prompt caching bill at a discount.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from analysis import analyze_batch, analyze_relevance, perform_predefined_analysis
+from benchmarks.stubs import StubChatModel
+from benchmarks.synthetic import POLICY_AREAS, make_text
+from metrics import get_recorder
+from result_cache import ResultCache
+
+
+def make_laws(count, words, seed=0):
+    rng = random.Random(seed)
+    return [make_text(rng, words, rng.choice(sorted(POLICY_AREAS))) for _ in range(count)]
+
+
+def run(laws, profiles, llm, cache, batched):
+    """Requests, tokens and seconds of analysing all laws for all profiles one way."""
+    recorder = get_recorder()
+    recorder.reset()
+    start = time.perf_counter()
+    for law in laws:
+        if batched:
+            analyze_batch(law, profiles, llm=llm, raise_errors=True, cache=cache)
+        else:
+            for description in profiles.values():
+                analyze_relevance(law, description, llm=llm, raise_errors=True, cache=cache)
+            perform_predefined_analysis(law, llm=llm, raise_errors=True, cache=cache)
+    seconds = time.perf_counter() - start
+    totals = next(row for row in recorder.summary() if row['stage'] == 'llm')
+    return {
+        'seconds': seconds, 'requests': totals['count'], 'prompt_tokens': totals.get('prompt_tokens', 0),
+        'completion_tokens': totals.get('completion_tokens', 0), 'prefix_tokens': totals.get('prefix_tokens', 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--laws', type=int, default=10)
+    parser.add_argument('--profiles', type=int, default=8, help=f"Company profiles, at most {len(POLICY_AREAS)}")
+    parser.add_argument('--words', type=int, default=600,
+                        help='Words per law, longer laws are split into sections of PARLTRACK_CHUNK_TOKENS')
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds the stub model takes per request')
+    args = parser.parse_args()
+    profiles = {name: description for name, (_, description) in sorted(POLICY_AREAS.items())[:args.profiles]}
+    laws = make_laws(args.laws, args.words)
+    llm = StubChatModel(latency=args.latency)
+    pairs = len(laws) * len(profiles)
+    with tempfile.TemporaryDirectory() as tmp:
+        # A disabled result cache, every analysis asks the model
+        cache = ResultCache(os.path.join(tmp, 'results.sqlite'), max_entries=0)
+        results = {name: run(laws, profiles, llm, cache, batched) for name, batched in
+                   (('separate', False), ('batched', True))}
+    print(f"{len(laws)} laws x {len(profiles)} profiles, {args.latency}s per request")
+    print(f"{'':>10} {'requests':>9} {'prompt/pair':>12} {'completion/pair':>16} {'seconds/pair':>13} "
+          f"{'shared prefix':>14}")
+    for name, r in results.items():
+        print(f"{name:>10} {r['requests']:>9} {r['prompt_tokens'] / pairs:>12.0f} "
+              f"{r['completion_tokens'] / pairs:>16.0f} {r['seconds'] / pairs:>13.3f} "
+              f"{r['prefix_tokens'] / r['prompt_tokens'] if r['prompt_tokens'] else 0:>14.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Compare the old full-materialization loader with the streaming loader.
+
+Run from the repository root: ``python -m benchmarks.bench_loader --dossiers 5000``.
+Each loader runs in a fresh process so peak RSS is not shared between runs.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+
+from benchmarks.synthetic import write_dump
+from dossiers import COD_TYPE, iter_dossiers
+
+
+def legacy_load(path):
+    # The loader main.py used before streaming: parse everything, filter after
+    dossiers = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line in ('[', ']'):
+                continue
+            if line.startswith(','):
+                line = line[1:]
+            dossiers.append(json.loads(line))
+    documents = [d for d in dossiers if d.get('procedure', {}).get('type') == COD_TYPE]
+    return len(documents)
+
+
+def streaming_load(path):
+    return sum(1 for _ in iter_dossiers(path, procedure_type=COD_TYPE))
+
+
+def reservoir_sample(iterable, k):
+    """Uniformly sample up to k items from a stream without materializing it."""
+    sample = []
+    for i, item in enumerate(iterable):
+        if i < k:
+            sample.append(item)
+        else:
+            j = random.randint(0, i)
+            if j < k:
+                sample[j] = item
+    return sample
+
+
+def streaming_sample(path):
+    return len(reservoir_sample(iter_dossiers(path, procedure_type=COD_TYPE), 100))
+
+
+LOADERS = {
+    'legacy': legacy_load,
+    'streaming': streaming_load,
+    'streaming+sample': streaming_sample,
+}
+
+
+def _measure(name, path, queue):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    count = LOADERS[name](path)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({'loader': name, 'seconds': elapsed, 'matched': count,
+               'peak_rss_mb': rss_after / 1024, 'rss_growth_mb': (rss_after - rss_before) / 1024})
+
+
+def run(path, loaders=LOADERS):
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for name in loaders:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_measure, args=(name, path, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dossiers', type=int, default=5000)
+    parser.add_argument('--cod-fraction', type=float, default=0.1)
+    parser.add_argument('--dump', help='Use an existing dump instead of a synthetic one')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.dump or write_dump(os.path.join(tmp, 'ep_dossiers.json'), args.dossiers,
+                                       cod_fraction=args.cod_fraction)
+        size_mb = os.path.getsize(path) / 2**20
+        print(f"dump: {path} ({size_mb:.1f} MB)")
+        for r in run(path):
+            print(f"{r['loader']:>18}: {r['seconds']:6.2f}s  matched={r['matched']:<6} "
+                  f"peak RSS={r['peak_rss_mb']:7.1f} MB  growth={r['rss_growth_mb']:7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Memory of the dossier set and summary rows: parsed dicts vs. the compact records of records.py.
+
+Run from the repository root: ``python -m benchmarks.bench_memory --dossiers 5000``
+or ``--dump ep_dossiers.json`` for the real dump. Measures with tracemalloc
+what stays allocated once
+
+- every dossier of the dump is held, as json.loads dicts, as LazyDossier
+  keeping events and docs as bytes, and as LazyDossier from DossierReader
+  reading them from the memory map,
+- all summary rows are held, as dicts and as DossierSummary,
+
+and times opening a dossier and rendering its details both ways.
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import write_dump
+from dossier_index import DossierReader, build_index, connect, search_dossiers
+from dossiers import iter_dossiers, iter_dump_lines
+from render import _render
+
+
+def retained(build):
+    """Bytes still allocated while the result of ``build()`` is alive."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def _median_ms(func, items):
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dump', help='Use an existing dump instead of a synthetic one')
+    parser.add_argument('--dossiers', type=int, default=5000, help='Dossiers in the synthetic dump')
+    parser.add_argument('--events', type=int, default=20, help='Mean events per synthetic dossier')
+    parser.add_argument('--docs', type=int, default=10, help='Mean documents per synthetic dossier')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.dump or write_dump(os.path.join(tmp, 'ep_dossiers.json'), args.dossiers,
+                                       events=args.events, docs=args.docs)
+        index = os.path.join(tmp, 'ep_dossiers.sqlite')
+        conn = connect(index)
+        build_index(conn, path)
+        reader = DossierReader(path, index, cache_size=0)
+
+        sizes = {}
+        sizes['dicts'], dicts = retained(lambda: list(iter_dossiers(path)))
+        sizes['LazyDossier (bytes)'], compact = retained(lambda: list(iter_dossiers(path, compact=True)))
+        references = [d['procedure']['reference'] for d in dicts]
+        sizes['LazyDossier (reader)'], mapped = retained(lambda: [reader.get(r) for r in references])
+        mismatches = sum(a != b for a, b in zip(dicts, mapped))
+
+        rows = search_dossiers(conn, limit=-1)[0]
+        sizes['summary dicts'], _ = retained(lambda: [dict(row) for row in search_dossiers(conn, limit=-1)[0]])
+        sizes['DossierSummary'], _ = retained(lambda: search_dossiers(conn, limit=-1)[0])
+        conn.close()
+        del compact, mapped
+
+        dump_mb = os.path.getsize(path) / 2**20
+        print(f"{len(references)} dossiers, dump {dump_mb:.1f}MB, {len(rows)} summary rows")
+        for name, size in sizes.items():
+            base = sizes['dicts'] if 'Lazy' in name or name == 'dicts' else sizes['summary dicts']
+            print(f"{name:>22}: {size / 2**20:8.1f}MB  {base / size:5.1f}x smaller" if size != base else
+                  f"{name:>22}: {size / 2**20:8.1f}MB")
+
+        with open(path, 'rb') as file:
+            lines = {json.loads(line)['procedure']['reference']: line for _, line in iter_dump_lines(file)}
+        sample = references[::max(1, len(references) // 200)]
+        print(f"open + render, median over {len(sample)} dossiers: "
+              f"json.loads {_median_ms(lambda r: _render(json.loads(lines[r]), 50), sample):.2f}ms, "
+              f"reader {_median_ms(lambda r: _render(reader.get(r), 50), sample):.2f}ms, "
+              f"reader without events/docs {_median_ms(lambda r: reader.get(r)['procedure'], sample):.3f}ms")
+        print(f"{mismatches} dossiers differ between the dicts and the reader")
+        reader.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Time PDF text extraction: the old loop, the process pool and the text cache.
+
+Run from the repository root: ``python -m benchmarks.bench_pdf --pages 200 --workers 4``.
+``--pdf`` benchmarks real proposals instead of synthetic ones.
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+
+import documents
+from benchmarks.synthetic import make_pdf
+from documents import DocumentCache, document_text, extract_pdf_pages, get_process_pool
+
+
+def legacy_extract(content):
+    # What fetch_document_text did before: every page, in this thread, string concatenation
+    reader = PdfReader(BytesIO(content))
+    text = ''
+    for page in reader.pages:
+        text += page.extract_text()
+    return text
+
+
+def _timed(func, content, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = func(content)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), len(text)
+
+
+def run(pdfs, workers, repeat=3):
+    documents.EXTRACT_WORKERS = workers
+    if workers > 1:
+        # Start the pool outside the measurements, the app keeps it for its lifetime
+        get_process_pool().submit(len, b'').result()
+    cases = {
+        'legacy': legacy_extract,
+        'sequential': lambda c: ''.join(extract_pdf_pages(c, workers=1)[0]),
+        f'pool x{workers}': lambda c: ''.join(extract_pdf_pages(c, workers=workers)[0]),
+    }
+    results = []
+    for name, func in cases.items():
+        for i, content in enumerate(pdfs):
+            seconds, chars = _timed(func, content, repeat)
+            results.append({'case': name, 'pdf': i, 'seconds': seconds, 'chars': chars})
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DocumentCache(tmp)
+        for i, content in enumerate(pdfs):
+            sha256 = cache.store(f"http://bench/{i}.pdf", content, 'application/pdf')
+            for name in ('cache: miss', 'cache: hit'):
+                start = time.perf_counter()
+                text = document_text(cache, sha256, 'application/pdf', content)
+                results.append({'case': name, 'pdf': i, 'seconds': time.perf_counter() - start, 'chars': len(text)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--documents', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pdf', nargs='*', help='Benchmark these PDF files instead of synthetic ones')
+    args = parser.parse_args()
+    if args.pdf:
+        pdfs = []
+        for path in args.pdf:
+            with open(path, 'rb') as file:
+                pdfs.append(file.read())
+    else:
+        pdfs = [make_pdf(args.pages, seed=i) for i in range(args.documents)]
+    for i, content in enumerate(pdfs):
+        print(f"pdf {i}: {len(content) / 2**20:.1f} MB, sha256 {hashlib.sha256(content).hexdigest()[:12]}")
+    results = run(pdfs, args.workers, args.repeat)
+    print(f"{'case':>22}  {'median s':>9}  {'chars':>9}")
+    for name in dict.fromkeys(r['case'] for r in results):
+        rows = [r for r in results if r['case'] == name]
+        print(f"{name:>22}  {statistics.median(r['seconds'] for r in rows):9.3f}  "
+              f"{statistics.median(r['chars'] for r in rows):9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Connection reuse, retries and proposal prefetch against a local stub document server.
+
+Run from the repository root: ``python -m benchmarks.bench_prefetch --latency 0.3 --clicks 10``.
+First downloads documents with bare requests.get and with the pooled
+session, counting the connections opened. Then runs main.py like
+``panel serve`` does, lists a page of laws whose proposals live on the
+stub and selects them one after another, with and without prefetching,
+and reports how long each selection waited for its proposal text.
+"""
+import argparse
+import asyncio
+import os
+import runpy
+import statistics
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def compare_connections(server, documents_count):
+    import requests
+
+    from documents import get_session
+
+    results = {}
+    for name, get in (('requests.get', requests.get), ('pooled session', get_session().get)):
+        connections, requests_made = server.connections, server.requests
+        start = time.perf_counter()
+        failed = 0
+        for i in range(documents_count):
+            try:
+                get(server.url(f"{name.replace(' ', '-')}/{i}.pdf"), timeout=30).raise_for_status()
+            except requests.RequestException:
+                failed += 1
+        results[name] = {
+            'seconds': time.perf_counter() - start, 'connections': server.connections - connections,
+            'requests': server.requests - requests_made, 'failed': failed,
+        }
+    return results
+
+
+async def click_through(clicks, think, timeout=60.0):
+    """Seconds each selection of a listed law waited for its proposal text."""
+    ns = runpy.run_path(MAIN, run_name='bench_prefetch')
+    await ns['search_laws'](None)
+    waits = []
+    for row in range(min(clicks, len(ns['laws_table'].value))):
+        # The user reads the list or the previous law's details meanwhile
+        await asyncio.sleep(think)
+        reference = ns['laws_table'].value.iloc[row]['ID']
+        state = ns['session']
+        start = time.perf_counter()
+        ns['laws_table'].selection = [row]
+        # on_law_select runs as a task, wait until it switched to this law and loaded its text
+        while not (state['vorgang_id'] == reference and state['law_text']) and time.perf_counter() - start < timeout:
+            await asyncio.sleep(0.005)
+        waits.append(time.perf_counter() - start)
+    return waits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.3, help='Seconds the stub waits before each response')
+    parser.add_argument('--connect-latency', type=float, default=0.1,
+                        help='Extra seconds for each new connection, like a TLS handshake with a remote host')
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='Share of stub responses that are 503s')
+    parser.add_argument('--pages', type=int, default=20, help='Pages per stub proposal PDF')
+    parser.add_argument('--documents', type=int, default=20, help='Documents downloaded in the connection test')
+    parser.add_argument('--clicks', type=int, default=10, help='Laws selected one after another')
+    parser.add_argument('--think', type=float, default=1.0, help='Seconds between selections')
+    parser.add_argument('--workers', type=int, default=4, help='Prefetch workers')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'PARLTRACK_DUMP': os.path.join(tmp, 'ep_dossiers.json'),
+            'PARLTRACK_DATA': tmp,
+            'PARLTRACK_INDEX': os.path.join(tmp, 'ep_dossiers.sqlite'),
+            'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', 'not-used'),
+        })
+        import documents
+        from benchmarks.stubs import StubDocumentServer
+        from benchmarks.synthetic import write_dump
+
+        with StubDocumentServer(latency=args.latency, failure_rate=args.failure_rate, pages=args.pages,
+                                connect_latency=args.connect_latency) as server:
+            # Without failures, so both clients make the same requests
+            server.failure_rate = 0.0
+            for name, r in compare_connections(server, args.documents).items():
+                print(f"{name:>15}: {args.documents} documents in {r['seconds']:.2f}s over {r['connections']} "
+                      f"connections, {r['requests']} requests, {r['failed']} failed")
+            server.failure_rate, failures = args.failure_rate, server.failures
+
+            write_dump(os.environ['PARLTRACK_DUMP'], 500, cod_fraction=0.5, proposal_base=server.url('com'))
+            waits = {}
+            for workers in (0, args.workers):
+                # A cold document cache for each run, so every proposal is downloaded once
+                documents._cache = documents.DocumentCache(os.path.join(tmp, f"documents-{workers}"))
+                documents._prefetcher = documents.Prefetcher(workers)
+                waits[workers] = asyncio.run(click_through(args.clicks, args.think))
+                documents._prefetcher.close()
+            failures = server.failures - failures
+    for workers, times in waits.items():
+        label = f"prefetch, {workers} workers" if workers else 'no prefetch'
+        times = sorted(times)
+        print(f"{label:>22}: median {statistics.median(times) * 1000:7.1f}ms, "
+              f"max {times[-1] * 1000:7.1f}ms until the proposal text of a selected law was loaded")
+    print(f"stub answered {failures} requests with 503, retried by the session")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Recall vs. LLM cost of the local TF-IDF pre-screen.
+
+Run from the repository root: ``python -m benchmarks.bench_prescreen --dossiers 10000``.
+Synthetic dossiers belong to one policy area each, a company profile is
+relevant to the COD dossiers of its area. Screening all COD dossiers costs
+one LLM call each, with the pre-screen only the top N are sent.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.synthetic import POLICY_AREAS, write_dump
+from dossier_index import build_index, connect, search_dossiers
+from dossiers import COD_TYPE, iter_dossiers
+from prescreen import build_vectors
+
+CUTOFFS = (10, 25, 50, 100, 200, 400)
+
+
+def run(path, index_path, cutoffs=CUTOFFS, repeat=20):
+    conn = connect(index_path)
+    start = time.perf_counter()
+    build_index(conn, path)
+    indexed = time.perf_counter() - start
+    start = time.perf_counter()
+    vectors = build_vectors(conn, index_path, include_proposals=False)
+    vectorized = time.perf_counter() - start
+    pool = [row['reference'] for row in search_dossiers(conn, procedure_type=COD_TYPE, limit=-1)[0]]
+    conn.close()
+    areas = {d['procedure']['reference']: d['meta'].get('topic') for d in iter_dossiers(path, COD_TYPE)}
+    print(f"indexed in {indexed:.1f}s, vectorized {len(vectors)} dossiers over {len(vectors.terms)} terms "
+          f"in {vectorized:.1f}s, {len(pool)} COD dossiers to screen")
+    results = []
+    for area, (_, description) in sorted(POLICY_AREAS.items()):
+        relevant = {r for r in pool if areas.get(r) == area}
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ranked = [r for r, _ in vectors.top_k(description, max(cutoffs), pool)]
+            timings.append((time.perf_counter() - start) * 1000)
+        for n in cutoffs:
+            hits = len(relevant.intersection(ranked[:n]))
+            results.append({'area': area, 'n': n, 'relevant': len(relevant), 'hits': hits,
+                            'recall': hits / len(relevant) if relevant else 1.0,
+                            'calls_saved': 1 - min(n, len(pool)) / len(pool), 'query_ms': statistics.median(timings)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dossiers', type=int, default=10000)
+    parser.add_argument('--cod-fraction', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_dump(os.path.join(tmp, 'ep_dossiers.json'), args.dossiers, cod_fraction=args.cod_fraction)
+        results = run(path, os.path.join(tmp, 'index.sqlite'), repeat=args.repeat)
+    query_ms = statistics.median(r['query_ms'] for r in results)
+    print(f"median top-k query: {query_ms:.2f}ms")
+    print(f"{'top N':>6}  {'recall':>7}  {'min recall':>10}  {'LLM calls saved':>15}")
+    for n in CUTOFFS:
+        rows = [r for r in results if r['n'] == n]
+        print(f"{n:>6}  {statistics.mean(r['recall'] for r in rows):7.1%}  "
+              f"{min(r['recall'] for r in rows):10.1%}  {rows[0]['calls_saved']:15.1%}")
+
+
+if __name__ == '__main__':
+    main()
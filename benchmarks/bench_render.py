@@ -0,0 +1,240 @@
+"""Rendering time of the details markdown: old formatters vs. render.py.
+
+Run from the repository root: ``python -m benchmarks.bench_render --dump ep_dossiers.json``.
+Times the largest dossiers of the dump (a synthetic one with long event
+lists by default), checks that fully rendered output matches the old
+formatters and reports cold, paginated and memoized render times.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import render
+from benchmarks.synthetic import write_dump
+from dossiers import iter_dump_lines, latest_proposal, latest_proposal_url
+
+# The formatters main.py used before render.py, kept as the baseline
+def legacy_meta(meta):
+    if not meta:
+        return "No meta data available.\n"
+    source = meta.get('source', 'N/A')
+    updated = meta.get('updated', 'N/A')
+    try:
+        updated = datetime.strptime(updated, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        pass
+    return f"**Source**: [{source}]({source})\n**Updated**: {updated}\n"
+
+
+def legacy_procedure(procedure):
+    if not procedure:
+        return "No procedure data available.\n"
+    fields = [
+        f"**Reference**: {procedure.get('reference', 'N/A')}",
+        f"**Title**: {procedure.get('title', 'N/A')}",
+        f"**Type**: {procedure.get('type', 'N/A')}",
+        f"**Subtype**: {procedure.get('subtype', 'N/A')}",
+        f"**Instrument**: {procedure.get('instrument', 'N/A')}",
+        f"**Stage Reached**: {procedure.get('stage_reached', 'N/A')}",
+    ]
+    # Legal basis
+    legal_basis = procedure.get('legal_basis', [])
+    if legal_basis:
+        fields.append(f"**Legal Basis**: {', '.join(legal_basis)}")
+    # Subjects
+    subjects = procedure.get('subject', {})
+    if subjects:
+        subject_list = ', '.join(subjects.values())
+        fields.append(f"**Subjects**: {subject_list}")
+    return '\n'.join(fields) + '\n'
+
+
+def legacy_committees(committees):
+    if not committees:
+        return "No committees data available.\n"
+    output = ""
+    for committee in committees:
+        output += f"- **Type**: {committee.get('type', 'N/A')}\n"
+        output += f"  - **Committee**: {committee.get('committee_full', 'N/A')}\n"
+        rapporteurs = committee.get('rapporteur', [])
+        if rapporteurs:
+            r_list = ', '.join([r.get('name', 'N/A') for r in rapporteurs])
+            output += f"  - **Rapporteur(s)**: {r_list}\n"
+        shadows = committee.get('shadows', [])
+        if shadows:
+            s_list = ', '.join([s.get('name', 'N/A') for s in shadows])
+            output += f"  - **Shadows**: {s_list}\n"
+    return output
+
+
+def legacy_council(council):
+    if not council:
+        return "No council data available.\n"
+    output = ""
+    for item in council:
+        date = item.get('date', 'N/A')
+        try:
+            date = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+        output += f"- **Date**: {date}\n"
+        output += f"  - **Council**: {item.get('council', 'N/A')}\n"
+        output += f"  - **Type**: {item.get('type', 'N/A')}\n"
+    return output
+
+
+def legacy_commission(commission):
+    if not commission:
+        return "No commission data available.\n"
+    output = ""
+    for item in commission:
+        output += f"- **DG**: {item.get('dg', 'N/A')}\n"
+        output += f"  - **Commissioner**: {item.get('commissioner', 'N/A')}\n"
+    return output
+
+
+def legacy_events(events):
+    if not events:
+        return "No events data available.\n"
+    output = ""
+    for event in events:
+        date = event.get('date', 'N/A')
+        try:
+            date = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+        output += f"- **Date**: {date}\n"
+        output += f"  - **Type**: {event.get('type', 'N/A')}\n"
+        output += f"  - **Body**: {event.get('body', 'N/A')}\n"
+        # Summaries
+        summaries = event.get('summary', [])
+        if summaries:
+            output += f"  - **Summary**:\n"
+            for summary in summaries:
+                output += f"    - {summary}\n"
+    return output
+
+
+def legacy_docs(docs):
+    if not docs:
+        return "No documents available.\n"
+    output = ""
+    for doc in docs:
+        date = doc.get('date', 'N/A')
+        try:
+            date = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+        output += f"- **Date**: {date}\n"
+        output += f"  - **Type**: {doc.get('type', 'N/A')}\n"
+        output += f"  - **Body**: {doc.get('body', 'N/A')}\n"
+        # Document links
+        doc_items = doc.get('docs', [])
+        if doc_items:
+            output += f"  - **Documents**:\n"
+            for d in doc_items:
+                title = d.get('title', 'Document')
+                url = d.get('url', None)
+                if url:
+                    output += f"    - [{title}]({url})\n"
+                else:
+                    output += f"    - {title}\n"
+        # Summaries
+        summaries = doc.get('summary', [])
+        if summaries:
+            output += f"  - **Summary**:\n"
+            for summary in summaries:
+                output += f"    - {summary}\n"
+    return output
+
+
+def legacy_details(dossier):
+    # How on_law_select assembled the details before
+    meta = dossier.get('meta', {})
+    docs = dossier.get('docs', [])
+    details = f"# Details of the Selected Law\n\n"
+    details += f"## Meta\n{legacy_meta(meta)}\n"
+    details += f"## Procedure\n{legacy_procedure(dossier.get('procedure', {}))}\n"
+    details += f"## Committees\n{legacy_committees(dossier.get('committees', []))}\n"
+    details += f"## Council\n{legacy_council(dossier.get('council', []))}\n"
+    details += f"## Commission\n{legacy_commission(dossier.get('commission', []))}\n"
+    details += f"## Events\n{legacy_events(dossier.get('events', []))}\n"
+    details += f"## Documents\n{legacy_docs(docs)}\n"
+    proposal_url = latest_proposal_url(dossier)
+    if proposal_url:
+        details += f"\n## Latest Proposal Link\n[View Proposal]({proposal_url})\n"
+    elif not docs:
+        details += "\n**No documents available.**\n"
+    elif latest_proposal(dossier) is None:
+        details += "\n**No legislative proposals found.**\n"
+    else:
+        details += "\n**No link to the latest proposal found.**\n"
+    return details
+
+
+def largest_dossiers(path, count):
+    with open(path, 'rb') as file:
+        spans = sorted(((len(line), offset) for offset, line in iter_dump_lines(file)), reverse=True)[:count]
+        dossiers = []
+        for length, offset in spans:
+            file.seek(offset)
+            dossiers.append(json.loads(file.read(length)))
+    return dossiers
+
+
+def _median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run(dossiers, repeat=20):
+    mismatches = sum(legacy_details(d) != render._render(d, None) for d in dossiers)
+    results = []
+    for dossier in dossiers:
+        events = len(dossier.get('events', []))
+
+        def cold():
+            render.format_date.cache_clear()
+            render._rendered.clear()
+            render.render_details(dossier)
+
+        results.append({
+            'reference': dossier.get('procedure', {}).get('reference'), 'events': events,
+            'legacy_ms': _median_ms(lambda: legacy_details(dossier), repeat),
+            'full_ms': _median_ms(lambda: render._render(dossier, None), repeat),
+            'first_page_ms': _median_ms(cold, repeat),
+            'memoized_ms': _median_ms(lambda: render.render_details(dossier), repeat),
+        })
+    return results, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dump', help='Use an existing dump instead of a synthetic one')
+    parser.add_argument('--largest', type=int, default=10, help='Number of largest dossiers to time')
+    parser.add_argument('--events', type=int, default=400, help='Mean events per synthetic dossier')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.dump or write_dump(os.path.join(tmp, 'ep_dossiers.json'), 200, events=args.events)
+        dossiers = largest_dossiers(path, args.largest)
+    results, mismatches = run(dossiers, args.repeat)
+    print(f"{'reference':>16} {'events':>6} {'legacy':>9} {'join':>9} {'1st page':>9} {'memoized':>9}")
+    for r in results:
+        print(f"{r['reference']:>16} {r['events']:>6} {r['legacy_ms']:7.2f}ms {r['full_ms']:7.2f}ms "
+              f"{r['first_page_ms']:7.2f}ms {r['memoized_ms']:7.3f}ms")
+    print(f"output differs from the old formatters for {mismatches} of {len(dossiers)} dossiers")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
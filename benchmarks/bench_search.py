@@ -0,0 +1,77 @@
+"""Latency of ranked, faceted dossier search over the SQLite index.
+
+Run from the repository root: ``python -m benchmarks.bench_search --dossiers 10000``.
+Exits non-zero if any query's p95 latency exceeds the budget.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import write_dump
+from dossier_index import build_index, connect, facet_values, search_dossiers
+from dossiers import COD_TYPE
+
+BUDGET_MS = 50.0
+
+QUERIES = [
+    {},
+    {'procedure_type': COD_TYPE},
+    {'query': 'data'},
+    {'query': 'data protection'},
+    {'query': 'cyber', 'procedure_type': COD_TYPE},
+    {'query': 'artificial intelligence', 'committee': 'LIBE'},
+    {'query': 'regulation market digital', 'date_from': '2015-01-01', 'date_to': '2020-12-31'},
+    {'query': 'health', 'stage': 'Procedure completed', 'procedure_type': COD_TYPE},
+    {'stage': 'Awaiting committee decision', 'committee': 'ITRE'},
+    {'query': 'energy', 'offset': 200},
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run(conn, repeat=20):
+    results = []
+    for kwargs in QUERIES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, total = search_dossiers(conn, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+        results.append({'query': kwargs, 'total': total, 'p50_ms': statistics.median(timings),
+                        'p95_ms': percentile(timings, 0.95), 'max_ms': max(timings)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dossiers', type=int, default=10000)
+    parser.add_argument('--dump', help='Use an existing dump instead of a synthetic one')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.dump or write_dump(os.path.join(tmp, 'ep_dossiers.json'), args.dossiers)
+        conn = connect(os.path.join(tmp, 'index.sqlite'))
+        start = time.perf_counter()
+        build_index(conn, path)
+        print(f"indexed {path} in {time.perf_counter() - start:.1f}s, facets: "
+              f"{ {k: len(v) for k, v in facet_values(conn).items()} }")
+        results = run(conn, args.repeat)
+        conn.close()
+    slow = 0
+    for r in results:
+        flag = '' if r['p95_ms'] <= args.budget_ms else '  OVER BUDGET'
+        slow += bool(flag)
+        print(f"p50={r['p50_ms']:6.1f}ms p95={r['p95_ms']:6.1f}ms max={r['max_ms']:6.1f}ms "
+              f"total={r['total']:<6} {r['query']}{flag}")
+    sys.exit(1 if slow else 0)
+
+
+if __name__ == '__main__':
+    main()
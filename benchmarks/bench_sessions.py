@@ -0,0 +1,107 @@
+"""Load test of many concurrent UI sessions selecting different laws.
+
+Run from the repository root: ``python -m benchmarks.bench_sessions --sessions 20``.
+Each session executes main.py like ``panel serve`` does, they then all
+select a different law at the same time. Fails if any session ends up
+showing another session's law or text, and reports memory per session.
+Proposal texts are put in a temporary document cache, nothing is downloaded.
+"""
+import argparse
+import asyncio
+import os
+import runpy
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def rss_mb():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+async def run(sessions, timeout=60.0):
+    # Imported here, the environment has to point at the temporary data first
+    from documents import get_cache
+    from dossier_index import ensure_index
+    from dossiers import COD_TYPE, DUMP_PATH, iter_dossiers, latest_proposal_url
+
+    ensure_index()[0].close()
+    cache = get_cache()
+    for dossier in iter_dossiers(DUMP_PATH, COD_TYPE):
+        url = latest_proposal_url(dossier)
+        if url:
+            cache.store(url, f"Proposal of {dossier['procedure']['reference']}".encode(), 'text/plain')
+
+    rss_start = rss_mb()
+    namespaces = [runpy.run_path(MAIN, run_name='session0')]
+    rss_first = rss_mb()
+    namespaces += [runpy.run_path(MAIN, run_name=f'session{i}') for i in range(1, sessions)]
+    rss_all = rss_mb()
+    shared = len({id(ns['dossier_store']) for ns in namespaces}) == 1
+
+    page_size = namespaces[0]['PAGE_SIZE']
+    chosen = []
+    for i, ns in enumerate(namespaces):
+        await ns['search_laws'](None)
+        for _ in range(i // page_size):
+            await ns['change_page'](1)(None)
+        row = i % page_size
+        chosen.append(ns['laws_table'].value.iloc[row]['ID'])
+
+    start = time.perf_counter()
+    for i, ns in enumerate(namespaces):
+        # Fires the session's on_law_select, all sessions load at the same time
+        ns['laws_table'].selection = [i % page_size]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not all(ns['session']['law_text'] for ns in namespaces):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    errors = []
+    for i, (ns, reference) in enumerate(zip(namespaces, chosen)):
+        state = ns['session']
+        if state['vorgang_id'] != reference:
+            errors.append(f"session {i}: selected {state['vorgang_id']}, expected {reference}")
+        if state['law_text'] != f"Proposal of {reference}":
+            errors.append(f"session {i}: law text {state['law_text']!r} does not belong to {reference}")
+        if reference not in (ns['details_pane'].object or ''):
+            errors.append(f"session {i}: details do not show {reference}")
+    return {
+        'sessions': sessions, 'distinct_laws': len(set(chosen)), 'seconds': elapsed, 'errors': errors,
+        'shared_store': shared, 'first_session_mb': rss_first - rss_start,
+        'per_session_mb': (rss_all - rss_first) / max(sessions - 1, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--dossiers', type=int, default=2000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'PARLTRACK_DUMP': os.path.join(tmp, 'ep_dossiers.json'),
+            'PARLTRACK_DATA': tmp,
+            'PARLTRACK_INDEX': os.path.join(tmp, 'ep_dossiers.sqlite'),
+            'PARLTRACK_DOC_CACHE': os.path.join(tmp, 'documents'),
+            'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', 'not-used'),
+        })
+        from benchmarks.synthetic import write_dump
+        write_dump(os.environ['PARLTRACK_DUMP'], args.dossiers, cod_fraction=0.5)
+        result = asyncio.run(run(args.sessions))
+    print(f"{result['sessions']} sessions selected {result['distinct_laws']} different laws, "
+          f"all loaded after {result['seconds']:.2f}s")
+    print(f"dossier store shared by all sessions: {result['shared_store']}")
+    print(f"memory: {result['first_session_mb']:.1f} MB for the first session (including imports), "
+          f"{result['per_session_mb']:.2f} MB per additional session")
+    for error in result['errors']:
+        print(error)
+    print(f"cross-talk errors: {len(result['errors'])}")
+    sys.exit(1 if result['errors'] or not result['shared_store'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""Local stand-ins for the external services main.py talks to."""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from analysis import AnalysisResult, BatchResult, LawSummary, ProfileRelevance, RelevanceResult, TopicAnalysis
+from benchmarks.synthetic import make_pdf
+
+# Words that make the stub consider a law part of a predefined thematic area
+TOPIC_KEYWORDS = {
+    'Data Protection': ('data protection', 'personal data', 'privacy'),
+    'Data Regulation': ('data governance', 'data sharing', 'data act', 'data'),
+    'Digital Products and Services': ('digital services', 'platform', 'online', 'digital'),
+    'Artificial Intelligence': ('artificial intelligence', 'ai system', 'intelligence'),
+    'Cybersecurity': ('cybersecurity', 'network and information', 'resilience'),
+}
+
+
+class StubRateLimitError(Exception):
+    """Raised by the stub to simulate a 429 from the provider."""
+
+
+def _words(text):
+    return {w for w in re.findall(r'[a-z]{5,}', text.lower())}
+
+
+def _between(prompt, start, end):
+    # Markers are regular expressions, so whole-law and section prompts both match
+    match = re.search(f'{start}(.*?){end}', prompt, re.DOTALL)
+    return match.group(1) if match else ''
+
+
+def _bullets(text):
+    return dict(re.findall(r'^\t•\t(.+?): (.*)$', text, re.MULTILINE))
+
+
+def _topic_analyses(law, topics=TOPIC_KEYWORDS):
+    lowered = law.lower()
+    analyses = []
+    for topic in topics:
+        hits = [k for k in TOPIC_KEYWORDS.get(topic, ()) if k in lowered]
+        analyses.append(TopicAnalysis(
+            topic=topic, relevant=bool(hits),
+            reason=f"Mentions {', '.join(hits)}." if hits else "No related provisions.",
+        ))
+    return analyses
+
+
+def _relevance(law, company):
+    overlap = sorted(_words(law) & _words(company))
+    if overlap:
+        return True, f"The law concerns {', '.join(overlap[:5])}."
+    return False, "No overlap with the company's activities."
+
+
+class StubChatModel:
+    """Answers structured-output requests like ChatOpenAI, without a network.
+
+    Answers are derived from keywords in the prompt, so they are deterministic
+    for a given input. ``latency`` seconds are spent per request and a
+    ``failure_rate`` share of requests raise StubRateLimitError.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def with_structured_output(self, schema):
+        return _StructuredStub(self, schema)
+
+    def answer(self, schema, prompt):
+        if schema is RelevanceResult:
+            law = _between(prompt, r'Given the following (?:section \d+ of \d+ of a )?law text:',
+                           'And the following description of a company:')
+            company = _between(prompt, 'And the following description of a company:', 'Question:')
+            is_relevant, reason = _relevance(law, company)
+            return RelevanceResult(is_relevant=is_relevant, reason=reason)
+        if schema is AnalysisResult:
+            law = _between(prompt, r'Create a brief summary of the following (?:section \d+ of \d+ of the )?law text:',
+                           'Then analyze whether').strip()
+            return AnalysisResult(summary=law[:200], analyses=_topic_analyses(law))
+        if schema is BatchResult:
+            law = _between(prompt, r'Analyze the following [^:\n]*:', 'Create a brief summary of it.').strip()
+            topics = _bullets(_between(prompt, 'The subject areas are:', 'The companies are described'))
+            profiles = _bullets(_between(prompt, 'The companies are described by the following profiles:',
+                                         'Analyze the following'))
+            relevances = []
+            for name, company in profiles.items():
+                is_relevant, reason = _relevance(law, company)
+                relevances.append(ProfileRelevance(profile=name, is_relevant=is_relevant, reason=reason))
+            return BatchResult(summary=law[:200], analyses=_topic_analyses(law, topics), profiles=relevances)
+        if schema is LawSummary:
+            summaries = _between(prompt, 'sections of one law:', 'Combine them').split()
+            return LawSummary(summary=' '.join(summaries[:40]))
+        raise NotImplementedError(f"The stub cannot answer {schema.__name__}")
+
+
+class _StructuredStub:
+
+    def __init__(self, model, schema):
+        self.model = model
+        self.schema = schema
+
+    def invoke(self, prompt):
+        with self.model._lock:
+            self.model.requests += 1
+            fail = self.model._rng.random() < self.model.failure_rate
+        time.sleep(self.model.latency)
+        if fail:
+            raise StubRateLimitError('429 Too Many Requests (stub)')
+        return self.model.answer(self.schema, prompt)
+
+
+class _StubServer:
+    """A local HTTP/1.1 server in a background thread, counting what clients did.
+
+    Each request waits ``latency`` seconds before it is answered, like a
+    distant host would, each new connection ``connect_latency`` seconds more
+    for the TCP/TLS handshake, and a ``failure_rate`` share of requests fail.
+    ``requests`` and ``connections`` allow checking keep-alive reuse.
+    Subclasses answer in do_get/do_post.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0, connect_latency=0.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.connections = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _begin(self):
+        # Counts the request, waits the latency and tells whether it should fail
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.failure_rate
+            self.failures += fail
+        time.sleep(self.latency)
+        return fail
+
+    def do_get(self, request):
+        request.reply(404, b'Not Found', 'text/plain')
+
+    def do_post(self, request):
+        request.reply(404, b'Not Found', 'text/plain')
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections open until the client closes them
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes, Nagle would hold the body back on a kept-alive socket
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+                time.sleep(stub.connect_latency)
+
+            def do_GET(self):
+                stub.do_get(self)
+
+            def do_POST(self):
+                stub.do_post(self)
+
+            def body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def reply(self, status, body, content_type=None, etag=None):
+                self.send_response(status)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class StubDocumentServer(_StubServer):
+    """Serves a synthetic proposal PDF of ``pages`` pages for every path.
+
+    Failing requests get a 503. ETags are sent and honoured with 304s.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, pages=20, seed=0, connect_latency=0.0):
+        super().__init__(latency, failure_rate, seed, connect_latency)
+        self.pages = pages
+        self._documents = {}
+
+    def document(self, path):
+        """The PDF served at a path, the same one on every request."""
+        with self._lock:
+            if path not in self._documents:
+                content = make_pdf(self.pages, seed=zlib.crc32(path.encode()), words_per_page=300)
+                self._documents[path] = (content, f'"{hashlib.sha256(content).hexdigest()[:16]}"')
+            return self._documents[path]
+
+    def do_get(self, request):
+        if self._begin():
+            request.reply(503, b'Service Unavailable (stub)', 'text/plain')
+            return
+        content, etag = self.document(request.path)
+        if request.headers.get('If-None-Match') == etag:
+            request.reply(304, b'', etag=etag)
+            return
+        request.reply(200, content, 'application/pdf', etag)
+
+
+class StubOpenAIServer(_StubServer):
+    """Answers OpenAI chat completion requests for the analysis schemas, like the API would.
+
+    Point ChatOpenAI at ``base_url + '/v1'``. Structured output requested
+    as a tool call (function calling) or as a JSON schema response format
+    is answered by StubChatModel, with estimated token usage. Failing
+    requests get a 429.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0, connect_latency=0.0, schemas=None):
+        super().__init__(latency, failure_rate, seed, connect_latency)
+        self.model = StubChatModel()
+        schemas = schemas or (RelevanceResult, AnalysisResult, BatchResult, LawSummary)
+        self.schemas = {schema.__name__: schema for schema in schemas}
+
+    def do_post(self, request):
+        payload = json.loads(request.body() or b'{}')
+        if self._begin():
+            error = {'error': {'message': 'Rate limit reached (stub)', 'type': 'rate_limit_exceeded'}}
+            request.reply(429, json.dumps(error).encode(), 'application/json')
+            return
+        if not request.path.endswith('/chat/completions'):
+            request.reply(404, b'{}', 'application/json')
+            return
+        content = payload['messages'][-1]['content']
+        prompt = content if isinstance(content, str) else ' '.join(part.get('text', '') for part in content)
+        tools = payload.get('tools') or []
+        response_format = payload.get('response_format') or {}
+        if tools:
+            name = tools[0]['function']['name']
+        else:
+            name = response_format.get('json_schema', {}).get('name')
+        schema = self.schemas.get(name)
+        if schema is None:
+            request.reply(400, json.dumps({'error': {'message': f"Unknown schema {name!r}"}}).encode(),
+                          'application/json')
+            return
+        answer = self.model.answer(schema, prompt).json()
+        message = {'role': 'assistant', 'content': None}
+        if tools:
+            message['tool_calls'] = [{'id': 'call_stub', 'type': 'function',
+                                      'function': {'name': name, 'arguments': answer}}]
+        else:
+            message['content'] = answer
+        prompt_tokens = sum(len(str(m.get('content') or '')) for m in payload['messages']) // 4 + 1
+        completion_tokens = len(answer) // 4 + 1
+        body = {
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': payload.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': message, 'finish_reason': 'tool_calls' if tools else 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }
+        request.reply(200, json.dumps(body).encode(), 'application/json')
@@ -0,0 +1,233 @@
+"""Reproducible timings and memory of main.py's paths, saved as JSON to compare across commits.
+
+Run from the repository root:
+``python -m benchmarks.suite --dossiers 1000 10000 --output results/$(git rev-parse --short HEAD).json``
+and compare with an earlier run by adding ``--compare results/<earlier>.json``.
+
+For each dump size a synthetic dump is generated, then the following are
+timed (p50/p95 over ``--repeat`` runs) and their peak Python allocations
+measured with tracemalloc in one extra run:
+
+- index: building the dossier index of the dump, timed once
+- get_vorgaenge: the first page of the law list, a keyword search and a committee filter
+- select_render: decoding a selected law from the dump and rendering its details
+- fetch_document_text: a proposal from the stub document host, downloaded and cached
+- analyze_relevance / perform_predefined_analysis: on a proposal, against the stub model
+
+The model is StubChatModel in this process by default. With ``--llm http``
+ChatOpenAI talks to StubOpenAIServer instead, which needs langchain-openai.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from metrics import quantile
+
+CASES = ('index', 'get_vorgaenge', 'select_render', 'fetch_document_text',
+         'analyze_relevance', 'perform_predefined_analysis')
+# p50 this much slower than the baseline counts as a regression
+REGRESSION_RATIO = 1.2
+
+COMPANY = ("We run an online platform processing personal data of our customers, "
+           "offering digital services and cloud storage with strong cybersecurity.")
+
+
+def measure(func, repeat, setup=None):
+    """p50/p95/max seconds of ``func`` over ``repeat`` runs, then its peak allocations in one traced run."""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings.sort()
+    return {'runs': repeat, 'p50': statistics.median(timings), 'p95': quantile(timings, 0.95),
+            'max': timings[-1], 'peak_mb': peak / 2**20}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_llm(kind, latency, stack):
+    if kind == 'stub':
+        from benchmarks.stubs import StubChatModel
+        return StubChatModel(latency=latency)
+    from analysis import get_llm
+    from benchmarks.stubs import StubOpenAIServer
+    server = StubOpenAIServer(latency=latency).start()
+    stack.append(server)
+    return get_llm(base_url=server.url('v1'))
+
+
+def run_size(dossiers, tmp, args, document_server, llm):
+    import documents
+    from analysis import analyze_relevance, perform_predefined_analysis
+    from benchmarks.synthetic import write_dump
+    from dossier_index import build_index, connect
+    from render import _rendered, render_details
+    from result_cache import ResultCache
+    from store import DossierStore
+
+    dump = write_dump(os.path.join(tmp, f"dump-{dossiers}.json"), dossiers, cod_fraction=args.cod_fraction,
+                      events=args.events, docs=args.docs, proposal_base=document_server.url('com'))
+    index = os.path.join(tmp, f"index-{dossiers}.sqlite")
+    results = {}
+
+    def build():
+        if os.path.exists(index):
+            os.remove(index)
+        conn = connect(index)
+        build_index(conn, dump)
+        conn.close()
+
+    # Only timed once, a cold build of a large dump takes a while
+    results['index'] = measure(build, 1)
+
+    store = DossierStore(dump, index)
+    committee = store.facets()['committee'][0]
+    queries = [{}, {'query': 'data protection'}, {'committee': committee}]
+    results['get_vorgaenge'] = measure(lambda: [store.search(limit=20, **q) for q in queries], args.repeat)
+
+    rows, _ = store.search(limit=-1)
+    references = random.Random(0).sample([row['reference'] for row in rows], min(args.repeat + 1, len(rows)))
+    picks = iter(references * 2)
+
+    def select_render():
+        dossier = store.get(next(picks))
+        render_details(dossier)
+
+    def clear_rendered():
+        _rendered.clear()
+
+    results['select_render'] = measure(select_render, args.repeat, setup=clear_rendered)
+
+    cache_dirs = iter(range(args.repeat + 1))
+    cache = {}
+
+    def cold_cache():
+        cache['documents'] = documents.DocumentCache(os.path.join(tmp, f"documents-{dossiers}-{next(cache_dirs)}"))
+
+    url = document_server.url(f"com/{dossiers}/proposal.pdf")
+    results['fetch_document_text'] = measure(lambda: documents.fetch_document_text(url, cache['documents']),
+                                             args.repeat, setup=cold_cache)
+    law_text = documents.fetch_document_text(url, cache['documents'])
+
+    # A disabled result cache, every run asks the model
+    no_cache = ResultCache(os.path.join(tmp, 'results.sqlite'), max_entries=0)
+    results['analyze_relevance'] = measure(
+        lambda: analyze_relevance(law_text, COMPANY, llm=llm, raise_errors=True, cache=no_cache), args.repeat)
+    results['perform_predefined_analysis'] = measure(
+        lambda: perform_predefined_analysis(law_text, llm=llm, raise_errors=True, cache=no_cache), args.repeat)
+    return {'dossiers': dossiers, 'dump_mb': os.path.getsize(dump) / 2**20, 'cases': results}
+
+
+def compare(current, baseline, ratio=REGRESSION_RATIO):
+    """Rows of (dossiers, case, baseline p50, current p50, ratio, regressed) for cases in both runs."""
+    previous = {run['dossiers']: run['cases'] for run in baseline['runs']}
+    rows = []
+    for run in current['runs']:
+        for case, result in run['cases'].items():
+            before = previous.get(run['dossiers'], {}).get(case)
+            if before:
+                change = result['p50'] / before['p50'] if before['p50'] else float('inf')
+                rows.append((run['dossiers'], case, before['p50'], result['p50'], change, change > ratio))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dossiers', type=int, nargs='+', default=[1000, 10000], help='Dump sizes to run')
+    parser.add_argument('--cod-fraction', type=float, default=0.1)
+    parser.add_argument('--events', type=int, default=20, help='Mean events per dossier')
+    parser.add_argument('--docs', type=int, default=10, help='Mean documents per dossier')
+    parser.add_argument('--pages', type=int, default=60, help='Pages of the stub proposal PDFs')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--http-latency', type=float, default=0.05, help='Seconds the stub document host waits')
+    parser.add_argument('--llm', choices=['stub', 'http'], default='stub')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Seconds the stub model waits per request')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Results JSON of an earlier run to compare with')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help=f"Exit with 1 if a case got more than {REGRESSION_RATIO}x slower than the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'PARLTRACK_DATA': tmp,
+            'PARLTRACK_DOC_CACHE': os.path.join(tmp, 'documents'),
+            'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', 'not-used'),
+        })
+        from benchmarks.stubs import StubDocumentServer
+
+        servers = []
+        try:
+            document_server = StubDocumentServer(latency=args.http_latency, pages=args.pages).start()
+            servers.append(document_server)
+            llm = make_llm(args.llm, args.llm_latency, servers)
+            runs = []
+            for dossiers in args.dossiers:
+                print(f"{dossiers} dossiers...", file=sys.stderr)
+                runs.append(run_size(dossiers, tmp, args, document_server, llm))
+        finally:
+            for server in servers:
+                server.stop()
+
+    report = {
+        'commit': git_commit(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': vars(args),
+        'runs': runs,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    print(f"{'dossiers':>8} {'case':<28} {'p50':>9} {'p95':>9} {'peak':>9}")
+    for run in runs:
+        for case in CASES:
+            r = run['cases'][case]
+            print(f"{run['dossiers']:>8} {case:<28} {r['p50'] * 1000:7.1f}ms {r['p95'] * 1000:7.1f}ms "
+                  f"{r['peak_mb']:7.1f}MB")
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        print(f"\ncompared with {args.compare} ({baseline.get('commit') or 'unknown commit'}):")
+        for dossiers, case, before, after, change, regressed in compare(report, baseline):
+            regressions += regressed
+            print(f"{dossiers:>8} {case:<28} {before * 1000:7.1f}ms -> {after * 1000:7.1f}ms "
+                  f"{change:5.2f}x{'  REGRESSION' if regressed else ''}")
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Synthetic parltrack dumps and proposal PDFs for benchmarking.
+
+Run ``python -m benchmarks.synthetic OUT.json --dossiers 10000`` to write a dump,
+or ``python -m benchmarks.synthetic OUT.pdf --pages 200`` to write a proposal PDF.
+"""
+import argparse
+import itertools
+import json
+import random
+import textwrap
+import zlib
+
+from dossiers import COD_TYPE
+
+OTHER_TYPES = [
+    'NLE - Non-legislative enactments',
+    'INI - Own-initiative procedure',
+    'BUD - Budgetary procedure',
+    'RSP - Resolutions on topical subjects',
+    'CNS - Consultation procedure',
+]
+STAGES = [
+    'Preparatory phase in Parliament',
+    'Awaiting committee decision',
+    'Awaiting Parliament 1st reading / single reading / budget 1st stage',
+    'Awaiting Council\'s 1st reading position',
+    'Procedure completed',
+    'Procedure lapsed or withdrawn',
+]
+COMMITTEES = [
+    ('LIBE', 'Civil Liberties, Justice and Home Affairs'),
+    ('ITRE', 'Industry, Research and Energy'),
+    ('IMCO', 'Internal Market and Consumer Protection'),
+    ('JURI', 'Legal Affairs'),
+    ('ECON', 'Economic and Monetary Affairs'),
+    ('ENVI', 'Environment, Public Health and Food Safety'),
+]
+SUBJECTS = {
+    '1.20.09': 'Protection of privacy and data protection',
+    '3.30.06': 'Information and communication technologies, digital technologies',
+    '3.30.07': 'Cybersecurity, cybersecurity policy',
+    '3.30.20': 'Trans-European communications networks',
+    '2.40.01': 'Free movement of capital',
+    '3.70.03': 'Climate change, ozone',
+    '4.20.01': 'Medicine, diseases',
+    '8.40.08': 'Agencies and bodies of the EU',
+}
+WORDS = (
+    'regulation directive data protection market digital services artificial intelligence '
+    'cybersecurity network information systems energy climate consumer health medicine '
+    'financial capital transport agriculture fisheries competition platform cloud '
+    'liability product safety resilience operational interoperability governance'
+).split()
+SYLLABLES = ['ab', 'cor', 'di', 'ex', 'fin', 'gra', 'hor', 'in', 'ju', 'lex', 'mar', 'nor', 'op', 'pro', 'qua', 'res', 'sta', 'tum', 'ver']
+# Domain words first, then filler words, drawn with Zipf-like frequencies
+VOCABULARY = WORDS + sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES})[:3000]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+# Policy areas with their own vocabulary, and a company each of them concerns
+POLICY_AREAS = {
+    'payments': ('payment banking credit card fintech transfer deposit lending',
+                 "We build payment processing and card issuing software for banks and fintech lenders."),
+    'health': ('patient clinical hospital pharmaceutical medical device diagnosis',
+               "We manufacture medical devices and diagnostic software used in hospitals and clinical trials."),
+    'energy': ('electricity renewable grid hydrogen emissions battery solar',
+               "We operate solar parks and battery storage connected to the electricity grid."),
+    'transport': ('vehicle railway aviation freight logistics driver truck',
+                  "We run a freight logistics company with trucks, rail freight and delivery vehicles."),
+    'food': ('food farming pesticide livestock nutrition labelling organic',
+             "We produce organic food and run livestock farms supplying supermarkets."),
+    'telecom': ('telecom spectrum broadband roaming mobile operator fibre',
+                "We are a mobile operator building fibre broadband and 5G networks."),
+    'privacy': ('personal privacy consent tracking profiling cookies advertising',
+                "We run an advertising platform that profiles users with cookies and tracking."),
+    'chemicals': ('chemical substances hazardous packaging recycling plastic waste',
+                  "We make plastic packaging and recycle chemical waste."),
+}
+# Share of a dossier's words drawn from its topic's vocabulary
+POLICY_AREA_SHARE = 0.05
+EVENT_TYPES = [
+    'Legislative proposal published',
+    'Committee referral announced in Parliament, 1st reading',
+    'Vote in committee, 1st reading',
+    'Debate in Parliament',
+    'Decision by Parliament, 1st reading',
+    'Final act signed',
+]
+DOC_TYPES = [
+    'Legislative proposal',
+    'Committee draft report',
+    'Amendments tabled in committee',
+    'Economic and Social Committee: opinion, report',
+    'Document attached to the procedure',
+]
+
+
+def make_text(rng, words, topic=None):
+    """Random words with the frequencies of the dossier vocabulary, a share of them from ``topic``."""
+    drawn = rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=words)
+    if topic:
+        topic_words = POLICY_AREAS[topic][0].split()
+        for i in range(words):
+            if rng.random() < POLICY_AREA_SHARE:
+                drawn[i] = rng.choice(topic_words)
+    return ' '.join(drawn).capitalize() + '.'
+
+
+def _date(rng, year=None):
+    year = year or rng.randint(2005, 2024)
+    return f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00"
+
+
+def make_dossier(index, rng, cod_fraction=0.1, events=20, docs=10, summary_words=400, proposal_base=None):
+    """Build one dossier with the nesting of a real parltrack record.
+
+    Each dossier belongs to one of POLICY_AREAS, recorded under meta.topic, whose
+    words are mixed into its title and summaries. With ``proposal_base`` its
+    document URLs point there instead of europarl.europa.eu, e.g. at a
+    StubDocumentServer.
+    """
+    base = proposal_base or 'http://www.europarl.europa.eu/RegData/docs_autres_institutions/commission_europeenne/com'
+
+    topic = rng.choice(sorted(POLICY_AREAS))
+    year = rng.randint(2005, 2024)
+    reference = f"{year}/{index:04d}({'COD' if rng.random() < cod_fraction else 'INI'})"
+    procedure_type = COD_TYPE if reference.endswith('(COD)') else rng.choice(OTHER_TYPES)
+    committees = rng.sample(COMMITTEES, rng.randint(1, 3))
+    subjects = dict(rng.sample(sorted(SUBJECTS.items()), rng.randint(1, 3)))
+    n_events = max(1, int(rng.gauss(events, events / 3)))
+    n_docs = max(1, int(rng.gauss(docs, docs / 3)))
+    return {
+        'meta': {
+            'source': f"https://oeil.secure.europarl.europa.eu/oeil/popups/ficheprocedure.do?reference={reference}",
+            'updated': _date(rng, 2024).replace('T00:00:00', f"T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"),
+            'topic': topic,
+        },
+        'procedure': {
+            'reference': reference,
+            'title': make_text(rng, 12, topic),
+            'type': procedure_type,
+            'subtype': 'Legislation',
+            'instrument': rng.choice(['Regulation', 'Directive', 'Decision']),
+            'stage_reached': rng.choice(STAGES),
+            'legal_basis': [f"Treaty on the Functioning of the EU TFEU {rng.randint(1, 350)}"],
+            'subject': subjects,
+        },
+        'committees': [
+            {
+                'type': 'Responsible Committee' if i == 0 else 'Committee Opinion',
+                'committee': abbr,
+                'committee_full': full,
+                'rapporteur': [{'name': f"MEP {rng.randint(1, 700)}"}],
+                'shadows': [{'name': f"MEP {rng.randint(1, 700)}"} for _ in range(rng.randint(0, 5))],
+            }
+            for i, (abbr, full) in enumerate(committees)
+        ],
+        'council': [
+            {'date': _date(rng, year), 'council': 'General Affairs', 'type': 'Debate in Council'}
+            for _ in range(rng.randint(0, 3))
+        ],
+        'commission': [{'dg': 'Communications Networks, Content and Technology', 'commissioner': 'Commissioner'}],
+        'events': [
+            {
+                'date': _date(rng, year),
+                'type': rng.choice(EVENT_TYPES),
+                'body': rng.choice(['EP', 'CSL', 'EC']),
+                'summary': [make_text(rng, summary_words // 4, topic) for _ in range(rng.randint(0, 4))],
+            }
+            for _ in range(n_events)
+        ],
+        'docs': [
+            {
+                'date': _date(rng, year),
+                'type': DOC_TYPES[0] if i == 0 else rng.choice(DOC_TYPES),
+                'body': rng.choice(['EC', 'EP', 'ESC']),
+                'docs': [{
+                    'title': f"COM({year}){index:04d}",
+                    'url': f"{base}/{year}/{index:04d}/COM_COM({year}){index:04d}_EN.pdf",
+                }],
+                'summary': [make_text(rng, summary_words // 4, topic) for _ in range(rng.randint(0, 2))],
+            }
+            for i in range(n_docs)
+        ],
+    }
+
+
+def write_dump(path, dossiers=1000, seed=0, **kwargs):
+    """Write a dump in parltrack's one-record-per-line layout, return its path."""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('[\n')
+        for i in range(dossiers):
+            prefix = ',' if i else ''
+            file.write(prefix + json.dumps(make_dossier(i, rng, **kwargs), ensure_ascii=False) + '\n')
+        file.write(']\n')
+    return path
+
+
+def make_pdf(pages=200, seed=0, words_per_page=450):
+    """Bytes of a text-only PDF with compressed page streams, like a Commission proposal."""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b" ".join([b"<< /Type /Pages /Kids [", *(f"{4 + 2 * i} 0 R".encode() for i in range(pages)),
+                   f"] /Count {pages} >>".encode()]),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i in range(pages):
+        lines = textwrap.wrap(f"Article {i + 1}. " + make_text(rng, words_per_page), 95)
+        stream = '\n'.join(['BT /F1 10 Tf 12 TL 50 800 Td'] + [f"({line}) Tj T*" for line in lines] + ['ET'])
+        data = zlib.compress(stream.encode('latin-1'))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objects.append(f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode() + data + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def write_pdf(path, pages=200, seed=0, **kwargs):
+    """Write a synthetic proposal PDF, return its path."""
+    with open(path, 'wb') as file:
+        file.write(make_pdf(pages, seed, **kwargs))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path')
+    parser.add_argument('--dossiers', type=int, default=1000)
+    parser.add_argument('--cod-fraction', type=float, default=0.1)
+    parser.add_argument('--events', type=int, default=20, help='Mean events per dossier')
+    parser.add_argument('--docs', type=int, default=10, help='Mean documents per dossier')
+    parser.add_argument('--pages', type=int, default=200, help='Pages of a PDF, for paths ending in .pdf')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.path.endswith('.pdf'):
+        write_pdf(args.path, args.pages, seed=args.seed)
+    else:
+        write_dump(args.path, args.dossiers, seed=args.seed, cod_fraction=args.cod_fraction, events=args.events,
+                   docs=args.docs)
+
+
+if __name__ == '__main__':
+    main()
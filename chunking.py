@@ -0,0 +1,103 @@
+"""Splitting law texts into token-budgeted sections and picking the ones worth analysing."""
+import os
+import re
+
+# Approximate tokens per section sent to the model
+CHUNK_TOKENS = int(os.environ.get('PARLTRACK_CHUNK_TOKENS', 1500))
+# Rough characters per token of English legal text, avoids depending on a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Words that make a section a candidate for a predefined thematic area
+TOPIC_KEYWORDS = {
+    'Data Protection': (
+        'data protection', 'personal data', 'privacy', 'data subject', 'gdpr', '2016/679', 'processing of data',
+    ),
+    'Data Regulation': (
+        'data governance', 'data sharing', 'data act', 'access to data', 'data space', 'data holder',
+        'interoperab', 'digital markets', 'gatekeeper', 'health data', 're-use of',
+    ),
+    'Digital Products and Services': (
+        'digital service', 'intermediary service', 'online platform', 'online marketplace', 'hosting service',
+        'cloud', 'software', 'digital content', 'digital product', 'app store', 'social network',
+    ),
+    'Artificial Intelligence': (
+        'artificial intelligence', 'ai system', 'machine learning', 'algorithm', 'automated decision',
+        'ai act', 'general-purpose ai',
+    ),
+    'Cybersecurity': (
+        'cybersecurity', 'cyber', 'network and information', 'information security', 'incident',
+        'resilience', 'vulnerabilit', 'nis 2', '2022/2555', 'security of',
+    ),
+}
+
+# Common words that say nothing about what a company does
+STOPWORDS = frozenset('''
+about above after again against their there these those which while would could should other under
+within without where being company companies business offer offers provide provides products services
+customers based including various through across mainly large small medium clients users ourselves
+'''.split())
+
+_PARAGRAPHS = re.compile(r'\n\s*\n')
+_SENTENCES = re.compile(r'(?<=[.;:!?])\s+')
+_WORDS = re.compile(r'[a-z][a-z-]{4,}')
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _pieces(text, max_chars):
+    # Paragraphs first, overlong paragraphs by sentence, overlong sentences by length
+    for paragraph in _PARAGRAPHS.split(text):
+        if len(paragraph) <= max_chars:
+            yield paragraph
+            continue
+        for sentence in _SENTENCES.split(paragraph):
+            for start in range(0, len(sentence), max_chars):
+                yield sentence[start:start + max_chars]
+
+
+def split_sections(text, max_tokens=None):
+    """Split a text into sections of at most ``max_tokens``, at paragraph or sentence ends where possible."""
+    max_chars = (max_tokens or CHUNK_TOKENS) * CHARS_PER_TOKEN
+    sections, current, size = [], [], 0
+    for piece in _pieces(text, max_chars):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if current and size + len(piece) + 2 > max_chars:
+            sections.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 2
+    if current:
+        sections.append('\n\n'.join(current))
+    return sections
+
+
+def _stem(word):
+    # Crude, but enough to match 'payments' with 'payment' or 'insurance' with 'insurances'
+    return word[:6]
+
+
+def description_terms(description):
+    """Stems of the distinctive words of a company description, to match sections against."""
+    return {_stem(word) for word in _WORDS.findall((description or '').lower()) if word not in STOPWORDS}
+
+
+def section_topics(section, topics=None):
+    """Predefined topics whose keywords occur in a section, with the number of matches."""
+    lowered = section.lower()
+    matches = {}
+    for topic, keywords in TOPIC_KEYWORDS.items():
+        if topics is not None and topic not in topics:
+            continue
+        count = sum(lowered.count(keyword) for keyword in keywords)
+        if count:
+            matches[topic] = count
+    return matches
+
+
+def term_matches(section, terms):
+    """Number of a section's words whose stem is among ``terms``."""
+    return sum(_stem(word) in terms for word in _WORDS.findall(section.lower()))
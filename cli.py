@@ -0,0 +1,288 @@
+"""Command line entry points that run without the Panel UI."""
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+
+from dossiers import COD_TYPE, DUMP_PATH
+from dossier_index import (
+    INDEX_PATH, REMOVED, changes_since, connect, get_checkpoint, is_stale, latest_ingest, refresh_index,
+    set_checkpoint,
+)
+from documents import DocumentCache
+from metrics import get_recorder
+from pipeline import (
+    FETCH_WORKERS, FORMATS, RowWriter, analyze, export, fetch_proposals, ingest, select_dossiers, set_workers,
+)
+from prescreen import PREDEFINED_TOPICS_TEXT
+from result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+
+def cmd_ingest(args):
+    stats = ingest(args.dump, args.index, args.force)
+    if stats is None:
+        print(f"Index {args.index} is up to date.")
+        return
+    print(f"Indexed {args.dump}: {stats['new']} new, {stats['changed']} changed, "
+          f"{stats['unchanged']} unchanged, {stats['removed']} removed.")
+    print(f"Vectorized {stats['vectorized']} dossiers for the pre-screen.")
+
+
+def cmd_cache_stats(args):
+    stats = DocumentCache(args.cache_dir).stats()
+    print(f"Documents: {stats['urls']} URLs, {stats['contents']} documents, "
+          f"{stats['bytes'] / 2**20:.1f} of {stats['max_bytes'] / 2**20:.0f} MB")
+    print(f"  hits={stats['hits']} misses={stats['misses']} revalidated={stats['revalidated']} "
+          f"evicted={stats['evicted']} hit rate={stats['hit_rate']:.1%}")
+    stats = ResultCache(args.result_cache).stats()
+    entries = ', '.join(f"{kind}={count}" for kind, count in sorted(stats['entries'].items())) or 'empty'
+    print(f"LLM results: {entries} (max {stats['max_entries']})")
+    print(f"  hits={stats['hits']} misses={stats['misses']} evicted={stats['evicted']} "
+          f"invalidated={stats['invalidated']} hit rate={stats['hit_rate']:.1%}")
+
+
+def read_company(args):
+    if args.company_file:
+        with open(args.company_file, encoding='utf-8') as file:
+            return file.read()
+    return args.company
+
+
+def read_profiles(args):
+    """Company profiles of the batched analysis, {name: description}, from --profiles-file and --profile."""
+    profiles = {}
+    if args.profiles_file:
+        with open(args.profiles_file, encoding='utf-8') as file:
+            profiles.update(json.load(file))
+    for profile in args.profile or ():
+        name, separator, description = profile.partition('=')
+        if not separator:
+            raise SystemExit(f"--profile expects NAME=DESCRIPTION, got {profile!r}")
+        profiles[name.strip()] = description.strip()
+    return profiles
+
+
+def check_screening_arguments(parser, args):
+    """Reject a screening without the company or profiles its mode needs, before any indexing or fetching."""
+    if getattr(args, 'mode', None) is None or getattr(args, 'baseline', False):
+        return
+    if args.mode == 'relevance' and not (args.company or args.company_file):
+        parser.error("--mode relevance needs --company or --company-file")
+    if args.mode == 'batch' and not (args.profile or args.profiles_file):
+        parser.error("--mode batch needs --profile or --profiles-file")
+
+
+def select_rows(args, ranking_text=None):
+    """Summary rows of the dossiers matching the search/filter arguments.
+
+    With ``ranking_text`` all matching dossiers are ranked by the local
+    pre-screen instead and the ``--limit`` closest ones are returned.
+    """
+    return select_dossiers(
+        args.dump, args.index, args.limit, ranking_text, procedure_type=None if args.all_types else COD_TYPE,
+        query=args.query, stage=args.stage, committee=args.committee, date_from=args.date_from,
+        date_to=args.date_to,
+    )
+
+
+def select_references(args, ranking_text=None):
+    return [row['reference'] for row in select_rows(args, ranking_text)]
+
+
+def add_selection_arguments(parser):
+    parser.add_argument('--query', help='Keywords the dossiers must match')
+    parser.add_argument('--stage', help='Only dossiers at this stage_reached')
+    parser.add_argument('--committee', help='Only dossiers handled by this committee, e.g. LIBE')
+    parser.add_argument('--date-from', help='Only dossiers with events on or after YYYY-MM-DD')
+    parser.add_argument('--date-to', help='Only dossiers with events on or before YYYY-MM-DD')
+    parser.add_argument('--all-types', action='store_true', help='Include non-COD procedures')
+    parser.add_argument('--limit', type=int, default=100, help='Maximum number of dossiers')
+
+
+def add_output_arguments(parser):
+    parser.add_argument('--output', help='Write to this file instead of stdout, as Parquet if it ends in .parquet')
+    parser.add_argument('--format', choices=FORMATS, help='Output format, JSONL unless --output ends in .parquet')
+
+
+def add_screening_arguments(parser):
+    parser.add_argument('--company', help='Description of the company to screen for')
+    parser.add_argument('--company-file', help='Read the company description from a file')
+    parser.add_argument('--mode', choices=['relevance', 'predefined', 'batch'], default='relevance',
+                        help='batch: all --profile companies and the predefined areas in one request per law')
+    parser.add_argument('--profile', action='append', metavar='NAME=DESCRIPTION',
+                        help='Company profile for --mode batch, repeat for more')
+    parser.add_argument('--profiles-file', help='JSON object of {name: description} profiles for --mode batch')
+    parser.add_argument('--concurrency', type=int, default=4, help='Dossiers analysed at the same time')
+    parser.add_argument('--rpm', type=float, help='Maximum LLM requests per minute')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per dossier on LLM errors')
+    add_output_arguments(parser)
+    parser.add_argument('--stub-llm', type=float, metavar='LATENCY',
+                        help='Use the local stub LLM with this latency in seconds instead of OpenAI')
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0,
+                        help='Share of stub LLM requests that fail, to exercise retries')
+
+
+def run_screening(args, references):
+    """Screen the given dossiers as configured by the screening arguments, return the report."""
+    company = read_company(args)
+    profiles = read_profiles(args) if args.mode == 'batch' else None
+    llm = None
+    if args.stub_llm is not None:
+        from benchmarks.stubs import StubChatModel
+        llm = StubChatModel(latency=args.stub_llm, failure_rate=args.stub_failure_rate)
+
+    def on_progress(done, total):
+        print(f"\r{done}/{total} screened", end='', file=sys.stderr, flush=True)
+
+    with RowWriter(args.output, args.format) as writer:
+        report = analyze(
+            references, company, mode=args.mode, concurrency=args.concurrency, requests_per_minute=args.rpm,
+            max_retries=args.retries, llm=llm, dump_path=args.dump, index_path=args.index,
+            on_result=writer.write, on_progress=on_progress, profiles=profiles,
+        )
+    relevant = sum(bool(row['relevant']) for row in report['results'])
+    print(f"\nScreened {report['dossiers']} dossiers in {report['seconds']:.1f}s "
+          f"({report['dossiers_per_minute']:.1f} dossiers/minute), {relevant} relevant, "
+          f"{report['errors']} errors.", file=sys.stderr)
+    if report.get('pairs'):
+        pairs = report['pairs']
+        seconds = sum(row['seconds'] for row in report['results'])
+        print(f"{report['requests']} requests for {pairs} dossier x profile pairs: "
+              f"{report['prompt_tokens'] / pairs:.0f} prompt and {report['completion_tokens'] / pairs:.0f} "
+              f"completion tokens (estimated) and {seconds / pairs:.2f}s latency per pair.", file=sys.stderr)
+    return report
+
+
+def cmd_screen(args):
+    ranking_text = None
+    if args.prescreen:
+        if args.mode == 'relevance':
+            ranking_text = read_company(args)
+        elif args.mode == 'batch':
+            ranking_text = ' '.join([*read_profiles(args).values(), PREDEFINED_TOPICS_TEXT])
+        else:
+            ranking_text = PREDEFINED_TOPICS_TEXT
+    run_screening(args, select_references(args, ranking_text))
+
+
+def cmd_fetch(args):
+    def on_progress(done, total):
+        print(f"\r{done}/{total} fetched", end='', file=sys.stderr, flush=True)
+
+    stats = fetch_proposals(select_references(args), args.index, args.workers, on_progress=on_progress)
+    print(f"\nFetched {stats['fetched']} proposals in {stats['seconds']:.1f}s, {stats['failed']} failed, "
+          f"{stats['without_proposal']} dossiers without a proposal.", file=sys.stderr)
+
+
+def cmd_export(args):
+    count = export(select_rows(args), args.output, args.format)
+    print(f"Exported {count} dossiers.", file=sys.stderr)
+
+
+def cmd_update(args):
+    """Ingest the dump if it changed and re-analyse only what changed since the job's last run."""
+    conn = connect(args.index)
+    try:
+        stats = refresh_index(conn, args.dump) if is_stale(conn, args.dump) else None
+        if stats:
+            print(f"Indexed {args.dump}: {stats['new']} new, {stats['changed']} changed, "
+                  f"{stats['removed']} removed.", file=sys.stderr)
+        checkpoint = get_checkpoint(conn, args.job)
+        latest = latest_ingest(conn)
+        if args.baseline:
+            set_checkpoint(conn, args.job, latest)
+            print(f"Job {args.job!r} now starts after ingest {latest}.", file=sys.stderr)
+            return
+        changes = changes_since(conn, checkpoint, None if args.all_types else COD_TYPE)
+    finally:
+        conn.close()
+    pending = [c['reference'] for c in changes
+               if c['change'] != REMOVED and (c['new_proposal'] or not args.new_proposals_only)]
+    removed = sum(c['change'] == REMOVED for c in changes)
+    print(f"{len(changes)} dossiers changed since ingest {checkpoint}: re-analysing {len(pending)}, "
+          f"{removed} removed.", file=sys.stderr)
+    if pending:
+        report = run_screening(args, pending)
+        if report['errors']:
+            # Keep the checkpoint so the next run retries the failed dossiers
+            print(f"Not advancing job {args.job!r} because of errors.", file=sys.stderr)
+            return
+    conn = connect(args.index)
+    try:
+        set_checkpoint(conn, args.job, latest)
+    finally:
+        conn.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dump', default=DUMP_PATH, help='Path of the parltrack ep_dossiers.json dump')
+    parser.add_argument('--index', default=INDEX_PATH, help='Path of the SQLite dossier index')
+    parser.add_argument('--extract-workers', type=int, help='Processes extracting the pages of large PDFs')
+    parser.add_argument('--section-workers', type=int, help='Sections of one law analysed at the same time')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='Write stage timings when done: Prometheus text for .prom/.txt, spans as JSONL otherwise')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='Build or refresh the dossier index from the dump')
+    ingest.add_argument('--force', action='store_true', help='Reindex even if the dump did not change')
+    ingest.set_defaults(func=cmd_ingest)
+
+    fetch = subparsers.add_parser('fetch', help='Download the latest proposals of the selected dossiers into the cache')
+    add_selection_arguments(fetch)
+    fetch.add_argument('--workers', type=int, default=FETCH_WORKERS, help='Proposals downloaded at the same time')
+    fetch.set_defaults(func=cmd_fetch)
+
+    screen = subparsers.add_parser('screen', aliases=['analyze'],
+                                   help='Screen many dossiers for relevance in one batch')
+    add_selection_arguments(screen)
+    screen.add_argument('--prescreen', action='store_true',
+                        help='Rank all matching dossiers locally against the company (or the predefined topics) '
+                             'and only screen the --limit closest')
+    add_screening_arguments(screen)
+    screen.set_defaults(func=cmd_screen)
+
+    export_ = subparsers.add_parser('export', help='Write the summary rows of the selected dossiers')
+    add_selection_arguments(export_)
+    add_output_arguments(export_)
+    export_.set_defaults(func=cmd_export)
+
+    update = subparsers.add_parser(
+        'update', help='Ingest a new dump and re-analyse only the dossiers that changed since the last update')
+    update.add_argument('--job', default='update', help='Name of the checkpoint, one per company/mode')
+    update.add_argument('--baseline', action='store_true',
+                        help='Mark everything indexed so far as processed without analysing it')
+    update.add_argument('--new-proposals-only', action='store_true',
+                        help='Only re-analyse dossiers whose latest legislative proposal changed')
+    update.add_argument('--all-types', action='store_true', help='Include non-COD procedures')
+    add_screening_arguments(update)
+    update.set_defaults(func=cmd_update)
+
+    cache_stats = subparsers.add_parser('cache-stats', help='Show document and LLM result cache hit/miss counters')
+    cache_stats.add_argument('--cache-dir', help='Document cache directory')
+    cache_stats.add_argument('--result-cache', help='LLM result cache file')
+    cache_stats.set_defaults(func=cmd_cache_stats)
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_screening_arguments(parser, args)
+    set_workers(args.extract_workers, args.section_workers)
+    try:
+        args.func(args)
+    except sqlite3.OperationalError as e:
+        # E.g. another ingest held the index longer than PARLTRACK_INDEX_BUSY_TIMEOUT
+        raise SystemExit(f"Error accessing the index {args.index}: {e}")
+    finally:
+        if args.metrics:
+            get_recorder().export(args.metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from itertools import repeat
+
+import requests
+from PyPDF2 import PdfReader
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dossiers import DATA_DIR
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get('PARLTRACK_DOC_CACHE', os.path.join(DATA_DIR, 'documents'))
+# Total size of cached raw documents and extracted text before LRU eviction kicks in
+CACHE_MAX_BYTES = int(os.environ.get('PARLTRACK_DOC_CACHE_BYTES', 1024 * 1024 * 1024))
+# Cached documents younger than this are served without asking the server
+CACHE_MAX_AGE = float(os.environ.get('PARLTRACK_DOC_CACHE_MAX_AGE', 24 * 3600))
+# Processes extracting the pages of large PDFs in parallel, 1 extracts in the calling thread
+EXTRACT_WORKERS = int(os.environ.get('PARLTRACK_EXTRACT_WORKERS', os.cpu_count() or 1))
+# Documents with fewer pages are not worth shipping to the process pool
+PARALLEL_MIN_PAGES = int(os.environ.get('PARLTRACK_PARALLEL_MIN_PAGES', 16))
+# Seconds to connect to a document host and to wait for its next bytes
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('PARLTRACK_HTTP_CONNECT_TIMEOUT', 10))
+HTTP_READ_TIMEOUT = float(os.environ.get('PARLTRACK_HTTP_READ_TIMEOUT', 60))
+# Retries of failed connections and 429/5xx responses, with exponential backoff
+HTTP_RETRIES = int(os.environ.get('PARLTRACK_HTTP_RETRIES', 3))
+# Keep-alive connections kept open per host
+HTTP_POOL_SIZE = int(os.environ.get('PARLTRACK_HTTP_POOL_SIZE', 16))
+# Documents of the listed laws downloaded ahead at the same time, 0 disables prefetching
+PREFETCH_WORKERS = int(os.environ.get('PARLTRACK_PREFETCH_WORKERS', 4))
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_sha256 ON urls (sha256);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COUNTERS = ('hits', 'misses', 'revalidated', 'evicted')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide HTTP session, connections to the document hosts stay open between fetches."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=HTTP_RETRIES, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                          allowed_methods=('GET', 'HEAD'))
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def iter_pdf_pages(content, pages=None):
+    """Yield (page number, text) of a PDF lazily, for all pages or the given ones."""
+    reader = PdfReader(BytesIO(content))
+    for number in range(len(reader.pages)) if pages is None else pages:
+        yield number, reader.pages[number].extract_text() or ''
+
+
+def _extract_pages(content, pages):
+    # Runs in the process pool, so it has to be a picklable top-level function
+    return list(iter_pdf_pages(content, pages))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """Process-wide pool for PDF extraction, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked, the server process runs threads
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def extract_pdf_pages(content, workers=None):
+    """Text of a PDF's pages, and its total page count.
+
+    Long PDFs are extracted in parallel across ``workers`` processes.
+    """
+    reader = PdfReader(BytesIO(content))
+    count = len(reader.pages)
+    workers = EXTRACT_WORKERS if workers is None else workers
+    if workers > 1 and count >= PARALLEL_MIN_PAGES:
+        size = -(-count // workers)
+        chunks = [range(start, min(start + size, count)) for start in range(0, count, size)]
+        try:
+            # Chunks come back in order, each with its pages in order
+            results = get_process_pool().map(_extract_pages, repeat(content), chunks)
+            return [text for result in results for _, text in result], count
+        except BrokenProcessPool as e:
+            logger.warning(f"PDF extraction pool failed ({e}), extracting in this process.")
+    return [page.extract_text() or '' for page in reader.pages], count
+
+
+def extract_text(content, content_type):
+    """Extract text from a downloaded document, or None for unsupported types."""
+    if 'application/pdf' in content_type:
+        texts, _ = extract_pdf_pages(content)
+        logger.info("Text extraction from PDF successful.")
+        return ''.join(texts)
+    elif 'text/html' in content_type or 'text/plain' in content_type:
+        # If it's HTML or plain text
+        charset = content_type.partition('charset=')[2].split(';')[0].strip() or 'utf-8'
+        text = content.decode(charset, errors='replace')
+        logger.info("Text extraction from HTML/plain text successful.")
+        return text
+    logger.warning("Unknown content type, cannot extract text.")
+    return None
+
+
+class DocumentCache:
+    """On-disk cache of fetched documents and their extracted text.
+
+    Raw bytes and text are stored once per content hash, URLs point at a hash
+    together with the validators needed for conditional requests. The least
+    recently used contents are evicted once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, max_age=None):
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age = CACHE_MAX_AGE if max_age is None else max_age
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'cache.sqlite'), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(CACHE_SCHEMA)
+
+    def _path(self, sha256, suffix):
+        return os.path.join(self.cache_dir, sha256[:2], sha256 + suffix)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as file:
+            file.write(data)
+        os.replace(tmp, path)
+
+    def count(self, name):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1", (name,)
+            )
+
+    def lookup(self, url):
+        """Cached entry for a URL as a dict, or None if the URL was never stored."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None or not os.path.exists(self._path(row['sha256'], '.bin')):
+            return None
+        return dict(row)
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.max_age
+
+    def read_text(self, sha256, touch=True):
+        """Extracted text for a content hash, None if it was never extracted.
+
+        With ``touch=False`` the read does not count as a use for the LRU eviction.
+        """
+        try:
+            with open(self._path(sha256, '.txt'), 'rb') as file:
+                text = file.read().decode('utf-8')
+        except OSError:
+            return None
+        if not touch:
+            return text
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (time.time(), sha256))
+        return text
+
+    def has_text(self, sha256):
+        return os.path.exists(self._path(sha256, '.txt'))
+
+    def read_content(self, sha256):
+        with open(self._path(sha256, '.bin'), 'rb') as file:
+            return file.read()
+
+    def store_text(self, sha256, text):
+        """Keep the extracted text of a document."""
+        encoded = text.encode('utf-8')
+        self._write(self._path(sha256, '.txt'), encoded)
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE blobs SET size = size + ?, last_access = ? WHERE sha256 = ?",
+                               (len(encoded), time.time(), sha256))
+        self.evict()
+
+    def store(self, url, content, content_type, etag=None, last_modified=None, text=None):
+        """Store a response body (deduplicated by hash) and return its hash."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        if not os.path.exists(self._path(sha256, '.bin')):
+            self._write(self._path(sha256, '.bin'), content)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, content_type, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, sha256, content_type, etag, last_modified, now),
+            )
+            self._conn.execute(
+                "INSERT INTO blobs (sha256, size, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT (sha256) DO UPDATE SET last_access = excluded.last_access",
+                (sha256, len(content), now),
+            )
+        if text is not None:
+            self.store_text(sha256, text)
+        else:
+            self.evict()
+        return sha256
+
+    def revalidated(self, url):
+        """Mark a URL as confirmed unchanged by the server (304)."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE urls SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def evict(self):
+        """Drop least recently used contents until the cache fits in max_bytes."""
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for row in self._conn.execute("SELECT sha256, size FROM blobs ORDER BY last_access"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(row['sha256'])
+                total -= row['size']
+            with self._conn:
+                for sha256 in victims:
+                    self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                    self._conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+                self._conn.execute(
+                    "INSERT INTO counters (name, value) VALUES ('evicted', ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (len(victims),)
+                )
+        for sha256 in victims:
+            for suffix in ('.bin', '.txt'):
+                try:
+                    os.remove(self._path(sha256, suffix))
+                except OSError:
+                    pass
+        logger.info(f"Evicted {len(victims)} documents from the cache.")
+
+    def stats(self):
+        """Hit/miss counters plus the current size of the cache."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            urls = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        stats = {name: counters.get(name, 0) for name in COUNTERS}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats.update({'urls': urls, 'contents': entries, 'bytes': size, 'max_bytes': self.max_bytes})
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide DocumentCache in the default location."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DocumentCache()
+        return _cache
+
+
+def document_text(cache, sha256, content_type, content=None):
+    """Text of a cached document, extracted and cached on first use."""
+    text = cache.read_text(sha256)
+    if text is not None:
+        return text
+    if content is None:
+        content = cache.read_content(sha256)
+    if 'application/pdf' not in content_type:
+        with timed('extract', bytes=len(content)):
+            text = extract_text(content, content_type)
+        if text is not None:
+            cache.store_text(sha256, text)
+        return text
+    with timed('extract', bytes=len(content)) as span:
+        texts, count = extract_pdf_pages(content)
+        span['pages'] = count
+    text = ''.join(texts)
+    cache.store_text(sha256, text)
+    logger.info(f"Extracted {count} pages.")
+    return text
+
+
+def fetch_document_text(url, cache=None):
+    """Text of the document at a URL, from the cache where possible."""
+    cache = cache or get_cache()
+    try:
+        entry = cache.lookup(url)
+        if entry and cache.is_fresh(entry):
+            logger.info(f"Serving document from cache: {url}")
+            cache.count('hits')
+            return document_text(cache, entry['sha256'], entry['content_type'] or '')
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        logger.info(f"Fetching document from URL: {url}")
+        with timed('fetch') as span:
+            response = get_session().get(url, headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+            span.update(status=response.status_code, bytes=len(response.content))
+        if entry and response.status_code == 304:
+            logger.info("Document not modified, serving from cache.")
+            cache.revalidated(url)
+            cache.count('revalidated')
+            cache.count('hits')
+            return document_text(cache, entry['sha256'], entry['content_type'] or '')
+        response.raise_for_status()
+        cache.count('misses')
+        content = response.content
+        content_type = response.headers.get('Content-Type', '')
+        # Same content under another URL or re-sent unchanged: its text is cached already
+        sha256 = cache.store(url, content, content_type, response.headers.get('ETag'),
+                             response.headers.get('Last-Modified'))
+        return document_text(cache, sha256, content_type, content)
+    except Exception as e:
+        logger.error(f"Error fetching document text: {e}")
+        return None
+
+
+class Prefetcher:
+    """Fetches documents ahead of need on a small pool of its own.
+
+    Each URL is fetched at most once at a time, fetch() waits for a prefetch
+    under way instead of downloading the document again. Documents whose
+    text is cached and fresh are skipped. Callers asking for the same URL
+    share its prefetch, which is only cancelled once all of them released it.
+    """
+
+    def __init__(self, workers=None, cache=None):
+        self.workers = PREFETCH_WORKERS if workers is None else workers
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch') \
+            if self.workers else None
+        self._pending = {}
+        # Callers holding each pending URL
+        self._holders = {}
+        # Reentrant, cancelling a future runs _done in the same thread
+        self._lock = threading.RLock()
+
+    def _prefetch(self, url):
+        cache = self.cache or get_cache()
+        entry = cache.lookup(url)
+        if entry and cache.is_fresh(entry) and cache.has_text(entry['sha256']):
+            return None
+        return fetch_document_text(url, cache)
+
+    def _done(self, url, future):
+        with self._lock:
+            if self._pending.get(url) is future:
+                del self._pending[url]
+                self._holders.pop(url, None)
+
+    def prefetch(self, urls):
+        """Queue the documents at ``urls`` and hold them, returns the (url, future) holds to release()."""
+        if self._executor is None:
+            return []
+        held, queued = [], []
+        with self._lock:
+            for url in dict.fromkeys(filter(None, urls)):
+                future = self._pending.get(url)
+                if future is None:
+                    future = self._pending[url] = self._executor.submit(self._prefetch, url)
+                    queued.append((url, future))
+                self._holders[url] = self._holders.get(url, 0) + 1
+                held.append((url, future))
+            # Only now, a prefetch done already runs _done right here and must find its holders
+            for url, future in queued:
+                future.add_done_callback(lambda f, url=url: self._done(url, f))
+        return held
+
+    def release(self, held):
+        """Give up holds from prefetch(), cancelling prefetches still queued that nobody else holds."""
+        with self._lock:
+            for url, future in held:
+                # A finished prefetch is gone, a later one of the same URL belongs to other holders
+                if self._pending.get(url) is not future:
+                    continue
+                self._holders[url] -= 1
+                if not self._holders[url]:
+                    del self._holders[url]
+                    future.cancel()
+
+    def fetch(self, url):
+        """Text of the document at a URL, joining its prefetch if one is queued or running."""
+        with self._lock:
+            future = self._pending.get(url)
+        # Still queued behind other prefetches: drop it and fetch right away in this thread
+        if future is not None and not future.cancel():
+            try:
+                text = future.result()
+            except Exception as e:
+                logger.warning(f"Prefetch of {url} failed: {e}")
+                text = None
+            if text:
+                return text
+        return fetch_document_text(url, self.cache)
+
+    def close(self):
+        """Drop the queued prefetches and wait for the running ones."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Process-wide Prefetcher, shared by all sessions so the number of downloads stays bounded."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
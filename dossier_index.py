@@ -0,0 +1,525 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from dossiers import DATA_DIR, DUMP_PATH, iter_dump_lines, join_summaries, latest_proposal_url
+from metrics import timed
+from records import HEAVY_SECTIONS, SUMMARY_FIELDS, DossierSummary, LazyDossier, decode_light, scan_record
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.environ.get('PARLTRACK_INDEX', os.path.join(DATA_DIR, 'ep_dossiers.sqlite'))
+# Seconds a write waits for another process's rebuild of the index to finish
+INDEX_BUSY_TIMEOUT = float(os.environ.get('PARLTRACK_INDEX_BUSY_TIMEOUT', 60))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dump_info (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    indexed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dossiers (
+    reference TEXT PRIMARY KEY,
+    title TEXT,
+    type TEXT,
+    stage_reached TEXT,
+    subjects TEXT,
+    updated TEXT,
+    first_date TEXT,
+    last_date TEXT,
+    proposal_url TEXT,
+    content_hash TEXT,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    line_hash TEXT NOT NULL,
+    spans TEXT
+);
+CREATE INDEX IF NOT EXISTS dossiers_type ON dossiers (type);
+CREATE TABLE IF NOT EXISTS dossier_committees (
+    reference TEXT NOT NULL,
+    committee TEXT NOT NULL,
+    PRIMARY KEY (reference, committee)
+);
+CREATE INDEX IF NOT EXISTS dossier_committees_committee ON dossier_committees (committee);
+CREATE INDEX IF NOT EXISTS dossiers_updated ON dossiers (updated);
+CREATE VIRTUAL TABLE IF NOT EXISTS dossiers_fts USING fts5 (
+    title, subjects, legal_basis, committees, summaries,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS ingests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    indexed_at TEXT NOT NULL,
+    dump_size INTEGER NOT NULL,
+    dump_mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dossier_changes (
+    ingest_id INTEGER NOT NULL REFERENCES ingests (id),
+    reference TEXT NOT NULL,
+    change TEXT NOT NULL,
+    new_proposal INTEGER NOT NULL DEFAULT 0,
+    proposal_url TEXT,
+    PRIMARY KEY (ingest_id, reference)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job TEXT PRIMARY KEY,
+    ingest_id INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS dossiers_meta_fts USING fts5 (
+    title, subjects, legal_basis, committees,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+# Bump when the schema changes, older index files are then rebuilt from scratch
+SCHEMA_VERSION = 4
+
+# bm25 weights of the dossiers_meta_fts columns, title matches rank highest
+FTS_WEIGHTS = (10.0, 4.0, 2.0, 2.0)
+
+# Columns of the summary rows handed to the UI
+SUMMARY_COLUMNS = list(SUMMARY_FIELDS)
+
+# Kinds of entries in dossier_changes
+NEW, CHANGED, REMOVED = 'new', 'changed', 'removed'
+
+
+def connect(index_path=None):
+    index_path = index_path or INDEX_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    conn = sqlite3.connect(index_path, timeout=INDEX_BUSY_TIMEOUT, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # Readers keep searching the last committed index while a cron ingest rebuilds it
+    conn.execute("PRAGMA journal_mode = WAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND sql IS NOT NULL").fetchall()
+        for (name,) in tables:
+            if not name.startswith(('dossiers_fts_', 'dossiers_meta_fts_', 'sqlite_')):
+                conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _line_hash(line):
+    return hashlib.blake2b(line, digest_size=16).hexdigest()
+
+
+def summarize(dossier):
+    """Extract the indexed summary fields from a full dossier dict."""
+    procedure = dossier.get('procedure', {})
+    event_dates = [e['date'] for e in dossier.get('events', []) if e.get('date')]
+    return {
+        'reference': procedure.get('reference'),
+        'title': procedure.get('title'),
+        'type': procedure.get('type'),
+        'stage_reached': procedure.get('stage_reached'),
+        'subjects': '; '.join(procedure.get('subject', {}).values()),
+        'updated': dossier.get('meta', {}).get('updated'),
+        'first_date': min(event_dates) if event_dates else None,
+        'last_date': max(event_dates) if event_dates else None,
+        'proposal_url': latest_proposal_url(dossier),
+    }
+
+
+def content_hash(dossier):
+    """Hash of a dossier's docs and events, the parts that call for re-analysis."""
+    content = json.dumps([dossier.get('docs', []), dossier.get('events', [])], sort_keys=True)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def search_document(dossier):
+    """Text of the full-text searchable columns and the committee facet values."""
+    procedure = dossier.get('procedure', {})
+    committees = dossier.get('committees', [])
+    return {
+        'title': procedure.get('title') or '',
+        'subjects': ' '.join(procedure.get('subject', {}).values()),
+        'legal_basis': ' '.join(procedure.get('legal_basis', [])),
+        'committees': ' '.join(
+            f"{c.get('committee', '')} {c.get('committee_full', '')}" for c in committees
+        ),
+        'summaries': join_summaries(dossier.get('events', [])) + '\n' + join_summaries(dossier.get('docs', [])),
+    }, sorted({c['committee'] for c in committees if c.get('committee')})
+
+
+def _store(conn, ingest_id, dossier, offset, length, line_hash, spans):
+    """Insert or replace a decoded dossier, return its change kind or None.
+
+    ``spans`` are the byte ranges of the heavy sections within the line, so
+    DossierReader can leave them undecoded until they are read.
+    """
+    summary = summarize(dossier)
+    summary['content_hash'] = content_hash(dossier)
+    reference = summary['reference']
+    document, committees = search_document(dossier)
+    old = conn.execute(
+        "SELECT rowid, updated, content_hash, proposal_url FROM dossiers WHERE reference = ?", (reference,)
+    ).fetchone()
+    if old is not None:
+        conn.execute("DELETE FROM dossiers_fts WHERE rowid = ?", (old[0],))
+        conn.execute("DELETE FROM dossiers_meta_fts WHERE rowid = ?", (old[0],))
+    columns = SUMMARY_COLUMNS + ['content_hash']
+    cursor = conn.execute(
+        f"INSERT OR REPLACE INTO dossiers ({', '.join(columns)}, offset, length, line_hash, spans) "
+        f"VALUES ({', '.join('?' * (len(columns) + 4))})",
+        [summary[c] for c in columns] + [offset, length, line_hash, json.dumps(spans)],
+    )
+    conn.execute(
+        "INSERT INTO dossiers_fts (rowid, title, subjects, legal_basis, committees, summaries) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (cursor.lastrowid, document['title'], document['subjects'], document['legal_basis'],
+         document['committees'], document['summaries']),
+    )
+    conn.execute(
+        "INSERT INTO dossiers_meta_fts (rowid, title, subjects, legal_basis, committees) VALUES (?, ?, ?, ?, ?)",
+        (cursor.lastrowid, document['title'], document['subjects'], document['legal_basis'], document['committees']),
+    )
+    conn.execute("DELETE FROM dossier_committees WHERE reference = ?", (reference,))
+    conn.executemany(
+        "INSERT INTO dossier_committees (reference, committee) VALUES (?, ?)",
+        [(reference, c) for c in committees],
+    )
+    # Only a new meta.updated or different docs/events count as a change worth re-analysing
+    if old is None:
+        change = NEW
+    elif (old['updated'], old['content_hash']) != (summary['updated'], summary['content_hash']):
+        change = CHANGED
+    else:
+        return None
+    new_proposal = summary['proposal_url'] is not None and (old is None or old['proposal_url'] != summary['proposal_url'])
+    conn.execute(
+        "INSERT OR REPLACE INTO dossier_changes (ingest_id, reference, change, new_proposal, proposal_url) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (ingest_id, reference, change, new_proposal, summary['proposal_url']),
+    )
+    return change
+
+
+def _delete(conn, reference):
+    old = conn.execute("SELECT rowid FROM dossiers WHERE reference = ?", (reference,)).fetchone()
+    if old is None:
+        return
+    conn.execute("DELETE FROM dossiers_fts WHERE rowid = ?", (old[0],))
+    conn.execute("DELETE FROM dossiers_meta_fts WHERE rowid = ?", (old[0],))
+    conn.execute("DELETE FROM dossier_committees WHERE reference = ?", (reference,))
+    conn.execute("DELETE FROM dossiers WHERE reference = ?", (reference,))
+
+
+def is_stale(conn, dump_path=None):
+    """True if the index was built from a different version of the dump."""
+    dump_path = dump_path or DUMP_PATH
+    info = conn.execute("SELECT path, size, mtime FROM dump_info WHERE id = 1").fetchone()
+    if info is None:
+        return True
+    stat = os.stat(dump_path)
+    return (info['path'], info['size'], info['mtime']) != (os.path.abspath(dump_path), stat.st_size, stat.st_mtime)
+
+
+def build_index(conn, dump_path=None):
+    """(Re)index the dump, only decoding lines that changed since the last run.
+
+    Lines whose hash is already in the index just get their offset updated,
+    dossiers that disappeared from the dump are dropped. New, changed and
+    removed dossiers are recorded in dossier_changes under a new ingest id.
+    """
+    dump_path = dump_path or DUMP_PATH
+    stat = os.stat(dump_path)
+    known = dict(conn.execute("SELECT line_hash, reference FROM dossiers"))
+    seen = set()
+    stats = {'unchanged': 0, 'indexed': 0, NEW: 0, CHANGED: 0, REMOVED: 0}
+    indexed_at = datetime.now(timezone.utc).isoformat()
+    with conn, open(dump_path, 'rb') as file:
+        ingest_id = conn.execute(
+            "INSERT INTO ingests (indexed_at, dump_size, dump_mtime) VALUES (?, ?, ?)",
+            (indexed_at, stat.st_size, stat.st_mtime),
+        ).lastrowid
+        for offset, line in iter_dump_lines(file):
+            line_hash = _line_hash(line)
+            reference = known.get(line_hash)
+            if reference is not None:
+                conn.execute("UPDATE dossiers SET offset = ?, length = ? WHERE reference = ?",
+                             (offset, len(line), reference))
+                seen.add(reference)
+                stats['unchanged'] += 1
+                continue
+            try:
+                dossier, spans = scan_record(line)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                logger.error(f"Error decoding JSON at offset {offset}: {e}")
+                continue
+            reference = dossier.get('procedure', {}).get('reference')
+            if not reference:
+                continue
+            seen.add(reference)
+            spans = {key: spans[key] for key in HEAVY_SECTIONS if key in spans}
+            change = _store(conn, ingest_id, dossier, offset, len(line), line_hash, spans)
+            stats['indexed'] += 1
+            if change:
+                stats[change] += 1
+        for reference in set(known.values()) - seen:
+            _delete(conn, reference)
+            conn.execute(
+                "INSERT INTO dossier_changes (ingest_id, reference, change) VALUES (?, ?, ?)",
+                (ingest_id, reference, REMOVED),
+            )
+            stats[REMOVED] += 1
+        conn.execute(
+            "INSERT OR REPLACE INTO dump_info (id, path, size, mtime, indexed_at) VALUES (1, ?, ?, ?, ?)",
+            (os.path.abspath(dump_path), stat.st_size, stat.st_mtime, indexed_at),
+        )
+    stats['ingest_id'] = ingest_id
+    logger.info(f"Indexed {dump_path}: {stats}")
+    return stats
+
+
+def latest_ingest(conn):
+    """Id of the most recent ingest, 0 if the dump was never indexed."""
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM ingests").fetchone()[0]
+
+
+def changes_since(conn, ingest_id=0, procedure_type=None):
+    """New, changed and removed dossiers recorded after the given ingest.
+
+    Several ingests are folded into one entry per reference: the last
+    removal wins unless the dossier came back after it, then it is new
+    again. A dossier that appeared since the checkpoint stays new through
+    later changes, and ``new_proposal`` is set if any of them brought a new
+    proposal URL.
+    """
+    query = (
+        "SELECT c.reference, c.change, c.new_proposal, d.proposal_url, d.type "
+        "FROM dossier_changes c LEFT JOIN dossiers d ON d.reference = c.reference "
+        "WHERE c.ingest_id > ? ORDER BY c.ingest_id"
+    )
+    changes = {}
+    for row in conn.execute(query, (ingest_id,)):
+        if procedure_type and row['change'] != REMOVED and row['type'] != procedure_type:
+            continue
+        entry = changes.setdefault(row['reference'], {
+            'reference': row['reference'], 'change': row['change'], 'new_proposal': False,
+        })
+        if row['change'] == REMOVED or entry['change'] != NEW:
+            entry['change'] = row['change']
+        entry['new_proposal'] = entry['new_proposal'] or bool(row['new_proposal'])
+        entry['proposal_url'] = row['proposal_url']
+    return [changes[reference] for reference in sorted(changes)]
+
+
+def get_checkpoint(conn, job):
+    """Last ingest a job has processed, 0 if it never ran."""
+    row = conn.execute("SELECT ingest_id FROM checkpoints WHERE job = ?", (job,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_checkpoint(conn, job, ingest_id):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO checkpoints (job, ingest_id) VALUES (?, ?)", (job, ingest_id))
+
+
+def refresh_index(conn, dump_path=None, force=False):
+    """Rebuild the index if the dump changed or ``force``, returns build_index's stats or None if it was current.
+
+    The write lock is taken before checking, so a process that waited for
+    another one's rebuild of the same dump does not repeat it.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if force or is_stale(conn, dump_path):
+            return build_index(conn, dump_path)
+        return None
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def ensure_index(dump_path=None, index_path=None):
+    """Open the index, rebuilding it first if the dump's size or mtime changed.
+
+    Returns the connection and whether this call rebuilt the index. If
+    another process holds the index longer than INDEX_BUSY_TIMEOUT the old
+    index is served.
+    """
+    conn = connect(index_path)
+    built = False
+    try:
+        if is_stale(conn, dump_path):
+            built = refresh_index(conn, dump_path) is not None
+    except (OSError, sqlite3.OperationalError) as e:
+        logger.error(f"Error indexing dump: {e}")
+    return conn, built
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query where every (stemmed) word must match.
+
+    The last word is matched as a prefix, so partially typed words still find
+    results. Prefix expansion is costly, so the other words are matched exactly.
+    """
+    words = [f'"{w}"' for w in ''.join(c if c.isalnum() else ' ' for c in text).split()]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+def search_dossiers(conn, query=None, procedure_type=None, stage=None, committee=None,
+                    date_from=None, date_to=None, limit=20, offset=0):
+    """Ranked keyword search with facet filters, returns (DossierSummary rows, total).
+
+    Every word has to occur somewhere in the dossier, summaries included.
+    Ranking uses bm25 over the short title/subject/legal basis/committee
+    columns only, matches found just in summaries follow by most recent
+    update. Scoring the long summaries would cost more than the whole query
+    budget on the full dump. The date range matches dossiers with events
+    between ``date_from`` and ``date_to``.
+    """
+    ctes, joins, where, params = [], [], [], {'limit': limit, 'offset': offset}
+    order = "d.updated DESC"
+    match = fts_query(query) if query else ''
+    if match:
+        params['match'] = match
+        ctes.append("hits AS MATERIALIZED (SELECT rowid FROM dossiers_fts WHERE dossiers_fts MATCH :match)")
+        ctes.append(
+            f"ranked AS MATERIALIZED (SELECT rowid, bm25(dossiers_meta_fts, {', '.join(map(str, FTS_WEIGHTS))}) "
+            f"AS score FROM dossiers_meta_fts WHERE dossiers_meta_fts MATCH :match)"
+        )
+        joins.append("JOIN hits ON hits.rowid = d.rowid LEFT JOIN ranked ON ranked.rowid = d.rowid")
+        order = "ranked.score IS NULL, ranked.score, " + order
+    if procedure_type:
+        where.append("d.type = :type")
+        params['type'] = procedure_type
+    if stage:
+        where.append("d.stage_reached = :stage")
+        params['stage'] = stage
+    if committee:
+        where.append("d.reference IN (SELECT reference FROM dossier_committees WHERE committee = :committee)")
+        params['committee'] = committee
+    if date_from:
+        where.append("d.last_date >= :date_from")
+        params['date_from'] = str(date_from)
+    if date_to:
+        where.append("d.first_date <= :date_to")
+        params['date_to'] = f"{date_to}T23:59:59"
+    # Sort bare rowids and only fetch the columns of the requested page
+    page = (
+        f"SELECT d.rowid AS id, ROW_NUMBER() OVER (ORDER BY {order}) AS position, "
+        f"COUNT(*) OVER () AS total FROM dossiers d"
+    )
+    page += ''.join(f" {j}" for j in joins)
+    if where:
+        page += f" WHERE {' AND '.join(where)}"
+    page += f" ORDER BY {order} LIMIT :limit OFFSET :offset"
+    ctes.append(f"page AS MATERIALIZED ({page})")
+    sql = (
+        f"WITH {', '.join(ctes)} SELECT " + ', '.join(f"d.{c}" for c in SUMMARY_COLUMNS)
+        + ", page.total FROM page JOIN dossiers d ON d.rowid = page.id ORDER BY page.position"
+    )
+    rows = conn.execute(sql, params).fetchall()
+    total = rows[0]['total'] if rows else 0
+    rows = [DossierSummary(row) for row in rows]
+    if not rows and offset:
+        # Paged past the end, still report how many dossiers matched
+        total = search_dossiers(conn, query, procedure_type, stage, committee, date_from, date_to, 1, 0)[1]
+    return rows, total
+
+
+def facet_values(conn, procedure_type=None):
+    """Distinct stage_reached and committee values available for filtering."""
+    where, params = "", []
+    if procedure_type:
+        where, params = " WHERE type = ?", [procedure_type]
+    stages = [r[0] for r in conn.execute(
+        f"SELECT DISTINCT stage_reached FROM dossiers{where} ORDER BY stage_reached", params) if r[0]]
+    committees = [r[0] for r in conn.execute(
+        f"SELECT DISTINCT committee FROM dossier_committees WHERE reference IN "
+        f"(SELECT reference FROM dossiers{where}) ORDER BY committee", params)]
+    return {'stage_reached': stages, 'committee': committees}
+
+
+class DossierReader:
+    """Random access to full dossiers through a memory map of the dump.
+
+    Holds only the reference -> (offset, length, spans) table and a small
+    LRU of decoded records, so memory does not grow with the number of
+    dossiers. Records are returned as LazyDossier: events and docs, the bulk
+    of a record, are only decoded from the map when they are read, and the
+    LRU keeps just the small sections.
+    """
+
+    def __init__(self, dump_path=None, index_path=None, cache_size=32):
+        self.dump_path = dump_path or DUMP_PATH
+        self.cache_size = cache_size
+        conn, _ = ensure_index(self.dump_path, index_path)
+        try:
+            self.offsets = {
+                row['reference']: (row['offset'], row['length'], row['spans'])
+                for row in conn.execute("SELECT reference, offset, length, spans FROM dossiers")
+            }
+        finally:
+            conn.close()
+        stat = os.stat(self.dump_path)
+        self.signature = (stat.st_size, stat.st_mtime)
+        self._file = open(self.dump_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, reference):
+        return reference in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, reference):
+        """Return the dossier for a reference as a LazyDossier, or None if unknown."""
+        with self._lock:
+            if reference in self._cache:
+                self._cache.move_to_end(reference)
+                return LazyDossier(*self._cache[reference])
+        entry = self.offsets.get(reference)
+        if entry is None:
+            return None
+        offset, length, spans = entry
+        spans = {key: tuple(span) for key, span in json.loads(spans or '{}').items()}
+        with timed('load', bytes=length):
+            light = decode_light(self._mmap[offset:offset + length], spans)
+        # Heavy sections are read straight from the map, relative to its start
+        record = (light, self._mmap, {key: (offset + start, offset + end) for key, (start, end) in spans.items()})
+        with self._lock:
+            self._cache[reference] = record
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return LazyDossier(*record)
+
+    def is_current(self):
+        try:
+            stat = os.stat(self.dump_path)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime) == self.signature
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+_readers = {}
+_reader_lock = threading.Lock()
+
+
+def get_reader(dump_path=None, index_path=None):
+    """Process-wide DossierReader of a dump, reopened when the dump changes on disk."""
+    key = (os.path.abspath(dump_path or DUMP_PATH), index_path)
+    with _reader_lock:
+        reader = _readers.get(key)
+        if reader is None or not reader.is_current():
+            # Not closed, dossiers handed out earlier may still read their sections from its map
+            reader = _readers[key] = DossierReader(dump_path, index_path)
+        return reader
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+
+from records import LazyDossier
+
+logger = logging.getLogger(__name__)
+
+# Path of the parltrack dump, override with the PARLTRACK_DUMP environment variable
+DUMP_PATH = os.environ.get('PARLTRACK_DUMP', '/Volumes/External/Project Simone/ELO/ep_dossiers.json')
+
+# Directory for the index and caches derived from the dump, override with PARLTRACK_DATA
+DATA_DIR = os.environ.get('PARLTRACK_DATA', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+COD_TYPE = 'COD - Ordinary legislative procedure (ex-codecision procedure)'
+PROPOSAL_TYPE = 'Legislative proposal'
+
+
+def procedure_type_is(procedure_type):
+    """Predicate matching dossiers of the given procedure type."""
+    def predicate(dossier):
+        return dossier.get('procedure', {}).get('type') == procedure_type
+    return predicate
+
+
+def _raw_needle(value):
+    # Only plain ASCII values are guaranteed to appear verbatim in the dump,
+    # anything else may be written with \u escapes.
+    if not value or not value.isascii():
+        return None
+    return json.dumps(value)[1:-1].encode('utf-8')
+
+
+def iter_dump_lines(file):
+    """Yield (offset, raw_line) for every dossier line of an open binary dump.
+
+    The offset points at the first byte of the JSON object, i.e. after the
+    leading comma parltrack puts in front of every record but the first.
+    """
+    offset = 0
+    for line in file:
+        start = offset
+        offset += len(line)
+        stripped = line.rstrip()
+        if not stripped or stripped in (b'[', b']'):
+            continue
+        if stripped.startswith(b','):
+            stripped = stripped[1:]
+            start += 1
+        yield start, stripped
+
+
+def iter_dossiers(json_file_path=None, procedure_type=None, predicates=(), needles=(), compact=False):
+    """Stream dossiers from the dump, filtering while parsing.
+
+    Lines that do not contain every byte string in ``needles`` (and the
+    ``procedure_type`` value, if given) are skipped before ``json.loads``, so
+    only candidate records are decoded. Decoded dossiers must then satisfy all
+    ``predicates`` to be yielded. With ``compact`` they are yielded as
+    LazyDossier, which keep events and docs as raw bytes until read.
+    """
+    json_file_path = json_file_path or DUMP_PATH
+    predicates = list(predicates)
+    needles = [n.encode('utf-8') if isinstance(n, str) else n for n in needles]
+    if procedure_type:
+        predicates.insert(0, procedure_type_is(procedure_type))
+        needle = _raw_needle(procedure_type)
+        if needle:
+            needles.append(needle)
+    try:
+        with open(json_file_path, 'rb') as file:
+            for _, line in iter_dump_lines(file):
+                if needles and not all(n in line for n in needles):
+                    continue
+                try:
+                    dossier = LazyDossier.from_record(line) if compact else json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    logger.error(f"Error decoding JSON: {e}")
+                    continue
+                if all(predicate(dossier) for predicate in predicates):
+                    yield dossier
+    except OSError as e:
+        logger.error(f"Error loading JSON data: {e}")
+
+
+def latest_proposal(dossier):
+    """The most recent 'Legislative proposal' entry of a dossier's docs, or None."""
+    proposals = [doc for doc in dossier.get('docs', []) if doc.get('type') == PROPOSAL_TYPE]
+    if not proposals:
+        return None
+    return max(proposals, key=lambda doc: doc.get('date', ''))
+
+
+def latest_proposal_url(dossier):
+    """URL of the latest legislative proposal document, or None."""
+    proposal = latest_proposal(dossier)
+    if proposal is None:
+        return None
+    for d in proposal.get('docs', []):
+        if 'url' in d:
+            return d['url']
+    return None
+
+
+def join_summaries(items):
+    """Join the summary paragraphs of a list of events or docs."""
+    parts = []
+    for item in items:
+        # Summaries are lists of paragraphs, but be lenient about stray types
+        for summary in item.get('summary', []) or []:
+            if isinstance(summary, str):
+                parts.append(summary)
+    return '\n'.join(parts)
+
+
+def summary_text(dossier):
+    """Title and summaries of a dossier, a stand-in when no proposal text is available."""
+    procedure = dossier.get('procedure', {})
+    return '\n\n'.join(part for part in (
+        procedure.get('title') or '',
+        join_summaries(dossier.get('docs', [])),
+        join_summaries(dossier.get('events', [])),
+    ) if part)
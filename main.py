@@ -1,19 +1,19 @@
 import panel as pn
-import requests
 import logging
-from io import BytesIO
-from PyPDF2 import PdfReader
-from langchain_openai import ChatOpenAI
-from langchain import PromptTemplate
-from pydantic import BaseModel, Field
-from typing import List
 import pandas as pd
-import random
+import io
 import os
-import json
-from datetime import datetime
+import sqlite3
 from panel.template import BootstrapTemplate  # Import the template
-from keys import OPENAI_API_KEY
+from analysis import OPENAI_API_KEY, analyze_relevance, perform_predefined_analysis
+from dossiers import DUMP_PATH, latest_proposal_url
+from documents import get_prefetcher
+from background import run_in_background
+from prescreen import PREDEFINED_TOPICS_TEXT
+from screening import PREDEFINED, RELEVANCE, screen_dossiers
+from render import EVENTS_PAGE_SIZE, render_details
+from store import DossierStore
+from metrics import get_recorder
 # Initialize Panel extension with Tabulator for advanced tables
 pn.extension('tabulator')
 
@@ -28,289 +28,82 @@ logger = logging.getLogger(__name__)
 if not OPENAI_API_KEY:
     raise ValueError("Please set the OPENAI_API_KEY environment variable.")
 
-# Pydantic Models
-class RelevanceResult(BaseModel):
-    """Result of the relevance analysis."""
-    is_relevant: bool = Field(description="Is the law relevant to the company?")
-    reason: str = Field(description="Reason for relevance or irrelevance")
-
-class TopicAnalysis(BaseModel):
-    """Analysis of a thematic area."""
-    topic: str = Field(description="The thematic area")
-    relevant: bool = Field(description="Is the law relevant for this thematic area?")
-    reason: str = Field(description="Reason for relevance or irrelevance")
-
-class AnalysisResult(BaseModel):
-    """Result of the automatic analysis."""
-    summary: str = Field(description="Summary of the law")
-    analyses: List[TopicAnalysis] = Field(description="List of thematic area analyses")
+# Number of laws shown per table page, the index is queried one page at a time
+PAGE_SIZE = 20
+ALL = 'All'
 
 # Functions to fetch data
-def load_json_data():
-    json_file_path = '/Volumes/External/Project Simone/ELO/ep_dossiers.json'  # Update with your actual path
+# Shared by all sessions of the server process, opened on first use
+dossier_store = pn.state.as_cached('dossier_store', DossierStore, dump_path=DUMP_PATH)
+# Downloads the proposals of listed laws ahead, on a small pool shared by all sessions
+prefetcher = get_prefetcher()
+
+def get_vorgaenge(query=None, stage=None, committee=None, date_from=None, date_to=None, page=0):
+    logger.info("Searching laws in the dossier index.")
+    # The index is only rebuilt when the dump changed, otherwise this is a plain query
     try:
-        dossiers = []
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            for line in file:
-                line = line.strip()
-                if line in ('[', ']'):
-                    continue
-                if line.startswith(','):
-                    line = line[1:]
-                try:
-                    dossier = json.loads(line)
-                    dossiers.append(dossier)
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decoding JSON: {e}")
-                    continue
-        return dossiers
-    except Exception as e:
-        logger.error(f"Error loading JSON data: {e}")
-        return []
-
-def get_vorgaenge():
-    logger.info("Loading list of laws from JSON data.")
-    data = load_json_data()
-    # Filter for 'COD' type
-    documents = [
-        item for item in data
-        if item.get('procedure', {}).get('type') == 'COD - Ordinary legislative procedure (ex-codecision procedure)'
-    ]
-    # Randomly select 100 documents if more are available
-    if len(documents) > 100:
-        documents = random.sample(documents, 100)
-    logger.info(f"Retrieved {len(documents)} laws of type COD.")
-    return documents
-
-def fetch_document_text(url):
+        # Recorded as a 'search' span by the store
+        documents, total = dossier_store.search(
+            query, stage=stage, committee=committee, date_from=date_from, date_to=date_to,
+            limit=PAGE_SIZE, offset=page * PAGE_SIZE,
+        )
+    except sqlite3.OperationalError as e:
+        logger.error(f"Error searching the dossier index: {e}")
+        return None, 0
+    logger.info(f"Retrieved {len(documents)} of {total} laws of type COD.")
+    return documents, total
+
+def get_references(limit, ranking_text=None, **filters):
+    # References of the best matching laws, for batch screening. With a ranking text all
+    # matching laws are pre-screened locally and the closest ones returned.
     try:
-        logger.info(f"Fetching document from URL: {url}")
-        response = requests.get(url)
-        response.raise_for_status()
-        content_type = response.headers.get('Content-Type', '')
-        if 'application/pdf' in content_type:
-            # If it's a PDF, extract text using PyPDF2
-            with BytesIO(response.content) as f:
-                reader = PdfReader(f)
-                text = ''
-                for page in reader.pages:
-                    text += page.extract_text()
-            logger.info("Text extraction from PDF successful.")
-            return text
-        elif 'text/html' in content_type or 'text/plain' in content_type:
-            # If it's HTML or plain text
-            text = response.text
-            logger.info("Text extraction from HTML/plain text successful.")
-            return text
-        else:
-            logger.warning("Unknown content type, cannot extract text.")
-            return None
-    except Exception as e:
-        logger.error(f"Error fetching document text: {e}")
+        return dossier_store.references(limit, ranking_text, **filters)
+    except sqlite3.OperationalError as e:
+        logger.error(f"Error searching the dossier index: {e}")
         return None
 
-# Helper functions to format each section
-def format_meta(meta):
-    if not meta:
-        return "No meta data available.\n"
-    source = meta.get('source', 'N/A')
-    updated = meta.get('updated', 'N/A')
+def get_facets():
     try:
-        updated = datetime.strptime(updated, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        pass
-    return f"**Source**: [{source}]({source})\n**Updated**: {updated}\n"
-
-def format_procedure(procedure):
-    if not procedure:
-        return "No procedure data available.\n"
-    fields = [
-        f"**Reference**: {procedure.get('reference', 'N/A')}",
-        f"**Title**: {procedure.get('title', 'N/A')}",
-        f"**Type**: {procedure.get('type', 'N/A')}",
-        f"**Subtype**: {procedure.get('subtype', 'N/A')}",
-        f"**Instrument**: {procedure.get('instrument', 'N/A')}",
-        f"**Stage Reached**: {procedure.get('stage_reached', 'N/A')}",
-    ]
-    # Legal basis
-    legal_basis = procedure.get('legal_basis', [])
-    if legal_basis:
-        fields.append(f"**Legal Basis**: {', '.join(legal_basis)}")
-    # Subjects
-    subjects = procedure.get('subject', {})
-    if subjects:
-        subject_list = ', '.join(subjects.values())
-        fields.append(f"**Subjects**: {subject_list}")
-    return '\n'.join(fields) + '\n'
-
-def format_committees(committees):
-    if not committees:
-        return "No committees data available.\n"
-    output = ""
-    for committee in committees:
-        output += f"- **Type**: {committee.get('type', 'N/A')}\n"
-        output += f"  - **Committee**: {committee.get('committee_full', 'N/A')}\n"
-        rapporteurs = committee.get('rapporteur', [])
-        if rapporteurs:
-            r_list = ', '.join([r.get('name', 'N/A') for r in rapporteurs])
-            output += f"  - **Rapporteur(s)**: {r_list}\n"
-        shadows = committee.get('shadows', [])
-        if shadows:
-            s_list = ', '.join([s.get('name', 'N/A') for s in shadows])
-            output += f"  - **Shadows**: {s_list}\n"
-    return output
-
-def format_council(council):
-    if not council:
-        return "No council data available.\n"
-    output = ""
-    for item in council:
-        date = item.get('date', 'N/A')
-        try:
-            date = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')
-        except ValueError:
-            pass
-        output += f"- **Date**: {date}\n"
-        output += f"  - **Council**: {item.get('council', 'N/A')}\n"
-        output += f"  - **Type**: {item.get('type', 'N/A')}\n"
-    return output
-
-def format_commission(commission):
-    if not commission:
-        return "No commission data available.\n"
-    output = ""
-    for item in commission:
-        output += f"- **DG**: {item.get('dg', 'N/A')}\n"
-        output += f"  - **Commissioner**: {item.get('commissioner', 'N/A')}\n"
-    return output
-
-def format_events(events):
-    if not events:
-        return "No events data available.\n"
-    output = ""
-    for event in events:
-        date = event.get('date', 'N/A')
-        try:
-            date = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')
-        except ValueError:
-            pass
-        output += f"- **Date**: {date}\n"
-        output += f"  - **Type**: {event.get('type', 'N/A')}\n"
-        output += f"  - **Body**: {event.get('body', 'N/A')}\n"
-        # Summaries
-        summaries = event.get('summary', [])
-        if summaries:
-            output += f"  - **Summary**:\n"
-            for summary in summaries:
-                output += f"    - {summary}\n"
-    return output
-
-def format_docs(docs):
-    if not docs:
-        return "No documents available.\n"
-    output = ""
-    for doc in docs:
-        date = doc.get('date', 'N/A')
-        try:
-            date = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')
-        except ValueError:
-            pass
-        output += f"- **Date**: {date}\n"
-        output += f"  - **Type**: {doc.get('type', 'N/A')}\n"
-        output += f"  - **Body**: {doc.get('body', 'N/A')}\n"
-        # Document links
-        doc_items = doc.get('docs', [])
-        if doc_items:
-            output += f"  - **Documents**:\n"
-            for d in doc_items:
-                title = d.get('title', 'Document')
-                url = d.get('url', None)
-                if url:
-                    output += f"    - [{title}]({url})\n"
-                else:
-                    output += f"    - {title}\n"
-        # Summaries
-        summaries = doc.get('summary', [])
-        if summaries:
-            output += f"  - **Summary**:\n"
-            for summary in summaries:
-                output += f"    - {summary}\n"
-    return output
-
-# Analysis Functions
-def analyze_relevance(law_text, company_description):
-    logger.info("Starting relevance analysis.")
-    llm = ChatOpenAI(openai_api_key=OPENAI_API_KEY, temperature=0)
-    structured_llm = llm.with_structured_output(RelevanceResult)
-    prompt_template = """
-Given the following law text:
-
-{law_text}
-
-And the following description of a company:
-
-{company_description}
-
-Question: Is this law relevant for the described company? Briefly justify your answer.
-"""
-    prompt = PromptTemplate(
-        input_variables=["law_text", "company_description"],
-        template=prompt_template,
-    )
-    inputs = {
-        "law_text": law_text[:3000],  # Limit to avoid exceeding token limit
-        "company_description": company_description,
-    }
-    try:
-        response = structured_llm.invoke(prompt.format(**inputs))
-        logger.info("Received response from LLM for relevance analysis.")
-        return response
-    except Exception as e:
-        logger.error(f"Error during LLM relevance analysis: {e}")
+        return dossier_store.facets()
+    except sqlite3.OperationalError as e:
+        logger.error(f"Error reading the filter values: {e}")
         return None
 
-def perform_predefined_analysis(law_text):
-    logger.info("Starting predefined analysis.")
-    llm = ChatOpenAI(openai_api_key=OPENAI_API_KEY, temperature=0)
-    structured_llm = llm.with_structured_output(AnalysisResult)
-    prompt_template = """
-It is intended to develop an AI-based tool whose purpose is to analyze and summarize current and ongoing legislative procedures of the EU and the Federal Republic of Germany. The goal is to inform users (which include legal professionals and private businesses) about upcoming legislative changes and legislative procedures.
-
-However, only laws and legislative procedures relevant to the users should be analyzed and processed.
-
-Therefore, your task is to review the content of the law to determine whether it falls under one or more of the following (legal) subject areas. Briefly justify your answer:
-	•	Data Protection: This includes laws that serve to protect personal data and privacy, and which, among other things, determine how data may be collected, processed, stored, and shared. This includes, but is not limited to, the following laws: General Data Protection Regulation (also GDPR or Regulation (EU) 2016/679); the Law Enforcement Directive or Directive (EU) 2016/680); the Federal Data Protection Act as well as the data protection laws of the federal states; social data protection; health data protection.
-	•	Data Regulation: This encompasses laws that establish the legal frameworks and requirements regarding the handling of data, the usability of data, and the exchange of data across various sectors. This includes, but is not limited to, the following laws: Digital Markets Act (also DMA or Regulation (EU) 2022/1925); Digital Services Act (also DSA or Regulation (EU) 2022/2065); Data Act (also DA or Regulation (EU) 2023/2854); Data Governance Act (also DGA or Regulation (EU) 2022/868); European Health Data Space (also European Health Data Space or EHDS); Health Data Usage Act (also GDNG).
-	•	Digital Products and Services: This includes laws that set conditions regarding intermediary services such as host providers, online marketplaces, social networks, and cloud systems or applications (Digital Services), as well as regarding products that are created and provided in digital form, such as computer programs, apps, music files, e-books, or digital video games (Digital Products). This includes, but is not limited to, the following laws: Digital Services Act (also DSA or Regulation (EU) 2022/2065); AI Regulation (also AI Act or Regulation (EU) 2024/1689); AI Liability Directive (also AI Liability Directive or RL (EU) 2022/0303); Digital Services Law.
-	•	Artificial Intelligence: This encompasses laws that regulate Artificial Intelligence. This includes, but is not limited to, the following laws: AI Regulation (also AI Act or Regulation (EU) 2024/1689); AI Liability Directive (also AI Liability Directive or RL (EU) 2022/0303); Product Liability Directive (also Directive (EU) 2022/0302).
-	•	Cybersecurity: This includes laws that deal with the requirements and standards of cybersecurity, IT security, and/or security in information technology. This includes, but is not limited to, the following laws: Cyber Resilience Regulation (also Cyber Resilience Act, CRA); Cyber Solidarity Regulation (also Cyber Solidarity Act, CSA); Network and Information Security Directive (also NIS-2 or Directive (EU) 2022/2555); Regulation on Digital Operational Resilience (also DORA or Regulation (EU) 2022/2554).
-
-Create a brief summary of the following law text:
-
-{law_text}
-
-Then analyze whether the law falls into the above-mentioned subject areas, and if it is relevant for each subject area. Briefly justify your answers.
-"""
-    prompt = PromptTemplate(
-        input_variables=["law_text"],
-        template=prompt_template,
-    )
-    inputs = {
-        "law_text": law_text[:3000],  # Limit to avoid exceeding token limit
-    }
+def get_vorgang_details(vorgang_id):
+    # Decode the full dossier from the memory-mapped dump only when it is selected
     try:
-        response = structured_llm.invoke(prompt.format(**inputs))
-        logger.info("Received response from LLM for predefined analysis.")
-        return response
-    except Exception as e:
-        logger.error(f"Error during LLM predefined analysis: {e}")
+        return dossier_store.get(vorgang_id)
+    except (OSError, ValueError, sqlite3.OperationalError) as e:
+        logger.error(f"Error reading dossier {vorgang_id}: {e}")
         return None
 
+def get_vorgang_view(vorgang_id, events_shown):
+    # Details markdown, event count and proposal URL of a law. Run in the background as a whole,
+    # reading the events and docs of a dossier decodes them even when its markdown is memoized.
+    vorgang_details = get_vorgang_details(vorgang_id)
+    if not vorgang_details:
+        return None
+    return (render_details(vorgang_details, events_shown), len(vorgang_details.get('events', [])),
+            latest_proposal_url(vorgang_details))
+
 # Initialize Widgets
+search_input = pn.widgets.TextInput(
+    name='Search',
+    placeholder='Keywords in title, subjects, legal basis, committees or summaries',
+    sizing_mode='stretch_width'
+)
+stage_select = pn.widgets.Select(name='Stage Reached', options=[ALL])
+committee_select = pn.widgets.Select(name='Committee', options=[ALL])
+date_from_picker = pn.widgets.DatePicker(name='Active From')
+date_to_picker = pn.widgets.DatePicker(name='Active Until')
 search_button = pn.widgets.Button(name='Get Laws', button_type='primary')
 message_pane = pn.pane.Markdown()
-laws_table = pn.widgets.Tabulator(pagination='remote', page_size=20, sizing_mode='stretch_both')
+laws_table = pn.widgets.Tabulator(show_index=False, disabled=True, sizing_mode='stretch_both')
+previous_page_button = pn.widgets.Button(name='Previous', disabled=True)
+next_page_button = pn.widgets.Button(name='Next', disabled=True)
 details_pane = pn.pane.Markdown(sizing_mode='stretch_both', height=400)
+more_events_button = pn.widgets.Button(name='Show more events', visible=False)
+proposal_pane = pn.pane.Markdown(sizing_mode='stretch_width')
 company_description = pn.widgets.TextAreaInput(
     name='Company Description',
     placeholder='Enter a description of your company.',
@@ -321,97 +114,132 @@ relevance_check_button = pn.widgets.Button(name='Check Relevance', button_type='
 relevance_result_pane = pn.pane.Markdown(sizing_mode='stretch_width', height=200)
 automatic_analysis_button = pn.widgets.Button(name='Perform Analysis', button_type='primary')
 automatic_analysis_result_pane = pn.pane.Markdown(sizing_mode='stretch_width', height=400)
+batch_mode = pn.widgets.RadioButtonGroup(
+    name='Analysis', options={'Relevance': RELEVANCE, 'Predefined Analysis': PREDEFINED}, value=RELEVANCE
+)
+batch_limit = pn.widgets.IntInput(name='Max. Laws', value=50, start=1, end=1000)
+batch_concurrency = pn.widgets.IntInput(name='Concurrent Requests', value=4, start=1, end=32)
+batch_prescreen = pn.widgets.Checkbox(name='Pre-screen all matching laws locally', value=True)
+batch_button = pn.widgets.Button(name='Screen Laws', button_type='primary')
+batch_progress = pn.indicators.Progress(value=0, max=100, sizing_mode='stretch_width')
+batch_status_pane = pn.pane.Markdown()
+batch_table = pn.widgets.Tabulator(show_index=False, disabled=True, sizing_mode='stretch_both', height=500)
+metrics_refresh_button = pn.widgets.Button(name='Refresh', button_type='primary')
+metrics_table = pn.widgets.Tabulator(show_index=False, disabled=True, sizing_mode='stretch_width')
+metrics_download = pn.widgets.FileDownload(
+    callback=lambda: io.StringIO(get_recorder().prometheus()), filename='parltrack_metrics.prom',
+    label='Prometheus metrics'
+)
+spans_download = pn.widgets.FileDownload(
+    callback=lambda: io.StringIO(get_recorder().jsonl()), filename='parltrack_spans.jsonl', label='Spans (JSONL)'
+)
 
 # Define Callbacks
-def search_laws(event):
-    logger.info("Get Laws button clicked.")
+# panel serve runs this script once per session, so this is the session's own state: the
+# current page and its rows, the selected law and its text. Dossiers come from dossier_store.
+session = {'page': 0, 'vorgaenge': [], 'vorgang_id': None, 'events_shown': 0, 'law_text': None, 'prefetches': []}
+
+def current_filters():
+    return dict(
+        query=search_input.value,
+        stage=None if stage_select.value == ALL else stage_select.value,
+        committee=None if committee_select.value == ALL else committee_select.value,
+        date_from=date_from_picker.value,
+        date_to=date_to_picker.value,
+    )
+
+async def show_page():
     message_pane.object = 'Loading data...'
-    vorgaenge = get_vorgaenge()
+    page = session['page']
+    vorgaenge, total = await run_in_background(get_vorgaenge, page=page, **current_filters())
+    if vorgaenge is None:
+        message_pane.object = "The law index is busy, please try again in a moment."
+        return
     if vorgaenge:
         df = pd.DataFrame([
             {
-                'ID': v.get('procedure', {}).get('reference', 'No ID'),
-                'Title': v.get('procedure', {}).get('title', 'No Title')
+                'ID': v['reference'] or 'No ID',
+                'Title': v['title'] or 'No Title',
+                'Stage': v['stage_reached'] or ''
             }
             for v in vorgaenge
         ])
         laws_table.value = df
-        message_pane.object = f"{len(vorgaenge)} laws loaded."
-        pn.state.vorgaenge = vorgaenge  # Store the list of laws for later use
+        pages = -(-total // PAGE_SIZE)
+        message_pane.object = f"{total} laws found, page {page + 1} of {pages}."
+        previous_page_button.disabled = page == 0
+        next_page_button.disabled = page + 1 >= pages
+        session['vorgaenge'] = vorgaenge  # Store the summaries of the listed laws
+        # Selecting a listed law should usually find its proposal text cached already,
+        # proposals of the page left behind are dropped unless downloading or listed in another session
+        prefetcher.release(session['prefetches'])
+        session['prefetches'] = prefetcher.prefetch(v['proposal_url'] for v in vorgaenge)
         logger.info(f"{len(vorgaenge)} laws loaded into table.")
     else:
+        laws_table.value = pd.DataFrame(columns=['ID', 'Title', 'Stage'])
         message_pane.object = "No laws found."
+        previous_page_button.disabled = next_page_button.disabled = True
         logger.warning("No laws found to display.")
 
+async def search_laws(event):
+    logger.info("Get Laws button clicked.")
+    if stage_select.options == [ALL]:
+        # Fill the facet filters once the index is available, building it may take a while
+        message_pane.object = 'Loading data...'
+        facets = await run_in_background(get_facets)
+        if facets:
+            stage_select.options = [ALL] + facets['stage_reached']
+            committee_select.options = [ALL] + facets['committee']
+    session['page'] = 0
+    await show_page()
+
+def change_page(step):
+    async def callback(event):
+        session['page'] = max(session['page'] + step, 0)
+        await show_page()
+    return callback
+
 search_button.on_click(search_laws)
+search_input.param.watch(search_laws, 'value')
+previous_page_button.on_click(change_page(-1))
+next_page_button.on_click(change_page(1))
+
+async def load_law_text(vorgang_id, proposal_url):
+    proposal_pane.object = f"Fetching proposal text from {proposal_url}..."
+    law_text = await run_in_background(prefetcher.fetch, proposal_url)
+    if session['vorgang_id'] != vorgang_id:
+        # Another law was selected while this one was downloading
+        return
+    session['law_text'] = law_text
+    if law_text:
+        proposal_pane.object = f"**Proposal text loaded** ({len(law_text)} characters), ready for analysis."
+        logger.info(f"Stored law text for analysis from {proposal_url}")
+    else:
+        proposal_pane.object = "**Could not load the proposal text.**"
 
-def on_law_select(event):
+async def on_law_select(event):
     selected_row = laws_table.selection
     if selected_row:
         selected_index = selected_row[0]
         vorgang_id = laws_table.value.iloc[selected_index]['ID']
         logger.info(f"Law with ID {vorgang_id} selected.")
-        # Retrieve the selected law from pn.state.vorgaenge
-        vorgaenge = pn.state.vorgaenge
-        vorgang_details = next((item for item in vorgaenge if item.get('procedure', {}).get('reference') == vorgang_id), None)
-        if vorgang_details:
-            # Extract sections
-            meta = vorgang_details.get('meta', {})
-            procedure = vorgang_details.get('procedure', {})
-            committees = vorgang_details.get('committees', [])
-            council = vorgang_details.get('council', [])
-            commission = vorgang_details.get('commission', [])
-            events = vorgang_details.get('events', [])
-            docs = vorgang_details.get('docs', [])
-            
-            # Build the details markdown
-            details = f"# Details of the Selected Law\n\n"
-            details += f"## Meta\n{format_meta(meta)}\n"
-            details += f"## Procedure\n{format_procedure(procedure)}\n"
-            details += f"## Committees\n{format_committees(committees)}\n"
-            details += f"## Council\n{format_council(council)}\n"
-            details += f"## Commission\n{format_commission(commission)}\n"
-            details += f"## Events\n{format_events(events)}\n"
-            details += f"## Documents\n{format_docs(docs)}\n"
-            
-            # Extract the most recent proposal link from 'docs'
-            proposal_url = None
-            if docs:
-                # Find the latest document with type 'Legislative proposal'
-                legislative_proposals = [doc for doc in docs if doc.get('type') == 'Legislative proposal']
-                if legislative_proposals:
-                    # Sort by date descending
-                    legislative_proposals.sort(key=lambda x: x.get('date', ''), reverse=True)
-                    latest_proposal = legislative_proposals[0]
-                    proposal_docs = latest_proposal.get('docs', [])
-                    # Find the URL in 'docs'
-                    for d in proposal_docs:
-                        if 'url' in d:
-                            proposal_url = d['url']
-                            break
-                    if proposal_url:
-                        details += f"\n## Latest Proposal Link\n[View Proposal]({proposal_url})\n"
-                        # Store the content for analysis
-                        pn.state.law_text = fetch_document_text(proposal_url)
-                        logger.info(f"Stored law text for analysis from {proposal_url}")
-                    else:
-                        details += "\n**No link to the latest proposal found.**\n"
-                        pn.state.law_text = None
-                        logger.warning("No proposal URL found.")
-                else:
-                    details += "\n**No legislative proposals found.**\n"
-                    pn.state.law_text = None
-                    logger.warning("No legislative proposals found in docs.")
-            else:
-                details += "\n**No documents available.**\n"
-                pn.state.law_text = None
-                logger.warning("No docs found.")
-
+        session['vorgang_id'] = vorgang_id
+        session['law_text'] = None
+        proposal_pane.object = ""
+        # Fetch the full record of the selected law from the dump and render it, off the event loop.
+        # Rendered once per version of the law, long event lists a page at a time
+        view = await run_in_background(get_vorgang_view, vorgang_id, EVENTS_PAGE_SIZE)
+        if session['vorgang_id'] != vorgang_id:
+            return
+        if view:
+            details, events, proposal_url = view
+            session['events_shown'] = EVENTS_PAGE_SIZE
             details_pane.object = details
-
-            # Store selected vorgang_id
-            pn.state.vorgang_id = vorgang_id
+            more_events_button.visible = events > session['events_shown']
+            # Show the details right away, the proposal text follows in the background
             logger.info(f"Law ID {vorgang_id} stored in state.")
+            if proposal_url:
+                await load_law_text(vorgang_id, proposal_url)
         else:
             details_pane.object = "Could not load details."
             logger.error(f"Could not load details for law ID {vorgang_id}.")
@@ -421,13 +249,31 @@ def on_law_select(event):
 
 laws_table.param.watch(on_law_select, 'selection')
 
-def check_relevance(event):
+async def show_more_events(event):
+    vorgang_id = session['vorgang_id']
+    events_shown = session['events_shown'] + EVENTS_PAGE_SIZE
+    view = await run_in_background(get_vorgang_view, vorgang_id, events_shown)
+    if not view or session['vorgang_id'] != vorgang_id:
+        return
+    details, events, _ = view
+    session['events_shown'] = events_shown
+    details_pane.object = details
+    more_events_button.visible = events > session['events_shown']
+
+more_events_button.on_click(show_more_events)
+
+async def check_relevance(event):
     logger.info("Relevance check button clicked.")
-    if hasattr(pn.state, 'law_text') and pn.state.law_text:
-        law_text = pn.state.law_text
+    if session['law_text']:
+        law_text = session['law_text']
         company_desc = company_description.value
         logger.info("Performing relevance analysis.")
-        result = analyze_relevance(law_text, company_desc)
+        relevance_result_pane.object = "Analyzing relevance..."
+        relevance_check_button.disabled = True
+        try:
+            result = await run_in_background(analyze_relevance, law_text, company_desc)
+        finally:
+            relevance_check_button.disabled = False
         if result:
             relevance_result_pane.object = f"""
 ### Relevance Analysis Result
@@ -445,12 +291,17 @@ def check_relevance(event):
 
 relevance_check_button.on_click(check_relevance)
 
-def perform_analysis(event):
+async def perform_analysis(event):
     logger.info("Automatic analysis button clicked.")
-    if hasattr(pn.state, 'law_text') and pn.state.law_text:
-        law_text = pn.state.law_text
+    if session['law_text']:
+        law_text = session['law_text']
         logger.info("Performing automatic analysis.")
-        result = perform_predefined_analysis(law_text)
+        automatic_analysis_result_pane.object = "Analyzing..."
+        automatic_analysis_button.disabled = True
+        try:
+            result = await run_in_background(perform_predefined_analysis, law_text)
+        finally:
+            automatic_analysis_button.disabled = False
         if result:
             analyses_markdown = ""
             for analysis in result.analyses:
@@ -475,6 +326,80 @@ def perform_analysis(event):
 
 automatic_analysis_button.on_click(perform_analysis)
 
+async def screen_laws(event):
+    logger.info("Batch screening button clicked.")
+    mode = batch_mode.value
+    company_desc = company_description.value
+    if mode == RELEVANCE and not company_desc:
+        batch_status_pane.object = "Enter a company description in the Analysis tab first."
+        return
+    ranking_text = None
+    if batch_prescreen.value:
+        ranking_text = company_desc if mode == RELEVANCE else PREDEFINED_TOPICS_TEXT
+    references = await run_in_background(get_references, batch_limit.value, ranking_text=ranking_text,
+                                         **current_filters())
+    if references is None:
+        batch_status_pane.object = "The law index is busy, please try again in a moment."
+        return
+    if not references:
+        batch_status_pane.object = "No laws match the current search."
+        return
+    batch_button.disabled = True
+    batch_progress.value = 0
+    batch_table.value = pd.DataFrame(columns=['ID', 'Title', 'Relevant', 'Topics', 'Reason', 'Source'])
+    batch_status_pane.object = f"Screening {len(references)} laws..."
+
+    def on_result(row):
+        batch_table.stream(pd.DataFrame([{
+            'ID': row['reference'],
+            'Title': row['title'] or '',
+            'Relevant': 'Yes' if row['relevant'] else ('No' if row['status'] == 'ok' else row['status']),
+            'Topics': row['topics'] or '',
+            'Reason': row['reason'] or '',
+            'Source': row['source'] or '',
+        }]), follow=False)
+
+    def on_progress(done, total):
+        batch_progress.value = int(done / total * 100)
+        batch_status_pane.object = f"Screened {done} of {total} laws..."
+
+    try:
+        report = await screen_dossiers(
+            references, company_desc, mode=mode, concurrency=batch_concurrency.value,
+            load_dossier=get_vorgang_details, on_result=on_result, on_progress=on_progress,
+        )
+    finally:
+        batch_button.disabled = False
+    relevant = sum(bool(row['relevant']) for row in report['results'])
+    batch_status_pane.object = (
+        f"Screened {report['dossiers']} laws in {report['seconds']:.0f}s "
+        f"({report['dossiers_per_minute']:.1f} per minute): {relevant} relevant, {report['errors']} errors."
+    )
+
+batch_button.on_click(screen_laws)
+
+METRICS_COLUMNS = ['Stage', 'Count', 'Errors', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Bytes', 'Pages', 'Tokens']
+
+def refresh_metrics(event=None):
+    # Timings of the whole server process, all sessions included
+    rows = [
+        {
+            'Stage': row['stage'],
+            'Count': row['count'],
+            'Errors': row['errors'],
+            'p50 (ms)': round(row['p50'] * 1000, 1),
+            'p95 (ms)': round(row['p95'] * 1000, 1),
+            'Max (ms)': round(row['max'] * 1000, 1),
+            'Bytes': row.get('bytes', 0),
+            'Pages': row.get('pages', 0),
+            'Tokens': row.get('prompt_tokens', 0) + row.get('completion_tokens', 0),
+        }
+        for row in get_recorder().summary()
+    ]
+    metrics_table.value = pd.DataFrame(rows, columns=METRICS_COLUMNS)
+
+metrics_refresh_button.on_click(refresh_metrics)
+
 # Create the Template
 template = BootstrapTemplate(title='REG Monitoring')
 
@@ -486,11 +411,13 @@ tabs = pn.Tabs(tabs_location='above')
 
 # Law Search Tab
 law_search_tab = pn.Column(
-    pn.Row(search_button, message_pane),
+    pn.Row(search_input, search_button),
+    pn.Row(stage_select, committee_select, date_from_picker, date_to_picker),
+    message_pane,
     pn.layout.Divider(),
     pn.Row(
-        pn.Column('## List of Laws', laws_table),
-        pn.Column('## Law Details', details_pane)
+        pn.Column('## List of Laws', laws_table, pn.Row(previous_page_button, next_page_button)),
+        pn.Column('## Law Details', details_pane, more_events_button, proposal_pane)
     )
 )
 
@@ -506,11 +433,40 @@ analysis_tab = pn.Column(
     )
 )
 
+# Batch Screening Tab
+batch_tab = pn.Column(
+    pn.pane.Markdown(
+        "Screens the laws matching the current search and filters of the Law Search tab, "
+        "relevance is judged against the company description of the Analysis tab. "
+        "With the pre-screen, all matching laws are ranked locally "
+        "and only the closest Max. Laws are sent to the model."
+    ),
+    pn.Row(batch_mode, batch_limit, batch_concurrency, batch_prescreen, batch_button),
+    batch_progress,
+    batch_status_pane,
+    batch_table
+)
+
+# Performance Tab
+performance_tab = pn.Column(
+    pn.pane.Markdown(
+        "Latency per stage of this server process over its most recent calls: dump loading and search, "
+        "document download (fetch) and text extraction, rendering of the details and the model requests (llm). "
+        "Bytes, pages and estimated tokens are totals since the server started."
+    ),
+    pn.Row(metrics_refresh_button, metrics_download, spans_download),
+    metrics_table
+)
+
 # Add Tabs to the main area
 tabs.extend([
     ('Law Search', law_search_tab),
-    ('Analysis', analysis_tab)
+    ('Analysis', analysis_tab),
+    ('Batch Screening', batch_tab),
+    ('Performance', performance_tab)
 ])
+# Show current numbers whenever the Performance tab is opened
+tabs.param.watch(lambda event: refresh_metrics() if event.new == 3 else None, 'active')
 
 # Add Tabs to the template
 template.main.append(tabs)
@@ -0,0 +1,147 @@
+"""Timing spans of the hot paths, summarised per stage and exported as Prometheus metrics or JSONL."""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Most recent spans kept per stage, the percentiles are computed over these
+METRICS_WINDOW = int(os.environ.get('PARLTRACK_METRICS_WINDOW', 10000))
+# Append every span to this JSONL file as it ends, unset keeps them in memory only
+METRICS_LOG = os.environ.get('PARLTRACK_METRICS_LOG')
+
+# Span attributes summed per stage next to the durations
+COUNTED = ('bytes', 'pages', 'rows', 'pairs', 'prompt_tokens', 'prefix_tokens', 'completion_tokens')
+QUANTILES = (0.5, 0.95)
+
+
+def quantile(sorted_values, q):
+    """Nearest-rank quantile of an ascending list."""
+    return sorted_values[max(math.ceil(q * len(sorted_values)) - 1, 0)]
+
+
+class Recorder:
+    """Recent spans and running totals per stage, shared by all threads of the process."""
+
+    def __init__(self, window=None, log_path=None):
+        self.window = window or METRICS_WINDOW
+        self.log_path = log_path
+        self._spans = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, attrs=None):
+        entry = {'stage': stage, 'time': time.time(), 'seconds': seconds, **(attrs or {})}
+        with self._lock:
+            if stage not in self._spans:
+                self._spans[stage] = deque(maxlen=self.window)
+                self._totals[stage] = {'count': 0, 'errors': 0, 'seconds': 0.0}
+            self._spans[stage].append(entry)
+            totals = self._totals[stage]
+            totals['count'] += 1
+            totals['errors'] += 'error' in entry
+            totals['seconds'] += seconds
+            for name in COUNTED:
+                if entry.get(name):
+                    totals[name] = totals.get(name, 0) + entry[name]
+            if self.log_path:
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as file:
+                        file.write(json.dumps(entry, default=str) + '\n')
+                except OSError as e:
+                    logger.warning(f"Could not write span to {self.log_path}: {e}")
+
+    def spans(self, stage=None):
+        """The recent spans, of one stage or of all, oldest first."""
+        with self._lock:
+            if stage is not None:
+                return list(self._spans.get(stage, ()))
+            return sorted((s for spans in self._spans.values() for s in spans), key=lambda s: s['time'])
+
+    def summary(self):
+        """Per stage: span count, errors, p50/p95/max over the recent spans and totals since start."""
+        with self._lock:
+            stages = {stage: ([s['seconds'] for s in spans], dict(self._totals[stage]))
+                      for stage, spans in self._spans.items()}
+        rows = []
+        for stage, (durations, totals) in sorted(stages.items()):
+            durations.sort()
+            row = {'stage': stage, **totals}
+            for q in QUANTILES:
+                row[f"p{int(q * 100)}"] = quantile(durations, q)
+            row['max'] = durations[-1]
+            rows.append(row)
+        return rows
+
+    def prometheus(self, prefix='parltrack'):
+        """The summary in the Prometheus text exposition format."""
+        rows = self.summary()
+        lines = [f"# HELP {prefix}_stage_seconds Duration of the hot path stages.",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        for row in rows:
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{row["stage"]}",quantile="{q}"}} '
+                             f'{row[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{row["stage"]}"}} {row["seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{row["stage"]}"}} {row["count"]}')
+        lines += [f"# HELP {prefix}_stage_errors_total Spans that ended with an exception.",
+                  f"# TYPE {prefix}_stage_errors_total counter"]
+        lines += [f'{prefix}_stage_errors_total{{stage="{row["stage"]}"}} {row["errors"]}' for row in rows]
+        for name in COUNTED:
+            counted = [row for row in rows if name in row]
+            if counted:
+                lines += [f"# HELP {prefix}_stage_{name}_total Sum of {name.replace('_', ' ')} over the spans.",
+                          f"# TYPE {prefix}_stage_{name}_total counter"]
+                lines += [f'{prefix}_stage_{name}_total{{stage="{row["stage"]}"}} {row[name]}' for row in counted]
+        return '\n'.join(lines) + '\n'
+
+    def jsonl(self):
+        """The recent spans of all stages, one JSON object per line."""
+        return ''.join(json.dumps(span, default=str) + '\n' for span in self.spans())
+
+    def export(self, path):
+        """Write Prometheus metrics to a .prom/.txt file, the spans as JSONL to anything else."""
+        text = self.prometheus() if path.endswith(('.prom', '.txt')) else self.jsonl()
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._totals.clear()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Process-wide Recorder, logging spans to PARLTRACK_METRICS_LOG if set."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = Recorder(log_path=METRICS_LOG)
+        return _recorder
+
+
+@contextmanager
+def timed(stage, **attrs):
+    """Record the block as one span of ``stage``.
+
+    The yielded dict holds the span's attributes, add those only known at
+    the end to it, e.g. ``bytes`` or ``pages``. An exception is recorded
+    under ``error`` and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        get_recorder().record(stage, time.perf_counter() - start, attrs)
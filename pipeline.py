@@ -0,0 +1,197 @@
+"""Batch pipeline over the dump: ingest, fetch proposals, analyse and export, without the Panel UI.
+
+Importing this module does not load Panel or LangChain, the analysis only
+imports LangChain once a model is actually called.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import documents
+from dossier_index import connect, ensure_index, get_reader, is_stale, refresh_index, search_dossiers
+from dossiers import COD_TYPE
+from prescreen import build_vectors, prescreen
+
+logger = logging.getLogger(__name__)
+
+# Proposals downloaded at the same time by fetch_proposals
+FETCH_WORKERS = int(os.environ.get('PARLTRACK_FETCH_WORKERS', 8))
+
+JSONL, PARQUET = 'jsonl', 'parquet'
+FORMATS = (JSONL, PARQUET)
+
+
+def set_workers(extract=None, sections=None):
+    """Size the PDF extraction processes and the section analysis threads, before their pools start."""
+    if extract is not None:
+        documents.EXTRACT_WORKERS = extract
+    if sections is not None:
+        import analysis
+        analysis.SECTION_WORKERS = sections
+
+
+def ingest(dump_path=None, index_path=None, force=False):
+    """Index the dump and vectorize it for the pre-screen, returns the stats or None if it was up to date."""
+    conn = connect(index_path)
+    try:
+        if not force and not is_stale(conn, dump_path):
+            return None
+        stats = refresh_index(conn, dump_path, force)
+        if stats is None:
+            # Another process indexed this dump while we waited for the lock
+            return None
+        stats['vectorized'] = len(build_vectors(conn, index_path))
+        return stats
+    finally:
+        conn.close()
+
+
+def select_dossiers(dump_path=None, index_path=None, limit=100, ranking_text=None, procedure_type=COD_TYPE,
+                    **filters):
+    """Summary rows of the dossiers matching the search filters, best first.
+
+    With ``ranking_text`` all matches are ranked by the local pre-screen and
+    the ``limit`` closest are returned.
+    """
+    conn, _ = ensure_index(dump_path, index_path)
+    try:
+        rows, _ = search_dossiers(conn, procedure_type=procedure_type, limit=-1 if ranking_text else limit, **filters)
+        if ranking_text:
+            by_reference = {row['reference']: row for row in rows}
+            ranked = prescreen(conn, ranking_text, limit, list(by_reference), index_path)
+            logger.info(f"Pre-screened {len(rows)} dossiers down to {len(ranked)}.")
+            rows = [by_reference[reference] for reference in ranked]
+    finally:
+        conn.close()
+    return rows
+
+
+def proposal_urls(references, index_path=None):
+    """Latest proposal URL per reference, from the index, for those that have one."""
+    conn = connect(index_path)
+    try:
+        urls = {}
+        references = list(references)
+        # Stay below SQLite's limit of bound parameters per statement
+        for start in range(0, len(references), 500):
+            chunk = references[start:start + 500]
+            urls.update(conn.execute(
+                f"SELECT reference, proposal_url FROM dossiers "
+                f"WHERE proposal_url IS NOT NULL AND reference IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        return urls
+    finally:
+        conn.close()
+
+
+def fetch_proposals(references, index_path=None, workers=None, cache=None, on_progress=None):
+    """Download and extract the latest proposals into the document cache.
+
+    Proposals already cached and fresh are not downloaded again, so a later
+    analysis of the same dossiers reads them locally. Returns counts of the
+    fetched, failed and proposal-less dossiers.
+    """
+    references = list(references)
+    urls = proposal_urls(references, index_path)
+    cache = cache or documents.get_cache()
+    stats = {'dossiers': len(references), 'fetched': 0, 'failed': 0, 'without_proposal': len(references) - len(urls)}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or FETCH_WORKERS, thread_name_prefix='fetch') as executor:
+        futures = {executor.submit(documents.fetch_document_text, url, cache): ref for ref, url in urls.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            if future.result():
+                stats['fetched'] += 1
+            else:
+                stats['failed'] += 1
+                logger.warning(f"No text for the proposal of {futures[future]}.")
+            if on_progress:
+                on_progress(done, len(futures))
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def analyze(references, company_description=None, mode='relevance', concurrency=4, requests_per_minute=None,
+            max_retries=3, llm=None, dump_path=None, index_path=None, on_result=None, on_progress=None,
+            profiles=None):
+    """Screen dossiers with the relevance, predefined or batched analysis, returns the screening report."""
+    from screening import screen_dossiers
+
+    return asyncio.run(screen_dossiers(
+        references, company_description, mode=mode, concurrency=concurrency,
+        requests_per_minute=requests_per_minute, max_retries=max_retries, llm=llm,
+        load_dossier=get_reader(dump_path, index_path).get, on_result=on_result, on_progress=on_progress,
+        profiles=profiles,
+    ))
+
+
+def output_format(path=None, fmt=None):
+    """The explicit format, else Parquet for .parquet files and JSONL for anything else."""
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown output format {fmt!r}, expected one of {FORMATS}")
+        return fmt
+    return PARQUET if path and path.endswith('.parquet') else JSONL
+
+
+class RowWriter:
+    """Writes result rows as JSONL, streamed as they come, or as one Parquet file when closed.
+
+    Without a path JSONL goes to stdout. Parquet needs pandas with pyarrow
+    or fastparquet, which is checked up front rather than after a long run.
+    """
+
+    def __init__(self, path=None, fmt=None):
+        self.path = path
+        self.format = output_format(path, fmt)
+        self.rows = []
+        self._file = None
+        if self.format == PARQUET:
+            if not path:
+                raise ValueError("Parquet output needs a file path.")
+            _check_parquet_engine()
+        else:
+            self._file = open(path, 'w', encoding='utf-8') if path else sys.stdout
+
+    def write(self, row):
+        if self._file is None:
+            self.rows.append(row)
+            return
+        self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self.format == PARQUET:
+            import pandas as pd
+            pd.DataFrame(self.rows).to_parquet(self.path, index=False)
+        elif self.path:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_parquet_engine():
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return
+        except ImportError:
+            continue
+    raise ImportError("Parquet output needs pyarrow or fastparquet, install one with: pip install pyarrow")
+
+
+def export(rows, path=None, fmt=None):
+    """Write rows to a JSONL or Parquet file, returns how many were written."""
+    count = 0
+    with RowWriter(path, fmt) as writer:
+        for row in rows:
+            writer.write(dict(row))
+            count += 1
+    return count
@@ -0,0 +1,207 @@
+"""Local TF-IDF pre-screen ranking dossiers against a company description before any LLM call."""
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from chunking import STOPWORDS, TOPIC_KEYWORDS
+from dossier_index import INDEX_PATH, latest_ingest
+from documents import get_cache
+
+logger = logging.getLogger(__name__)
+
+# Terms in more than this share of dossiers carry no signal and are dropped
+MAX_DOCUMENT_FREQUENCY = 0.5
+# Characters of a cached proposal added to a dossier's vector
+PROPOSAL_CHARS = 20000
+
+# What dossiers are ranked against for the predefined analysis instead of a company
+PREDEFINED_TOPICS_TEXT = ' '.join(keyword for keywords in TOPIC_KEYWORDS.values() for keyword in keywords)
+
+_WORDS = re.compile(r'[a-z][a-z-]{2,}')
+
+
+@lru_cache(maxsize=2**18)
+def normalize(word):
+    """Term for a lowercased word, None for stopwords. A trailing plural s is removed."""
+    if word in STOPWORDS:
+        return None
+    if len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def term_counts(text):
+    """Counts of the terms in a text."""
+    counts = Counter()
+    # Normalizing distinct words only is much cheaper than every occurrence
+    for word, count in Counter(_WORDS.findall(text.lower())).items():
+        term = normalize(word)
+        if term:
+            counts[term] += count
+    return counts
+
+
+def vectors_path(index_path=None):
+    """The vectors live next to the dossier index they were built from."""
+    return os.path.splitext(index_path or INDEX_PATH)[0] + '.vectors.npz'
+
+
+def dossier_texts(conn, include_proposals=True):
+    """Yield (reference, text) for every indexed dossier.
+
+    The text is the title, subjects and summaries from the search index,
+    followed by the start of the latest proposal if it is in the document
+    cache already. Nothing is downloaded.
+    """
+    cache = get_cache() if include_proposals else None
+    rows = conn.execute(
+        "SELECT d.reference, d.proposal_url, f.title, f.subjects, f.summaries "
+        "FROM dossiers d JOIN dossiers_fts f ON f.rowid = d.rowid ORDER BY d.reference"
+    )
+    for row in rows:
+        text = ' '.join(filter(None, (row['title'], row['subjects'], row['summaries'])))
+        if cache is not None and row['proposal_url']:
+            entry = cache.lookup(row['proposal_url'])
+            # Vectorizing every cached proposal must not reset their LRU order
+            proposal = cache.read_text(entry['sha256'], touch=False) if entry else None
+            if proposal:
+                text += ' ' + proposal[:PROPOSAL_CHARS]
+        yield row['reference'], text
+
+
+class TfidfIndex:
+    """TF-IDF vectors of dossiers, stored as per-term posting lists.
+
+    Weights are sublinear term frequency times inverse document frequency,
+    normalized per dossier, so a query's score is its cosine similarity.
+    Only the postings of the query's terms are touched, which keeps a
+    search over tens of thousands of dossiers in the millisecond range.
+    """
+
+    def __init__(self, references, terms, idf, term_ptr, doc_ids, weights, ingest_id=0):
+        self.references = references
+        self.terms = terms
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.term_ptr = term_ptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.ingest_id = ingest_id
+        self._positions = None
+
+    def __len__(self):
+        return len(self.references)
+
+    @classmethod
+    def build(cls, documents, min_df=2, max_df=MAX_DOCUMENT_FREQUENCY, ingest_id=0):
+        """Vectorize (reference, text) pairs."""
+        references, counts = [], []
+        df = Counter()
+        for reference, text in documents:
+            tf = term_counts(text)
+            references.append(reference)
+            counts.append(tf)
+            df.update(tf.keys())
+        n = len(references)
+        terms = sorted(t for t, f in df.items() if f >= min_df and f <= max(max_df * n, min_df))
+        vocabulary = {term: i for i, term in enumerate(terms)}
+        idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in terms], dtype=np.float32)
+        term_ids, doc_ids, weights = [], [], []
+        for doc, tf in enumerate(counts):
+            ids = np.array([vocabulary[t] for t in tf if t in vocabulary], dtype=np.int32)
+            if not len(ids):
+                continue
+            w = np.array([1 + math.log(tf[terms[i]]) for i in ids], dtype=np.float32) * idf[ids]
+            term_ids.append(ids)
+            doc_ids.append(np.full(len(ids), doc, dtype=np.int32))
+            weights.append(w / np.linalg.norm(w))
+        term_ids = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int32)
+        doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+        order = np.argsort(term_ids, kind='stable')
+        term_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=term_ptr[1:])
+        return cls(np.array(references), np.array(terms), idf, term_ptr, doc_ids[order], weights[order], ingest_id)
+
+    def save(self, path):
+        tmp = f"{path}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp, references=self.references, terms=self.terms, idf=self.idf, term_ptr=self.term_ptr,
+                 doc_ids=self.doc_ids, weights=self.weights, ingest_id=np.array(self.ingest_id))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['references'], data['terms'], data['idf'], data['term_ptr'], data['doc_ids'],
+                       data['weights'], int(data['ingest_id']))
+
+    def scores(self, text):
+        """Cosine similarity of every dossier to a text."""
+        scores = np.zeros(len(self.references), dtype=np.float32)
+        tf = {t: c for t, c in term_counts(text).items() if t in self.vocabulary}
+        if not tf:
+            return scores
+        ids = np.array([self.vocabulary[t] for t in tf])
+        query = np.array([1 + math.log(tf[t]) for t in tf], dtype=np.float32) * self.idf[ids]
+        query /= np.linalg.norm(query)
+        for term, weight in zip(ids, query):
+            postings = slice(self.term_ptr[term], self.term_ptr[term + 1])
+            scores[self.doc_ids[postings]] += self.weights[postings] * weight
+        return scores
+
+    def top_k(self, text, k, references=None):
+        """The ``k`` most similar dossiers as (reference, score), optionally among ``references`` only.
+
+        A negative ``k`` ranks all of them, like ``--limit -1``.
+        """
+        scores = self.scores(text)
+        if references is not None:
+            if self._positions is None:
+                self._positions = {r: i for i, r in enumerate(self.references.tolist())}
+            mask = np.zeros(len(scores), dtype=bool)
+            mask[[self._positions[r] for r in references if r in self._positions]] = True
+            scores = np.where(mask, scores, -1.0)
+        candidates = int((scores >= 0).sum())
+        k = candidates if k < 0 else min(k, candidates)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(str(self.references[i]), float(scores[i])) for i in top]
+
+
+def build_vectors(conn, index_path=None, include_proposals=True):
+    """Vectorize the indexed dossiers and save them next to the index."""
+    index = TfidfIndex.build(dossier_texts(conn, include_proposals), ingest_id=latest_ingest(conn))
+    index.save(vectors_path(index_path))
+    logger.info(f"Vectorized {len(index)} dossiers over {len(index.terms)} terms.")
+    return index
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def get_vectors(conn, index_path=None):
+    """Process-wide TfidfIndex, rebuilt when the dossier index saw a newer ingest."""
+    path = vectors_path(index_path)
+    ingest_id = latest_ingest(conn)
+    with _index_lock:
+        index = _indexes.get(path)
+        if index is None or index.ingest_id != ingest_id:
+            index = TfidfIndex.load(path) if os.path.exists(path) else None
+            if index is None or index.ingest_id != ingest_id:
+                index = build_vectors(conn, index_path)
+            _indexes[path] = index
+        return index
+
+
+def prescreen(conn, company_description, k, references=None, index_path=None):
+    """References of the ``k`` dossiers closest to a company description, best first, all of them for k < 0."""
+    return [reference for reference, _ in get_vectors(conn, index_path).top_k(company_description, k, references)]
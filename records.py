@@ -0,0 +1,189 @@
+"""Compact in-memory forms of dossiers: slotted summary rows and records whose heavy sections decode lazily.
+
+Both read like the dicts they replace (``row['title']``,
+``dossier.get('events', [])``), so code written against the parsed JSON
+keeps working unchanged.
+"""
+import json
+import re
+import sys
+from collections.abc import Mapping
+from json.decoder import scanstring
+
+# Top-level sections holding the bulk of a record, events and docs with their summaries
+HEAVY_SECTIONS = ('events', 'docs')
+
+# Columns of the summary rows handed to the UI
+SUMMARY_FIELDS = (
+    'reference', 'title', 'type', 'stage_reached', 'subjects', 'updated', 'first_date', 'last_date', 'proposal_url',
+)
+# Summary fields and committee keys drawn from a small set of values, shared between records
+INTERNED_FIELDS = ('type', 'stage_reached')
+INTERNED_COMMITTEE_KEYS = ('type', 'body', 'committee', 'committee_full')
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def intern_value(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class DossierSummary(Mapping):
+    """Summary row of a dossier in slots rather than a dict, with the repeated values interned."""
+
+    __slots__ = SUMMARY_FIELDS
+
+    def __init__(self, row):
+        for name in SUMMARY_FIELDS:
+            value = row[name]
+            setattr(self, name, intern_value(value) if name in INTERNED_FIELDS else value)
+
+    def __getitem__(self, key):
+        if key not in SUMMARY_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(SUMMARY_FIELDS)
+
+    def __len__(self):
+        return len(SUMMARY_FIELDS)
+
+    def __repr__(self):
+        return f"DossierSummary({dict(self)!r})"
+
+
+def scan_record(raw):
+    """Decode a dossier record, returns (dossier, spans).
+
+    ``spans`` maps every top-level key to the (start, end) byte range of its
+    value in ``raw``, so single sections can later be decoded on their own.
+    Raises json.JSONDecodeError like json.loads.
+    """
+    text = raw if isinstance(raw, str) else bytes(raw).decode('utf-8')
+    ascii_only = text.isascii()
+    position = [0, 0]
+
+    def byte_offset(index):
+        # Offsets only ever grow, so encode just the text since the last call
+        if ascii_only:
+            return index
+        chars, offset = position
+        position[:] = index, offset + len(text[chars:index].encode('utf-8'))
+        return position[1]
+
+    dossier, spans = {}, {}
+    pos = _WHITESPACE.match(text).end()
+    if text[pos:pos + 1] != '{':
+        raise json.JSONDecodeError("Expecting '{'", text, pos)
+    pos = _WHITESPACE.match(text, pos + 1).end()
+    if text[pos:pos + 1] == '}':
+        return _end(text, pos + 1, dossier, spans)
+    while True:
+        if text[pos:pos + 1] != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+        key, pos = scanstring(text, pos + 1)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] != ':':
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+        pos = _WHITESPACE.match(text, pos + 1).end()
+        dossier[key], end = _decoder.raw_decode(text, pos)
+        spans[key] = (byte_offset(pos), byte_offset(end))
+        pos = _WHITESPACE.match(text, end).end()
+        delimiter = text[pos:pos + 1]
+        if delimiter == '}':
+            return _end(text, pos + 1, dossier, spans)
+        if delimiter != ',':
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+        pos = _WHITESPACE.match(text, pos + 1).end()
+
+
+def _end(text, pos, dossier, spans):
+    # Only whitespace may follow the record, as with json.loads
+    end = _WHITESPACE.match(text, pos).end()
+    if end != len(text):
+        raise json.JSONDecodeError("Extra data", text, end)
+    return dossier, spans
+
+
+def decode_light(raw, spans):
+    """Decode a record with the values at ``spans`` left out, a lot cheaper than the whole record."""
+    pieces, start = [], 0
+    for section_start, section_end in sorted(spans.values()):
+        pieces += [raw[start:section_start], b'null']
+        start = section_end
+    pieces.append(raw[start:])
+    light = json.loads(b''.join(pieces))
+    for key in spans:
+        light.pop(key, None)
+    return intern_sections(light)
+
+
+def intern_sections(light):
+    """Intern the procedure type and stage and the committee names of a decoded record, in place."""
+    procedure = light.get('procedure')
+    if isinstance(procedure, dict):
+        for name in INTERNED_FIELDS:
+            if name in procedure:
+                procedure[name] = intern_value(procedure[name])
+    for committee in light.get('committees') or ():
+        if isinstance(committee, dict):
+            for name in INTERNED_COMMITTEE_KEYS:
+                if name in committee:
+                    committee[name] = intern_value(committee[name])
+    return light
+
+
+class LazyDossier(Mapping):
+    """A dossier whose heavy sections stay undecoded bytes until first read.
+
+    ``light`` holds the decoded small sections (meta, procedure, committees,
+    ...), ``spans`` the byte range of each heavy section in ``source``, a
+    bytes object or the dump's memory map. Decoded sections are kept for the
+    lifetime of the object.
+    """
+
+    __slots__ = ('_light', '_source', '_spans', '_decoded')
+
+    def __init__(self, light, source, spans):
+        self._light = light
+        self._source = source
+        self._spans = spans
+        self._decoded = {}
+
+    @classmethod
+    def from_record(cls, raw, heavy=HEAVY_SECTIONS):
+        """Split a raw record, decoding it once and keeping its heavy sections as bytes."""
+        raw = bytes(raw)
+        dossier, spans = scan_record(raw)
+        heavy_spans = {key: spans[key] for key in heavy if key in spans}
+        light = {key: value for key, value in dossier.items() if key not in heavy_spans}
+        return cls(intern_sections(light), raw, heavy_spans)
+
+    def __getitem__(self, key):
+        if key in self._light:
+            return self._light[key]
+        if key not in self._spans:
+            raise KeyError(key)
+        if key not in self._decoded:
+            start, end = self._spans[key]
+            self._decoded[key] = json.loads(self._source[start:end])
+        return self._decoded[key]
+
+    def __iter__(self):
+        yield from self._light
+        yield from self._spans
+
+    def __len__(self):
+        return len(self._light) + len(self._spans)
+
+    def __contains__(self, key):
+        return key in self._light or key in self._spans
+
+    def to_dict(self):
+        """The fully decoded dossier as a plain dict."""
+        return {key: self[key] for key in self}
+
+    def __repr__(self):
+        return f"LazyDossier({self._light.get('procedure', {}).get('reference')!r})"
@@ -0,0 +1,196 @@
+"""Markdown for the details of a dossier, rendered once per version of the dossier."""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from dossiers import latest_proposal, latest_proposal_url
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Events rendered at first, more are added a page at a time on request
+EVENTS_PAGE_SIZE = int(os.environ.get('PARLTRACK_EVENTS_PAGE_SIZE', 50))
+# Rendered dossiers kept in memory, keyed by reference, meta.updated and events shown
+RENDER_CACHE_SIZE = int(os.environ.get('PARLTRACK_RENDER_CACHE_SIZE', 256))
+
+_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}')
+
+
+@lru_cache(maxsize=8192)
+def format_date(value, with_time=False):
+    """A parltrack timestamp as 'YYYY-MM-DD' (or with the time), anything else unchanged.
+
+    Parltrack writes every date as '%Y-%m-%dT%H:%M:%S', so checking the
+    pattern and slicing gives the same result as strptime/strftime.
+    """
+    if not isinstance(value, str) or not _TIMESTAMP.fullmatch(value):
+        return value
+    return value.replace('T', ' ') if with_time else value[:10]
+
+
+def format_meta(meta):
+    if not meta:
+        return "No meta data available.\n"
+    source = meta.get('source', 'N/A')
+    updated = format_date(meta.get('updated', 'N/A'), with_time=True)
+    return f"**Source**: [{source}]({source})\n**Updated**: {updated}\n"
+
+
+def format_procedure(procedure):
+    if not procedure:
+        return "No procedure data available.\n"
+    fields = [
+        f"**Reference**: {procedure.get('reference', 'N/A')}",
+        f"**Title**: {procedure.get('title', 'N/A')}",
+        f"**Type**: {procedure.get('type', 'N/A')}",
+        f"**Subtype**: {procedure.get('subtype', 'N/A')}",
+        f"**Instrument**: {procedure.get('instrument', 'N/A')}",
+        f"**Stage Reached**: {procedure.get('stage_reached', 'N/A')}",
+    ]
+    # Legal basis
+    legal_basis = procedure.get('legal_basis', [])
+    if legal_basis:
+        fields.append(f"**Legal Basis**: {', '.join(legal_basis)}")
+    # Subjects
+    subjects = procedure.get('subject', {})
+    if subjects:
+        fields.append(f"**Subjects**: {', '.join(subjects.values())}")
+    return '\n'.join(fields) + '\n'
+
+
+def format_committees(committees):
+    if not committees:
+        return "No committees data available.\n"
+    lines = []
+    for committee in committees:
+        lines.append(f"- **Type**: {committee.get('type', 'N/A')}")
+        lines.append(f"  - **Committee**: {committee.get('committee_full', 'N/A')}")
+        rapporteurs = committee.get('rapporteur', [])
+        if rapporteurs:
+            lines.append(f"  - **Rapporteur(s)**: {', '.join(r.get('name', 'N/A') for r in rapporteurs)}")
+        shadows = committee.get('shadows', [])
+        if shadows:
+            lines.append(f"  - **Shadows**: {', '.join(s.get('name', 'N/A') for s in shadows)}")
+    return '\n'.join(lines) + '\n'
+
+
+def format_council(council):
+    if not council:
+        return "No council data available.\n"
+    lines = []
+    for item in council:
+        lines.append(f"- **Date**: {format_date(item.get('date', 'N/A'))}")
+        lines.append(f"  - **Council**: {item.get('council', 'N/A')}")
+        lines.append(f"  - **Type**: {item.get('type', 'N/A')}")
+    return '\n'.join(lines) + '\n'
+
+
+def format_commission(commission):
+    if not commission:
+        return "No commission data available.\n"
+    lines = []
+    for item in commission:
+        lines.append(f"- **DG**: {item.get('dg', 'N/A')}")
+        lines.append(f"  - **Commissioner**: {item.get('commissioner', 'N/A')}")
+    return '\n'.join(lines) + '\n'
+
+
+def _summary_lines(lines, item):
+    summaries = item.get('summary', [])
+    if summaries:
+        lines.append("  - **Summary**:")
+        lines.extend(f"    - {summary}" for summary in summaries)
+
+
+def format_events(events, limit=None):
+    """Markdown list of the first ``limit`` events, all if None."""
+    if not events:
+        return "No events data available.\n"
+    lines = []
+    for event in events[:limit]:
+        lines.append(f"- **Date**: {format_date(event.get('date', 'N/A'))}")
+        lines.append(f"  - **Type**: {event.get('type', 'N/A')}")
+        lines.append(f"  - **Body**: {event.get('body', 'N/A')}")
+        _summary_lines(lines, event)
+    if limit is not None and len(events) > limit:
+        lines.append(f"\n*Showing the first {limit} of {len(events)} events.*")
+    return '\n'.join(lines) + '\n'
+
+
+def format_docs(docs):
+    if not docs:
+        return "No documents available.\n"
+    lines = []
+    for doc in docs:
+        lines.append(f"- **Date**: {format_date(doc.get('date', 'N/A'))}")
+        lines.append(f"  - **Type**: {doc.get('type', 'N/A')}")
+        lines.append(f"  - **Body**: {doc.get('body', 'N/A')}")
+        # Document links
+        doc_items = doc.get('docs', [])
+        if doc_items:
+            lines.append("  - **Documents**:")
+            for d in doc_items:
+                title = d.get('title', 'Document')
+                url = d.get('url')
+                lines.append(f"    - [{title}]({url})" if url else f"    - {title}")
+        _summary_lines(lines, doc)
+    return '\n'.join(lines) + '\n'
+
+
+def format_proposal(dossier):
+    """Link to the latest proposal, or why there is none."""
+    proposal_url = latest_proposal_url(dossier)
+    if proposal_url:
+        return f"\n## Latest Proposal Link\n[View Proposal]({proposal_url})\n"
+    if not dossier.get('docs'):
+        logger.warning("No docs found.")
+        return "\n**No documents available.**\n"
+    if latest_proposal(dossier) is None:
+        logger.warning("No legislative proposals found in docs.")
+        return "\n**No legislative proposals found.**\n"
+    logger.warning("No proposal URL found.")
+    return "\n**No link to the latest proposal found.**\n"
+
+
+def _render(dossier, events_shown):
+    return ''.join([
+        "# Details of the Selected Law\n\n",
+        "## Meta\n", format_meta(dossier.get('meta', {})), "\n",
+        "## Procedure\n", format_procedure(dossier.get('procedure', {})), "\n",
+        "## Committees\n", format_committees(dossier.get('committees', [])), "\n",
+        "## Council\n", format_council(dossier.get('council', [])), "\n",
+        "## Commission\n", format_commission(dossier.get('commission', [])), "\n",
+        "## Events\n", format_events(dossier.get('events', []), events_shown), "\n",
+        "## Documents\n", format_docs(dossier.get('docs', [])), "\n",
+        format_proposal(dossier),
+    ])
+
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+
+
+def render_details(dossier, events_shown=None):
+    """Details markdown of a dossier with its first ``events_shown`` events.
+
+    Results are memoized per reference and meta.updated, a new version of
+    the dossier in the dump is rendered afresh.
+    """
+    events_shown = EVENTS_PAGE_SIZE if events_shown is None else events_shown
+    key = (dossier.get('procedure', {}).get('reference'), dossier.get('meta', {}).get('updated'), events_shown)
+    with timed('render', cached=True) as span:
+        with _rendered_lock:
+            if key in _rendered:
+                _rendered.move_to_end(key)
+                return _rendered[key]
+        span['cached'] = False
+        markdown = _render(dossier, events_shown)
+        span['bytes'] = len(markdown)
+        with _rendered_lock:
+            _rendered[key] = markdown
+            if len(_rendered) > RENDER_CACHE_SIZE:
+                _rendered.popitem(last=False)
+        return markdown
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dossiers import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_PATH = os.environ.get('PARLTRACK_RESULT_CACHE', os.path.join(DATA_DIR, 'results.sqlite'))
+# Entries kept before the least recently used are evicted, 0 disables the cache
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('PARLTRACK_RESULT_CACHE_ENTRIES', 50000))
+# Entries older than this many seconds are recomputed, 0 keeps them forever
+RESULT_CACHE_MAX_AGE = float(os.environ.get('PARLTRACK_RESULT_CACHE_MAX_AGE', 0))
+
+RESULT_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+CREATE INDEX IF NOT EXISTS results_kind ON results (kind, prompt_version);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def prompt_version(template):
+    """Short hash identifying a prompt template, changes whenever its text does."""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+
+def normalize_description(text):
+    """Whitespace and case do not change a company description's meaning."""
+    return ' '.join((text or '').split()).casefold()
+
+
+def model_settings(llm):
+    """Model name and temperature of a chat model, as part of the cache key."""
+    name = getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or type(llm).__name__
+    return f"{name}@{getattr(llm, 'temperature', None)}"
+
+
+class ResultCache:
+    """Persistent memo of structured LLM results.
+
+    Keys combine the hash of the (truncated) law text, the prompt template
+    version, the model settings and the normalized company description.
+    Entries of a kind are dropped as soon as its template version changes.
+    """
+
+    def __init__(self, path=None, max_entries=None, max_age=None):
+        self.path = path or RESULT_CACHE_PATH
+        self.max_entries = RESULT_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_age = RESULT_CACHE_MAX_AGE if max_age is None else max_age
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(RESULT_CACHE_SCHEMA)
+        self._checked_versions = set()
+
+    @staticmethod
+    def key(kind, law_text, version, llm, company_description=None):
+        parts = [
+            kind,
+            hashlib.sha256(law_text.encode('utf-8')).hexdigest(),
+            version,
+            model_settings(llm),
+            normalize_description(company_description),
+        ]
+        return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+    def _count(self, name, value=1):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (name, value)
+        )
+
+    def invalidate_stale_versions(self, kind, version):
+        """Drop all entries of a kind computed with another prompt version."""
+        if (kind, version) in self._checked_versions:
+            return
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM results WHERE kind = ? AND prompt_version != ?", (kind, version)
+            ).rowcount
+            if deleted:
+                self._count('invalidated', deleted)
+                logger.info(f"Prompt for {kind} changed, dropped {deleted} cached results.")
+        self._checked_versions.add((kind, version))
+
+    def get(self, key, schema):
+        """Cached result parsed into ``schema``, or None on a miss."""
+        if not self.max_entries:
+            return None
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT result, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age and now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count('misses')
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self._count('hits')
+        return schema.parse_raw(row[0])
+
+    def put(self, key, kind, version, result):
+        if not self.max_entries:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, kind, prompt_version, result, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, version, result.json(), now, now),
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self._count('evicted', excess)
+
+    def stats(self):
+        """Hit/miss counters, hit rate and the number of cached results per kind."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            kinds = dict(self._conn.execute("SELECT kind, COUNT(*) FROM results GROUP BY kind").fetchall())
+        stats = {name: counters.get(name, 0) for name in ('hits', 'misses', 'evicted', 'invalidated')}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = kinds
+        stats['max_entries'] = self.max_entries
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide ResultCache in the default location."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def memoized(kind, template, schema, law_text, llm, compute, company_description=None, cache=None):
+    """Return the cached result for these inputs, or compute and store it."""
+    cache = cache or get_result_cache()
+    version = prompt_version(template)
+    cache.invalidate_stale_versions(kind, version)
+    key = cache.key(kind, law_text, version, llm, company_description)
+    result = cache.get(key, schema)
+    if result is not None:
+        logger.info(f"Serving {kind} result from cache.")
+        return result
+    result = compute()
+    if result is not None:
+        cache.put(key, kind, version, result)
+    return result
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis import analyze_batch, analyze_relevance, perform_predefined_analysis
+from documents import fetch_document_text
+from dossier_index import get_reader
+from dossiers import latest_proposal_url, summary_text
+
+logger = logging.getLogger(__name__)
+
+RELEVANCE = 'relevance'
+PREDEFINED = 'predefined'
+BATCH = 'batch'
+MODES = (RELEVANCE, PREDEFINED, BATCH)
+
+RESULT_COLUMNS = ['reference', 'title', 'status', 'relevant', 'topics', 'reason', 'source', 'attempts', 'seconds']
+
+
+class RateLimiter:
+    """Spaces out request starts to at most ``requests_per_minute``, across threads.
+
+    acquire() blocks the calling thread, the analyses call it before each
+    model request from the screening and section pools.
+    """
+
+    def __init__(self, requests_per_minute=None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _apply_result(row, mode, result):
+    if mode == RELEVANCE:
+        row['relevant'] = result.is_relevant
+        row['reason'] = result.reason
+    elif mode == BATCH:
+        topics = [a.topic for a in result.analyses if a.relevant]
+        profiles = [p.profile for p in result.profiles if p.is_relevant]
+        row['relevant'] = bool(topics or profiles)
+        row['topics'] = ', '.join(topics)
+        row['profiles'] = ', '.join(profiles)
+        row['profile_results'] = [p.dict() for p in result.profiles]
+        row['reason'] = result.summary
+    else:
+        topics = [a.topic for a in result.analyses if a.relevant]
+        row['relevant'] = bool(topics)
+        row['topics'] = ', '.join(topics)
+        row['reason'] = result.summary
+    row['status'] = 'ok'
+
+
+async def screen_dossiers(references, company_description=None, mode=RELEVANCE, concurrency=4,
+                          requests_per_minute=None, max_retries=3, backoff=1.0, llm=None,
+                          load_dossier=None, fetch=fetch_document_text, on_result=None, on_progress=None,
+                          profiles=None):
+    """Screen many dossiers with the relevance, predefined or batched analysis.
+
+    The batched analysis answers for all ``profiles`` ({name: company
+    description}) and the predefined areas at once, its rows also report
+    the requests and estimated tokens it took.
+
+    At most ``concurrency`` dossiers are in flight and LLM requests, those
+    for the sections and summary of a long law included, start no faster
+    than ``requests_per_minute``. Failed requests are retried with
+    exponential backoff and jitter. Dossiers without a fetchable proposal
+    are screened on their title and summaries instead. ``on_result(row)``
+    is called as each dossier completes and ``on_progress(done, total)``
+    after it. Returns a report with all rows and the throughput.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown screening mode {mode!r}, expected one of {MODES}")
+    if mode == RELEVANCE and not company_description:
+        raise ValueError("A company description is required for relevance screening.")
+    if mode == BATCH and not profiles:
+        raise ValueError("Company profiles are required for batched screening.")
+    references = list(references)
+    load_dossier = load_dossier or get_reader().get
+    limiter = RateLimiter(requests_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='screening')
+
+    def analyze(text, usage):
+        if mode == BATCH:
+            return analyze_batch(text, profiles, llm=llm, raise_errors=True, usage=usage, limiter=limiter)
+        if mode == RELEVANCE:
+            return analyze_relevance(text, company_description, llm=llm, raise_errors=True, limiter=limiter)
+        return perform_predefined_analysis(text, llm=llm, raise_errors=True, limiter=limiter)
+
+    async def screen_one(reference):
+        row = dict.fromkeys(RESULT_COLUMNS)
+        row.update(reference=reference, status='error', attempts=0)
+        # Spans of the model requests made for this dossier, retries included
+        usage = []
+        start = time.perf_counter()
+        async with semaphore:
+            try:
+                dossier = await loop.run_in_executor(executor, load_dossier, reference)
+                if not dossier:
+                    row['reason'] = 'Unknown dossier.'
+                    return row
+                row['title'] = dossier.get('procedure', {}).get('title')
+                url = latest_proposal_url(dossier)
+                text = await loop.run_in_executor(executor, fetch, url) if url else None
+                row['source'] = 'proposal'
+                if not text:
+                    text = summary_text(dossier)
+                    row['source'] = 'summaries'
+                if not text:
+                    row['status'] = 'no_text'
+                    return row
+                for attempt in range(1, max_retries + 2):
+                    row['attempts'] = attempt
+                    try:
+                        result = await loop.run_in_executor(executor, analyze, text, usage)
+                    except Exception as e:
+                        if attempt > max_retries:
+                            row['reason'] = f"Failed after {attempt} attempts: {e}"
+                            return row
+                        delay = backoff * 2 ** (attempt - 1) * (0.5 + random.random())
+                        logger.warning(f"Analysis of {reference} failed ({e}), retrying in {delay:.1f}s.")
+                        await asyncio.sleep(delay)
+                    else:
+                        break
+                if result is None:
+                    row['reason'] = 'The model returned no result.'
+                    return row
+                _apply_result(row, mode, result)
+                return row
+            finally:
+                row['seconds'] = round(time.perf_counter() - start, 3)
+                if mode == BATCH:
+                    row['requests'] = len(usage)
+                    for name in ('prompt_tokens', 'completion_tokens'):
+                        row[name] = sum(s.get(name, 0) for s in usage)
+
+    start = time.perf_counter()
+    rows = []
+    try:
+        for future in asyncio.as_completed([screen_one(r) for r in references]):
+            row = await future
+            rows.append(row)
+            if on_result:
+                on_result(row)
+            if on_progress:
+                on_progress(len(rows), len(references))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    elapsed = time.perf_counter() - start
+    report = {
+        'results': rows,
+        'dossiers': len(rows),
+        'errors': sum(row['status'] == 'error' for row in rows),
+        'seconds': elapsed,
+        'dossiers_per_minute': len(rows) / elapsed * 60 if elapsed else 0.0,
+    }
+    if mode == BATCH:
+        report['pairs'] = len(rows) * len(profiles)
+        for name in ('requests', 'prompt_tokens', 'completion_tokens'):
+            report[name] = sum(row[name] for row in rows)
+    logger.info(f"Screened {report['dossiers']} dossiers in {elapsed:.1f}s "
+                f"({report['dossiers_per_minute']:.1f} per minute, {report['errors']} errors).")
+    return report
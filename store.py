@@ -0,0 +1,85 @@
+"""Process-wide, read-only access to the indexed dossiers, shared by all UI sessions."""
+import logging
+import sqlite3
+import threading
+import time
+
+from dossier_index import connect, ensure_index, facet_values, get_reader, is_stale, search_dossiers
+from dossiers import COD_TYPE, DUMP_PATH
+from metrics import get_recorder, timed
+from prescreen import prescreen
+
+logger = logging.getLogger(__name__)
+
+
+class DossierStore:
+    """Search, facets and full records of the dossiers in one dump.
+
+    Nothing is loaded until first use. Queries run on one SQLite connection
+    per thread, full records come from the process-wide memory-mapped
+    reader, and facet values are computed once per version of the dump.
+    Sessions keep only their own page and selection, so memory does not
+    grow with the number of sessions.
+    """
+
+    def __init__(self, dump_path=None, index_path=None, procedure_type=COD_TYPE):
+        self.dump_path = dump_path or DUMP_PATH
+        self.index_path = index_path
+        self.procedure_type = procedure_type
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._facets = None
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        try:
+            stale = conn is None or is_stale(conn, self.dump_path)
+        except (OSError, sqlite3.OperationalError) as e:
+            logger.error(f"Error checking the dump: {e}")
+            stale = False
+        if stale:
+            # One thread (re)builds the index, the others wait and then reconnect
+            with self._lock:
+                if conn is not None:
+                    conn.close()
+                start = time.perf_counter()
+                index, built = ensure_index(self.dump_path, self.index_path)
+                index.close()
+                if built:
+                    get_recorder().record('index', time.perf_counter() - start)
+                conn = self._local.conn = connect(self.index_path)
+                self._facets = None
+        return conn
+
+    def search(self, query=None, stage=None, committee=None, date_from=None, date_to=None, limit=20, offset=0,
+               conn=None):
+        """One page of summary rows and the total number of matches."""
+        with timed('search') as span:
+            rows, total = search_dossiers(
+                conn or self._conn(), query, procedure_type=self.procedure_type, stage=stage, committee=committee,
+                date_from=date_from, date_to=date_to, limit=limit, offset=offset,
+            )
+            span['rows'] = len(rows)
+        return rows, total
+
+    def references(self, limit, ranking_text=None, **filters):
+        """References of the best matches, or of the matches closest to ``ranking_text``."""
+        conn = self._conn()
+        rows, _ = self.search(limit=-1 if ranking_text else limit, conn=conn, **filters)
+        references = [row['reference'] for row in rows]
+        if ranking_text:
+            references = prescreen(conn, ranking_text, limit, references, self.index_path)
+        return references
+
+    def facets(self):
+        """Stages and committees to filter by."""
+        conn = self._conn()
+        with self._lock:
+            if self._facets is None:
+                self._facets = facet_values(conn, self.procedure_type)
+            return self._facets
+
+    def get(self, reference):
+        """The full dossier, decoded from the dump on demand. Callers must not modify it."""
+        self._conn()
+        return get_reader(self.dump_path, self.index_path).get(reference)
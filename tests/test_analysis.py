@@ -0,0 +1,49 @@
+import random
+
+import analysis
+from benchmarks.stubs import StubChatModel
+from benchmarks.synthetic import make_text
+from result_cache import ResultCache
+
+
+def long_law():
+    rng = random.Random(0)
+    # Several sections, each mentioning some of the predefined areas
+    return '\n\n'.join(f"{make_text(rng, 800)} Personal data, cybersecurity and digital services." for _ in range(4))
+
+
+def test_editing_a_topic_definition_misses_the_section_cache(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    llm = StubChatModel()
+    law = long_law()
+    assert len(analysis.split_sections(law)) > 1
+
+    analysis.perform_predefined_analysis(law, llm=llm, cache=cache, raise_errors=True)
+    first = llm.requests
+    analysis.perform_predefined_analysis(law, llm=llm, cache=cache, raise_errors=True)
+    assert llm.requests == first
+
+    definitions = dict(analysis.TOPIC_DEFINITIONS, **{'Data Protection': 'Laws protecting personal data.'})
+    monkeypatch.setattr(analysis, 'TOPIC_DEFINITIONS', definitions)
+    analysis.perform_predefined_analysis(law, llm=llm, cache=cache, raise_errors=True)
+    assert llm.requests > first
+
+
+class LowercaseTopics(StubChatModel):
+    """Names the areas in its own spelling, like a model paraphrasing the prompt."""
+
+    def answer(self, schema, prompt):
+        result = super().answer(schema, prompt)
+        if schema is analysis.AnalysisResult:
+            for a in result.analyses:
+                a.topic = f" {a.topic.lower()}"
+        return result
+
+
+def test_section_verdicts_match_topics_regardless_of_case(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'), max_entries=0)
+    result = analysis.perform_predefined_analysis(long_law(), llm=LowercaseTopics(), cache=cache, raise_errors=True)
+    by_topic = {a.topic: a for a in result.analyses}
+    assert [a.topic for a in result.analyses] == analysis.TOPICS
+    assert by_topic['Data Protection'].relevant
+    assert by_topic['Data Protection'].reason != "No section of the law touches this area."
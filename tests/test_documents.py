@@ -0,0 +1,46 @@
+import threading
+import time
+
+from documents import Prefetcher
+
+
+def test_stale_release_keeps_a_later_prefetch_of_the_same_url():
+    prefetcher = Prefetcher(workers=1)
+    unblock = threading.Event()
+    prefetcher._prefetch = lambda url: unblock.wait() if url == 'blocker' else url
+    try:
+        first = prefetcher.prefetch(['a.pdf'])
+        assert first[0][1].result(timeout=5) == 'a.pdf'
+        deadline = time.monotonic() + 5
+        while 'a.pdf' in prefetcher._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # One worker busy with the blocker, the second prefetch of a.pdf stays queued
+        prefetcher.prefetch(['blocker'])
+        second = prefetcher.prefetch(['a.pdf'])
+        prefetcher.release(first)
+        assert not second[0][1].cancelled()
+        assert prefetcher._pending['a.pdf'] is second[0][1]
+
+        prefetcher.release(second)
+        assert second[0][1].cancelled()
+    finally:
+        unblock.set()
+        prefetcher.close()
+
+
+def test_shared_prefetch_is_cancelled_by_its_last_holder():
+    prefetcher = Prefetcher(workers=1)
+    unblock = threading.Event()
+    prefetcher._prefetch = lambda url: unblock.wait() if url == 'blocker' else url
+    try:
+        prefetcher.prefetch(['blocker'])
+        first = prefetcher.prefetch(['a.pdf'])
+        second = prefetcher.prefetch(['a.pdf'])
+        prefetcher.release(first)
+        assert not second[0][1].cancelled()
+        prefetcher.release(second)
+        assert second[0][1].cancelled()
+    finally:
+        unblock.set()
+        prefetcher.close()
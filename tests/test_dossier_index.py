@@ -0,0 +1,77 @@
+import json
+
+from dossier_index import CHANGED, NEW, REMOVED, build_index, changes_since, connect, latest_ingest
+from dossiers import COD_TYPE, PROPOSAL_TYPE
+
+
+def dossier(reference, updated='2024-01-01', proposal=None, procedure_type=COD_TYPE):
+    docs = [{'type': PROPOSAL_TYPE, 'date': updated, 'docs': [{'url': proposal}]}] if proposal else []
+    return {'meta': {'updated': updated}, 'procedure': {'reference': reference, 'title': reference,
+                                                          'type': procedure_type}, 'docs': docs, 'events': []}
+
+
+def ingest(conn, path, dossiers):
+    path.write_text(''.join(json.dumps(d) + '\n' for d in dossiers), encoding='utf-8')
+    return build_index(conn, str(path))
+
+
+def folded(conn, since, procedure_type=None):
+    return {c['reference']: (c['change'], c['new_proposal']) for c in changes_since(conn, since, procedure_type)}
+
+
+def test_incremental_build_records_only_real_changes(tmp_path):
+    conn = connect(str(tmp_path / 'index.sqlite'))
+    dump = tmp_path / 'dump.json'
+    stats = ingest(conn, dump, [dossier('A'), dossier('B'), dossier('C')])
+    assert (stats[NEW], stats[CHANGED], stats[REMOVED]) == (3, 0, 0)
+
+    # B moved to the end, C got a new version, A dropped out, D appeared
+    stats = ingest(conn, dump, [dossier('C', '2024-02-01'), dossier('D'), dossier('B')])
+    assert (stats['unchanged'], stats[NEW], stats[CHANGED], stats[REMOVED]) == (1, 1, 1, 1)
+    assert folded(conn, stats['ingest_id'] - 1) == {'A': (REMOVED, False), 'C': (CHANGED, False),
+                                                    'D': (NEW, False)}
+    # Offsets follow the lines that moved
+    offsets = dict(conn.execute("SELECT reference, offset FROM dossiers"))
+    assert offsets['C'] == 0 and offsets['B'] > offsets['D']
+
+
+def test_changes_fold_across_ingests(tmp_path):
+    conn = connect(str(tmp_path / 'index.sqlite'))
+    dump = tmp_path / 'dump.json'
+    ingest(conn, dump, [dossier('kept'), dossier('changed'), dossier('removed'), dossier('back')])
+    checkpoint = latest_ingest(conn)
+
+    ingest(conn, dump, [dossier('kept'), dossier('changed', '2024-02-01'), dossier('removed'), dossier('added')])
+    ingest(conn, dump, [dossier('kept'), dossier('changed', '2024-03-01', 'https://x/p.pdf'),
+                        dossier('added', '2024-03-01'), dossier('back')])
+    ingest(conn, dump, [dossier('kept'), dossier('changed', '2024-03-01', 'https://x/p.pdf'),
+                        dossier('added', '2024-04-01'), dossier('back')])
+
+    assert folded(conn, checkpoint) == {
+        'changed': (CHANGED, True),
+        # Appeared after the checkpoint, later versions keep it new
+        'added': (NEW, False),
+        'removed': (REMOVED, False),
+        # Removed and re-added since the checkpoint
+        'back': (NEW, False),
+    }
+    # Nothing happened after the last ingest
+    assert folded(conn, latest_ingest(conn)) == {}
+
+
+def test_removal_after_other_changes_wins(tmp_path):
+    conn = connect(str(tmp_path / 'index.sqlite'))
+    dump = tmp_path / 'dump.json'
+    ingest(conn, dump, [dossier('old')])
+    checkpoint = latest_ingest(conn)
+    ingest(conn, dump, [dossier('old', '2024-02-01'), dossier('new')])
+    ingest(conn, dump, [])
+    assert folded(conn, checkpoint) == {'old': (REMOVED, False), 'new': (REMOVED, False)}
+
+
+def test_procedure_type_filter_keeps_removals(tmp_path):
+    conn = connect(str(tmp_path / 'index.sqlite'))
+    dump = tmp_path / 'dump.json'
+    ingest(conn, dump, [dossier('cod'), dossier('other', procedure_type='INI')])
+    ingest(conn, dump, [dossier('cod', '2024-02-01'), dossier('ini', procedure_type='INI')])
+    assert folded(conn, 1, COD_TYPE) == {'cod': (CHANGED, False), 'other': (REMOVED, False)}
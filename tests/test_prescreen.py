@@ -0,0 +1,36 @@
+from documents import DocumentCache
+from prescreen import TfidfIndex
+
+DOCUMENTS = [
+    ('A', 'personal data protection of online platforms'),
+    ('B', 'cybersecurity of online platforms and cloud storage'),
+    ('C', 'fisheries quotas in the baltic sea'),
+    ('D', 'fisheries and data on the baltic sea'),
+]
+
+
+def test_negative_k_ranks_all_dossiers():
+    index = TfidfIndex.build(DOCUMENTS, min_df=1)
+    ranked = index.top_k('personal data on online platforms', -1)
+    assert [reference for reference, _ in ranked][:2] == ['A', 'B']
+    assert sorted(reference for reference, _ in ranked) == ['A', 'B', 'C', 'D']
+    assert [reference for reference, _ in index.top_k('online platforms', -1, references=['B', 'C'])] == ['B', 'C']
+    assert index.top_k('online platforms', 0) == []
+
+
+def test_reading_text_untouched_keeps_the_lru_order(tmp_path):
+    cache = DocumentCache(str(tmp_path), max_bytes=10 ** 6)
+    old = cache.store('http://x/old', b'old', 'text/plain', text='old text')
+    new = cache.store('http://x/new', b'new', 'text/plain', text='new text')
+    with cache._conn:
+        for last_access, sha256 in enumerate((old, new)):
+            cache._conn.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (last_access, sha256))
+
+    def order():
+        return [row[0] for row in cache._conn.execute("SELECT sha256 FROM blobs ORDER BY last_access")]
+
+    assert order() == [old, new]
+    assert cache.read_text(old, touch=False) == 'old text'
+    assert order() == [old, new]
+    cache.read_text(old)
+    assert order() == [new, old]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from records import HEAVY_SECTIONS, LazyDossier, decode_light, scan_record
+
+DOSSIER = {
+    'meta': {'updated': '2024-03-01T10:00:00'},
+    'procedure': {'reference': '2023/0001(COD)', 'title': 'Règlement sur la données – “Ökodesign” 🚀',
+                  'type': 'COD', 'subject': {'1.1': 'Économie'}},
+    'committees': [{'committee': 'ITRE', 'rapporteur': [{'name': 'Zoë Ünal'}]}],
+    'events': [{'date': '2023-01-02', 'type': 'Légal', 'summary': ['Première lecture ✓']}],
+    'docs': [{'title': 'COM(2023)0001', 'url': 'https://example.eu/ç.pdf', 'summary': ['Überblick']}],
+    'empty': {},
+}
+
+
+@pytest.mark.parametrize('ensure_ascii', [False, True], ids=['utf-8', 'escaped'])
+def test_spans_match_json_loads(ensure_ascii):
+    raw = json.dumps(DOSSIER, ensure_ascii=ensure_ascii, indent=1).encode('utf-8')
+    dossier, spans = scan_record(raw)
+    assert dossier == json.loads(raw)
+    assert set(spans) == set(DOSSIER)
+    for key, (start, end) in spans.items():
+        assert json.loads(raw[start:end]) == DOSSIER[key]
+
+
+def test_decode_light_drops_heavy_sections():
+    raw = json.dumps(DOSSIER, ensure_ascii=False).encode('utf-8')
+    _, spans = scan_record(raw)
+    heavy = {key: spans[key] for key in HEAVY_SECTIONS}
+    light = decode_light(raw, heavy)
+    assert light == {key: value for key, value in DOSSIER.items() if key not in HEAVY_SECTIONS}
+
+
+def test_lazy_dossier_reads_like_the_parsed_record():
+    raw = json.dumps(DOSSIER, ensure_ascii=False).encode('utf-8')
+    dossier = LazyDossier.from_record(raw)
+    assert dossier.to_dict() == DOSSIER
+    assert dossier['events'] == DOSSIER['events']
+
+
+@pytest.mark.parametrize('raw', [b'{"a": 1} x', b'{"a": 1}}', b'{} {}', b'{"a": 1}\n{"b": 2}'])
+def test_data_after_the_record_is_rejected(raw):
+    with pytest.raises(json.JSONDecodeError, match='Extra data'):
+        scan_record(raw)
+
+
+@pytest.mark.parametrize('raw', [b'{"a": 1}', b'  {"a": 1} \r\n', b'{}', b'{ }\n'])
+def test_whitespace_after_the_record_is_accepted(raw):
+    assert scan_record(raw)[0] == json.loads(raw)
+
+
+@pytest.mark.parametrize('raw', [b'[1]', b'{"a" 1}', b'{"a": 1,}', b'{"a": 1', b'{a: 1}'])
+def test_malformed_records_raise_like_json_loads(raw):
+    with pytest.raises(json.JSONDecodeError):
+        scan_record(raw)
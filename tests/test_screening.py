@@ -0,0 +1,25 @@
+import asyncio
+import random
+import time
+
+import result_cache
+from benchmarks.stubs import StubChatModel
+from benchmarks.synthetic import make_text
+from result_cache import ResultCache
+from screening import PREDEFINED, screen_dossiers
+
+
+def test_requests_per_minute_spaces_every_section_request(tmp_path, monkeypatch):
+    # A disabled result cache, every section is asked about
+    monkeypatch.setattr(result_cache, '_cache', ResultCache(str(tmp_path / 'results.sqlite'), max_entries=0))
+    rng = random.Random(0)
+    law = '\n\n'.join(f"{make_text(rng, 800)} Personal data, cybersecurity and digital services." for _ in range(4))
+    llm = StubChatModel()
+    start = time.perf_counter()
+    report = asyncio.run(screen_dossiers(['2020/0001(COD)'], mode=PREDEFINED, requests_per_minute=1200, llm=llm,
+                                         load_dossier=lambda reference: {'procedure': {'title': law}}))
+    elapsed = time.perf_counter() - start
+    assert report['errors'] == 0
+    # Section requests plus the summary, one at most every 50ms
+    assert llm.requests > 2
+    assert elapsed >= (llm.requests - 1) * 0.05